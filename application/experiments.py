@@ -1,56 +1,152 @@
 from application.extractor import extract_footprint_from_prism
+from concurrent.futures import ThreadPoolExecutor
+import geopandas
 from geopandas.geodataframe import GeoDataFrame
 import math
 import matplotlib.pyplot as plt
 from matplotlib.patches import Patch
+import numpy as np
+import os
 import osmnx as ox
 import prism
+import shapely
 
+# directory of the cached source layers
+CACHE_DIR = '../data/cache'
 
-def simplify_and_mapping(data_source):
+# number of footprints of a chunk of the metrics
+_METRICS_CHUNK = 2048
+
+
+def load_buildings(data_source, cache_dir=CACHE_DIR, refresh=False):
+    """
+    Load the footprints of the buildings of a data source from a local GeoParquet cache.
+    The source layer is downloaded (or extracted) and cached only if it is not in the cache, so reruns are offline.
+    :param data_source: 'lwm' (the ground floor of Lotte World Mall) or the name of an area of Manhattan, New York
+    :param cache_dir: directory of the cache
+    :param refresh: condition whether or not it downloads the source layer again
+    :return: GeoDataFrame of the footprints
+    """
+    path = os.path.join(cache_dir, '{}.parquet'.format(data_source))
+    if not refresh and os.path.exists(path):
+        return geopandas.read_parquet(path)
     if data_source == 'lwm':
-        tau = 2
         buildings = extract_footprint_from_prism('../data/lwm-prism.gml')
+        buildings = buildings[buildings['floor'] == 0]  # the ground floor of each building
     else:  # Only for Manhattan, New York
-        tau = 0.00003
         buildings = ox.footprints_from_place('{}, Manhattan, New York City'.format(data_source))
-    douglas_peucker_buildings = GeoDataFrame()
-    simplified_buildings = GeoDataFrame()
-    sum_haus = [0.0, 0.0]
-    total_points = [0, 0]
+        buildings = buildings[['geometry']]  # the tags of OSM have mixed types, which are not needed
+    os.makedirs(cache_dir, exist_ok=True)
+    buildings.to_parquet(path)
+    return buildings
+
+
+def quality_metrics(originals, simplified, workers=None):
+    """
+    Returns the number of vertices, the Hausdorff distance and the Jaccard index of simplified footprints.
+    The metrics are computed with the vectorized operations of Shapely 2 by chunks on a thread pool,
+    which runs in parallel since Shapely releases the GIL.
+    :param originals: array of the original footprints
+    :param simplified: array of the simplified footprints
+    :param workers: number of threads (default: the number of CPUs)
+    :return: dictionary of the names of the metrics and arrays
+    """
+    chunks = [slice(start, start + _METRICS_CHUNK) for start in range(0, len(originals), _METRICS_CHUNK)]
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        results = list(executor.map(lambda chunk: _quality_metrics(originals[chunk], simplified[chunk]), chunks))
+    if not results:
+        results = [_quality_metrics(originals, simplified)]
+    return {name: np.concatenate([result[name] for result in results]) for name in results[0]}
+
+
+def _quality_metrics(originals, simplified):
+    """
+    Returns the metrics of a chunk of footprints. See quality_metrics.
+    """
+    # the overlay requires valid polygons
+    a = _make_valid(originals)
+    b = _make_valid(simplified)
+    area_a = shapely.area(a)
+    area_b = shapely.area(b)
+    intersection = shapely.area(shapely.intersection(a, b))
+    union = area_a + area_b - intersection
+    return {
+        'vertices_before': shapely.get_num_coordinates(shapely.get_exterior_ring(originals)),
+        'vertices_after': shapely.get_num_coordinates(shapely.get_exterior_ring(simplified)),
+        'hausdorff': shapely.hausdorff_distance(originals, simplified),
+        'jaccard': np.divide(intersection, union, out=np.zeros_like(union), where=union > 0),
+    }
+
+
+def _make_valid(geoms):
+    """
+    Returns geometries in which only the invalid ones are repaired.
+    :param geoms: array of geometries
+    :return: array of valid geometries
+    """
+    invalid = ~shapely.is_valid(geoms)
+    if invalid.any():
+        geoms = geoms.copy()
+        geoms[invalid] = shapely.make_valid(geoms[invalid])
+    return geoms
+
+
+def comparison_frame(originals, simplified, index, crs, workers=None, heights=None):
+    """
+    Build a GeoDataFrame of simplified footprints with the floor height, the number of vertices, the Hausdorff
+    distance and the Jaccard index.
+    :param originals: array of the original footprints
+    :param simplified: array of the simplified footprints
+    :param index: index of the footprints
+    :param crs: coordinate reference system
+    :param workers: number of threads to compute the metrics
+    :param heights: array of the floor heights of the footprints, or None if the source has no heights
+    :return: GeoDataFrame of the simplified footprints
+    """
+    columns = quality_metrics(originals, simplified, workers)
+    if heights is not None:
+        columns = {'height': np.asarray(heights, dtype=np.float64), **columns}
+    return GeoDataFrame(columns, geometry=simplified, index=index, crs=crs)
+
+
+def simplify_and_mapping(data_source, workers=None):
+    if data_source == 'lwm':
+        tau = 2
+    else:  # Only for Manhattan, New York
+        tau = 0.00003
+    buildings = load_buildings(data_source)
     tolerance = tau * 3/5
 
-    def comparison(footprint, i):
-        new_footprint = prism.simplify(footprint, tau=tau, epsilon=math.pi/30)
-        if new_footprint is not None:
-            simplified_buildings.loc[i, 'geometry'] = new_footprint
-            haus = footprint.hausdorff_distance(new_footprint)
-            sum_haus[1] += haus
-            total_points[1] += len(new_footprint.exterior.coords)
-
-            dp_footprint = footprint.simplify(tolerance)
-            douglas_peucker_buildings.loc[i, 'geometry'] = dp_footprint
-
-            haus = footprint.hausdorff_distance(dp_footprint)
-            sum_haus[0] += haus
-            total_points[0] += len(dp_footprint.exterior.coords)
-
-    count = 0
-    for geom in buildings['geometry']:
-        if geom.geom_type == 'Polygon':
-            comparison(geom, count)
-            count += 1
-        if geom.geom_type == 'MultiPolygon':
-            for poly in geom:
-                comparison(poly, count)
-                count += 1
+    # polygons of the buildings with the original index
+    footprints = buildings.geometry.explode(index_parts=False)
+    footprints = footprints[footprints.geom_type == 'Polygon']
+    count = len(footprints)
+
+    simplified = prism.simplify_many(footprints, tau=tau, epsilon=math.pi/30, workers=workers)
+    valid = np.array([geom is not None for geom in simplified], dtype=bool)
+    originals = np.asarray(footprints.values)[valid]
+    simplified = simplified[valid]
+    dp_simplified = shapely.simplify(originals, tolerance)
+    index = footprints.index[valid]
+    # the floor height of each polygon from its building (only the footprints extracted from CityGML have heights)
+    heights = buildings['height'].loc[index].to_numpy() if 'height' in buildings.columns else None
+
+    douglas_peucker_buildings = comparison_frame(originals, dp_simplified, index, buildings.crs, workers, heights)
+    simplified_buildings = comparison_frame(originals, simplified, index, buildings.crs, workers, heights)
+
+    sum_haus = [douglas_peucker_buildings['hausdorff'].sum(), simplified_buildings['hausdorff'].sum()]
+    total_points = [douglas_peucker_buildings['vertices_after'].sum(), simplified_buildings['vertices_after'].sum()]
+    mean_jaccard = [douglas_peucker_buildings['jaccard'].mean(), simplified_buildings['jaccard'].mean()]
 
     print("Average Hausdorff Distance (Douglas Peucker):", sum_haus[0]/count)
     print("Average Hausdorff Distance (Indoor Simplification):", sum_haus[1] / count)
     print("Total Number of Points (Douglas Peucker):", total_points[0])
     print("Total Number of Points (Indoor Simplification):", total_points[1])
+    print("Average Jaccard Index (Douglas Peucker):", mean_jaccard[0])
+    print("Average Jaccard Index (Indoor Simplification):", mean_jaccard[1])
 
-    cell_text = [[tolerance, tau], [sum_haus[0]/count, sum_haus[1] / count], [total_points[0] , total_points[1]]]
+    cell_text = [[tolerance, tau], [sum_haus[0]/count, sum_haus[1] / count], [total_points[0], total_points[1]],
+                 mean_jaccard]
     # mapping
     minx, miny, maxx, maxy = buildings.total_bounds
     map_scale = 50
@@ -64,7 +160,8 @@ def simplify_and_mapping(data_source):
     simplified_buildings.plot(ax=ax, facecolor='red', alpha=0.1)
 
     ax.table(cellText=cell_text,
-             rowLabels=[ "Distance Tolerance", "Average Hausdorff Distance", "Total Number of Points"],
+             rowLabels=["Distance Tolerance", "Average Hausdorff Distance", "Total Number of Points",
+                        "Average Jaccard Index"],
              colLabels=["Douglas Peucker", "Indoor Simplification"],
              colWidths=[0.05/ratio, 0.05/ratio],
              loc='lower right')
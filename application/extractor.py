@@ -1,22 +1,43 @@
+from concurrent.futures import ProcessPoolExecutor
 from lxml import etree
 import numpy as np
+import prism
 from shapely.geometry import Polygon
+from geopandas import GeoSeries
 from geopandas.geodataframe import GeoDataFrame
 
-__all__ = ['extract_footprint_from_prism']
+__all__ = ['extract_footprint_from_prism', 'iter_footprints_from_prism', 'simplify_floors']
 
 ns_citygml = "http://www.opengis.net/citygml/2.0"
 ns_gml = "http://www.opengis.net/gml"
 ns_bldg = "http://www.opengis.net/citygml/building/1.0"
 
+# namespace of the building module for each version of CityGML
+_ns_building = {
+    "http://www.opengis.net/citygml/1.0": "http://www.opengis.net/citygml/building/1.0",
+    "http://www.opengis.net/citygml/2.0": "http://www.opengis.net/citygml/building/2.0",
+}
 
-def room_finder(gml_element):
+
+# compiled XPath lookups
+_room_finders = {ns: etree.ETXPath('.//{%s}Room' % ns) for ns in _ns_building.values()}
+_find_polygons = etree.ETXPath('.//{%s}Polygon' % ns_gml)
+_find_exteriors = etree.ETXPath('.//{%s}exterior' % ns_gml)
+_find_interiors = etree.ETXPath('.//{%s}interior' % ns_gml)
+_find_pos_lists = etree.ETXPath('.//{%s}posList' % ns_gml)
+_find_pos = etree.ETXPath('.//{%s}pos' % ns_gml)
+
+
+def room_finder(gml_element, ns=ns_bldg):
     """
     Find the <bldg:Room> element.
     :param gml_element:
+    :param ns: namespace of the building module
     :return: rooms
     """
-    rooms = gml_element.findall('.//{%s}Room' % ns_bldg)
+    if ns not in _room_finders:
+        _room_finders[ns] = etree.ETXPath('.//{%s}Room' % ns)
+    rooms = _room_finders[ns](gml_element)
     return rooms
 
 
@@ -26,7 +47,7 @@ def polygon_finder(gml_element):
     :param gml_element:
     :return: polygons within the element
     """
-    polygons = gml_element.findall('.//{%s}Polygon' % ns_gml)
+    polygons = _find_polygons(gml_element)
     return polygons
 
 
@@ -36,8 +57,8 @@ def extract_ring(gml_element):
     :param gml_element:
     :return: exterior, interiors
     """
-    exterior = gml_element.findall('.//{%s}exterior' %ns_gml)
-    interior = gml_element.findall('.//{%s}interior' %ns_gml)
+    exterior = _find_exteriors(gml_element)
+    interior = _find_interiors(gml_element)
     return exterior, interior
 
 
@@ -45,99 +66,140 @@ def extract_points(ring):
     """
     Extract points from a <gml:LinearRing>.
     :param ring: a ring
-    :return:
-    """
-    list_points = []
-    if len(ring.findall('.//{%s}posList' %ns_gml)) > 0:
-        points = ring.findall('.//{%s}posList' %ns_gml)[0].text
-        coords = points.split()
-        assert(len(coords) % 3 == 0)
-        for i in range(0, len(coords), 3):
-            list_points.append([float(coords[i]), float(coords[i+1]), float(coords[i+2])])
-    elif len(ring.findall('.//{%s}pos' %ns_gml)) > 0:
-        points = ring.findall('.//{%s}pos' %ns_gml)
-        for p in points:
-            coords = p.text.split()
-            assert(len(coords) % 3 == 0)
-            for i in range(0, len(coords), 3):
-                list_points.append([float(coords[i]), float(coords[i+1]), float(coords[i+2])])
+    :return: array (N, 3) of points
+    :raise ValueError: if a coordinate is malformed or the number of coordinates is not a multiple of 3
+    """
+    pos_lists = _find_pos_lists(ring)
+    if len(pos_lists) > 0:
+        text = pos_lists[0].text
     else:
-        return None
+        pos = _find_pos(ring)
+        if len(pos) == 0:
+            return None
+        text = ' '.join(p.text for p in pos)
 
-    return list_points
+    coords = np.array(text.split(), dtype=np.float64)
+    if len(coords) % 3 != 0:
+        raise ValueError('the number of coordinates is not a multiple of 3: {}'.format(len(coords)))
+    return coords.reshape(-1, 3)
 
 
 def extract_footprint(polygons):
     """
     Extract 2D footprints. Assume that the input data is represented as a prism in 3D.
     :param polygons: a pair of lower and upper polygon
-    :return: footprints, height of the lower polygon
+    :return: footprints as an array (N, 2), height of the lower polygon
     """
     heights = []
     prisms = []
     for poly in polygons:
         exterior, interior = extract_ring(poly)
         epoints = extract_points(exterior[0])
-        #irings = []
-        #for iring in inteior:
-        #    irings.append(gml_points(iring))
-        height = 0
-        for i in range(len(epoints)):
-            height += epoints[i][2]
-
-        heights.append(height/len(epoints))
+        heights.append(epoints[:, 2].mean())
         prisms.append(epoints)
 
-    index = np.array(heights).argmin()
-    list_points = [coordinates[0:2] for coordinates in prisms[index]]
+    index = np.argmin(heights)
+    return prisms[index][:, :2], float(heights[index])
 
-    return list_points, heights[index]
-
-
-def extract_footprint_from_prism(path):
-    citygml = etree.parse(path)
-    root = citygml.getroot()
-    if root.tag == "{http://www.opengis.net/citygml/1.0}CityModel":
-        ns_citygml = "http://www.opengis.net/citygml/1.0"
-        ns_gml = "http://www.opengis.net/gml"
-        ns_bldg = "http://www.opengis.net/citygml/building/1.0"
-    else:
-        ns_citygml = "http://www.opengis.net/citygml/2.0"
-        ns_gml = "http://www.opengis.net/gml"
-        ns_bldg = "http://www.opengis.net/citygml/building/2.0"
 
-    city_objects = []
-    buildings = []
-    footprints_by_floor = {}
+def iter_footprints_from_prism(path, tau=None, **kwargs):
+    """
+    Extract 2D footprints of rooms building by building without loading the whole document.
+    Each <core:cityObjectMember> is cleared after its buildings are processed, so the memory use does not grow
+    with the size of the document.
+    :param path: path to a CityGML document
+    :param tau: tolerance distance. If given, the footprints are simplified before they are yielded.
+    :param kwargs: other parameters of the simplification
+    :return: generator of (building id, footprints, heights of the footprints) for each building
+    """
+    members = ['{%s}cityObjectMember' % ns for ns in _ns_building]
+    for _, city_object in etree.iterparse(path, events=('end',), tag=members):
+        ns = etree.QName(city_object).namespace
+        for child in city_object.iterchildren('{%s}Building' % _ns_building[ns]):
+            footprints = []
+            heights = []
+            for room in room_finder(child, _ns_building[ns]):
+                polys = polygon_finder(room)
+                footprint, height = extract_footprint(polys)
+                footprints.append(Polygon(footprint))
+                heights.append(height)
+            if tau is not None:
+                footprints = list(prism.simplify_many(footprints, tau=tau, **kwargs))
+            yield child.get('{%s}id' % ns_gml), footprints, heights
 
-    for obj in root.getiterator('{%s}cityObjectMember' % ns_citygml):
-        city_objects.append(obj)
+        # release the processed elements
+        city_object.clear()
+        while city_object.getprevious() is not None:
+            del city_object.getparent()[0]
 
-    if len(city_objects) > 0:
-        for city_object in city_objects:
-            for child in city_object.getchildren():
-                if child.tag == '{%s}Building' % ns_bldg:
-                    buildings.append(child)
 
-        for b in buildings:
-            rooms = room_finder(b)
-            for room in rooms:
-                polys = polygon_finder(room)
-                footprint, height = extract_footprint(polys)
+def extract_footprint_from_prism(path):
+    """
+    Extract 2D footprints of rooms of all storeys of all buildings.
+    The storeys of a building are numbered from 0 by the distinct heights of its footprints.
+    :param path: path to a CityGML document
+    :return: GeoDataFrame of the footprints with the id of the building, the storey and the height
+    """
+    buildings = []
+    floors = []
+    geometries = []
+    heights = []
+    for building, footprints, _heights in iter_footprints_from_prism(path):
+        levels = np.unique(_heights)
+        buildings.extend([building] * len(footprints))
+        floors.extend(np.searchsorted(levels, _heights).tolist())
+        geometries.extend(footprints)
+        heights.extend(_heights)
+
+    footprints_of_buildings = GeoDataFrame({'building': buildings, 'floor': floors, 'height': heights},
+                                           geometry=geometries)
+    return footprints_of_buildings
 
-                if height not in footprints_by_floor:
-                    footprints_by_floor[height] = []
 
-                footprints_by_floor[height].append(Polygon(footprint))
+def _simplify_storey(geometries, tau, kwargs):
+    """
+    Simplify the footprints of a storey.
+    :param geometries: list of footprints
+    :param tau: tolerance distance
+    :param kwargs: other parameters of the simplification
+    :return: array of the simplified footprints
+    """
+    return prism.simplify_many(geometries, tau=tau, **kwargs)
 
-    footprints_of_buildings = GeoDataFrame()
-    for i in range(len(footprints_by_floor[0.0])):
-        footprints_of_buildings.loc[i, 'geometry'] = footprints_by_floor[0.0][i]
 
-    return footprints_of_buildings
+def simplify_floors(footprints, tau=1, workers=None, executor=None, **kwargs):
+    """
+    Simplify footprints storey by storey. Each storey of each building is an independent job,
+    so the storeys of a tall building are simplified in parallel.
+    :param footprints: GeoDataFrame of footprints with the building and height columns,
+        e.g., from extract_footprint_from_prism
+    :param tau: tolerance distance
+    :param workers: number of processes to simplify in parallel. If None or 1, it runs in the current process.
+    :param executor: executor (e.g., ProcessPoolExecutor) to run the storeys on instead of creating a process pool
+    :param kwargs: other parameters of prism.simplify_many
+    :return: GeoDataFrame of the simplified footprints aligned with the input.
+        A footprint is None if it collapses or fails to be simplified.
+    """
+    geometries = np.asarray(footprints.geometry.values, dtype=object)
+    positions = footprints.groupby(['building', 'height'], sort=False).indices.values()
+    simplified = np.empty(len(footprints), dtype=object)
+    if executor is None and (workers is None or workers <= 1):
+        for index in positions:
+            simplified[index] = _simplify_storey(list(geometries[index]), tau, kwargs)
+    else:
+        own = executor is None
+        if own:
+            executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            jobs = [(index, executor.submit(_simplify_storey, list(geometries[index]), tau, kwargs))
+                    for index in positions]
+            for index, job in jobs:
+                simplified[index] = job.result()
+        finally:
+            if own:
+                executor.shutdown()
+    return footprints.set_geometry(GeoSeries(simplified, index=footprints.index, crs=footprints.crs))
 
 
 if __name__ == '__main__':
     extract_footprint_from_prism('../data/lwm-prism.gml')
-
-
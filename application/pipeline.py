@@ -0,0 +1,152 @@
+"""
+File-to-file simplification of layers that do not fit in memory, chunk by chunk with a checkpoint to resume from
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import math
+import os
+from time import perf_counter
+import geopandas
+from geopandas import GeoSeries
+import numpy as np
+import prism
+import pyogrio
+import shapely
+
+__all__ = ['simplify_file']
+
+# drivers that cannot append features to an existing file
+_WRITE_ONCE = ('FlatGeobuf',)
+
+# drivers of a single layer named after the file
+_SINGLE_LAYER = ('ESRI Shapefile',)
+
+
+def simplify_file(source, destination, tau=1, chunk_size=10000, layer=None, workers=None, checkpoint=None,
+                  resume=True, **kwargs):
+    """
+    Simplify the polygons of a layer (e.g., GeoPackage, FlatGeobuf or Shapefile) into another file chunk by chunk.
+    Only a chunk of features is in memory at a time. Each simplified chunk is appended to the destination, and then
+    the checkpoint (a JSON file) records the number of features done, so a job that stops resumes after the last
+    chunk written. Each feature is written with all its attributes in the same order, so the number of features of
+    the destination is the number of features done. A geometry that collapses is written as None, and other geometries
+    than polygons and multipolygons are written as they are. The destination must support appending
+    (e.g., GeoPackage or Shapefile, not FlatGeobuf). The checkpoint is removed when the job completes.
+    :param source: path of the input
+    :param destination: path of the output
+    :param tau: tolerance distance
+    :param chunk_size: number of features of a chunk
+    :param layer: layer of the input (default: the first layer). The output layer has the same name
+        unless the destination is a Shapefile.
+    :param workers: number of processes to simplify a chunk in parallel. If None or 1, it runs in the current process.
+    :param checkpoint: path of the checkpoint (default: the destination with the suffix .checkpoint.json)
+    :param resume: condition whether or not it resumes from the checkpoint if it exists, otherwise it starts over
+    :param kwargs: other parameters of prism.simplify_many
+    :return: dictionary of the number of features, the number of features simplified by this call,
+        and the seconds spent on reading, simplifying and writing
+    """
+    driver = pyogrio.detect_write_driver(destination)
+    if driver in _WRITE_ONCE:
+        raise ValueError('{} does not support appending features. Write to a GeoPackage and convert it.'.format(driver))
+    if checkpoint is None:
+        checkpoint = destination + '.checkpoint.json'
+    info = pyogrio.read_info(source, layer=layer)
+    total = info['features']
+    if layer is None:
+        layer = pyogrio.list_layers(source)[0][0]
+    output_layer = None if driver in _SINGLE_LAYER else layer
+    params = dict(kwargs, tau=tau)
+    state = {'source': os.path.abspath(source), 'destination': os.path.abspath(destination), 'layer': layer,
+             'params': params, 'features': total, 'done': 0}
+
+    done = 0
+    if resume and os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            previous = json.load(f)
+        for key in ('source', 'destination', 'layer', 'params', 'features'):
+            if previous[key] != state[key]:
+                raise ValueError('the checkpoint {} is for another job ({}: {} != {})'.format(
+                    checkpoint, key, previous[key], state[key]))
+        # a chunk may have been written after the last checkpoint
+        done = pyogrio.read_info(destination, layer=output_layer)['features'] if os.path.exists(destination) else 0
+        if done < previous['done']:
+            raise ValueError('the destination has {} features, but the checkpoint has {}'.format(
+                done, previous['done']))
+    state['done'] = done
+
+    seconds = {'read': 0.0, 'simplify': 0.0, 'write': 0.0}
+    executor = None if workers is None or workers <= 1 else ProcessPoolExecutor(max_workers=workers)
+    try:
+        for offset in range(done, total, chunk_size):
+            start = perf_counter()
+            chunk = geopandas.read_file(source, layer=layer, rows=slice(offset, min(offset + chunk_size, total)))
+            seconds['read'] += perf_counter() - start
+
+            start = perf_counter()
+            chunk = _simplify_chunk(chunk, tau, workers, executor, kwargs)
+            seconds['simplify'] += perf_counter() - start
+
+            start = perf_counter()
+            # the first chunk overwrites the destination of a previous job
+            chunk.to_file(destination, layer=output_layer, driver=driver, mode='a' if offset > 0 else 'w',
+                          engine='pyogrio')
+            state['done'] = offset + len(chunk)
+            _write_checkpoint(checkpoint, state)
+            seconds['write'] += perf_counter() - start
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return {'features': total, 'simplified': total - done, 'seconds': seconds}
+
+
+def _simplify_chunk(chunk, tau, workers, executor, kwargs):
+    """
+    Simplify the polygons and multipolygons of a chunk.
+    :param chunk: GeoDataFrame of a chunk
+    :param tau: tolerance distance
+    :param workers: number of processes
+    :param executor: executor to run on, or None
+    :param kwargs: other parameters of prism.simplify_many
+    :return: GeoDataFrame of the simplified chunk
+    """
+    geometries = np.asarray(chunk.geometry.values, dtype=object)
+    polygonal = np.isin(shapely.get_type_id(geometries), (shapely.GeometryType.POLYGON,
+                                                          shapely.GeometryType.MULTIPOLYGON))
+    simplified = geometries.copy()
+    if polygonal.any():
+        simplified[polygonal] = prism.simplify_many(geometries[polygonal], tau=tau, workers=workers,
+                                                    executor=executor, **kwargs)
+    return chunk.set_geometry(GeoSeries(simplified, index=chunk.index, crs=chunk.crs))
+
+
+def _write_checkpoint(path, state):
+    """
+    Write a checkpoint atomically, so that a crash does not leave a broken checkpoint.
+    :param path: path of the checkpoint
+    :param state: state of the job
+    :return: None
+    """
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(state, f)
+    os.replace(temporary, path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('source', help='path of the input layer')
+    parser.add_argument('destination', help='path of the output (e.g., GeoPackage)')
+    parser.add_argument('--layer', default=None, help='layer of the input (default: the first layer)')
+    parser.add_argument('--tau', type=float, default=1, help='tolerance distance')
+    parser.add_argument('--epsilon', type=float, default=math.pi/36, help='tolerance angle in radians')
+    parser.add_argument('--validate', action='store_true',
+                        help='skip the operations that make a ring cross itself or another ring')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='number of features of a chunk')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1, help='number of processes')
+    parser.add_argument('--restart', action='store_true', help='start over instead of resuming from the checkpoint')
+    args = parser.parse_args()
+    print(simplify_file(args.source, args.destination, args.tau, args.chunk_size, args.layer, args.workers,
+                        resume=not args.restart, epsilon=args.epsilon, validate=args.validate))
@@ -0,0 +1,294 @@
+"""
+Benchmarks of the simplification with synthetic footprints.
+It measures the throughput, the peak memory and the scaling with the number of vertices of prism.simplify_ring,
+and compares them with the Douglas-Peucker simplification of Shapely at the matching tolerance.
+It also compares prism.simplify_coverage with prism.simplify_many on floors of rooms sharing walls.
+The results are written in JSON, and a previous result can be given to compare with.
+
+    python -m benchmarks.bench --output results.json [--quick] [--compare previous.json]
+"""
+import argparse
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import prism
+import shapely
+from benchmarks.generators import GENERATORS, floor
+
+__all__ = ['run', 'throughput', 'scaling', 'coverage', 'compare']
+
+# workloads of the throughput benchmark: generator, keyword arguments and the number of polygons
+_WORKLOADS = (
+    ('orthogonal_room', {'n_vertices': 64}, 500),
+    ('noisy_wall', {'n_vertices': 1024}, 50),
+    ('courtyard', {'n_holes': 16, 'n_vertices': 64}, 20),
+    ('corridor', {'n_vertices': 4096}, 10),
+)
+
+# generators of the scaling benchmark and the exponents of 2 of the numbers of vertices
+_SCALING = ('orthogonal_room', 'noisy_wall', 'corridor')
+_EXPONENTS = range(8, 17)
+_QUICK_EXPONENTS = range(8, 13)
+
+# number of floors of the coverage benchmark
+_FLOORS = 10
+
+
+def _rings(polygons):
+    """
+    Returns the rings of polygons.
+    :param polygons: list of polygons
+    :return: list of rings
+    """
+    rings = []
+    for polygon in polygons:
+        rings.append(polygon.exterior)
+        rings.extend(polygon.interiors)
+    return rings
+
+
+def _simplify_rings(rings, tau):
+    """
+    Simplify rings one by one with prism.simplify_ring. A ring that fails to be simplified is counted.
+    :param rings: list of rings
+    :param tau: tolerance distance
+    :return: simplified rings (None if a ring collapses or fails) and the number of failures
+    """
+    simplified = []
+    failures = 0
+    for ring in rings:
+        try:
+            simplified.append(prism.simplify_ring(ring, tau=tau))
+        except Exception:
+            simplified.append(None)
+            failures += 1
+    return simplified, failures
+
+
+def _best_time(function, repeat):
+    """
+    Returns the best elapsed time of a function and its last result.
+    :param function: function without arguments
+    :param repeat: number of runs
+    :return: elapsed time in seconds and the result
+    """
+    best = math.inf
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _peak_memory(function):
+    """
+    Returns the peak memory allocated by Python during a function.
+    Memory allocated by GEOS is not traced.
+    :param function: function without arguments
+    :return: peak memory in bytes
+    """
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _measure(method, rings, function, repeat):
+    """
+    Measure a simplification method on rings.
+    :param method: name of the method
+    :param rings: list of rings
+    :param function: function simplifying the rings, returning the simplified rings and the number of failures
+    :param repeat: number of runs
+    :return: dictionary of the measures
+    """
+    elapsed, (simplified, failures) = _best_time(function, repeat)
+    vertices = int(shapely.get_num_coordinates(rings).sum())
+    kept = np.array([ring is not None for ring in simplified], dtype=bool)
+    originals = np.asarray(rings, dtype=object)[kept]
+    simplified = np.asarray(simplified, dtype=object)[kept]
+    hausdorff = shapely.hausdorff_distance(originals, simplified) if kept.any() else np.empty(0)
+    return {
+        'method': method,
+        'seconds': elapsed,
+        'rings_per_second': len(rings) / elapsed,
+        'vertices_per_second': vertices / elapsed,
+        'peak_memory': _peak_memory(function),
+        'vertices_after': int(shapely.get_num_coordinates(simplified).sum()),
+        'collapsed': int(len(rings) - kept.sum() - failures),
+        'failures': failures,
+        'mean_hausdorff': float(hausdorff.mean()) if len(hausdorff) else None,
+    }
+
+
+def throughput(seed=0, tau=1.0, repeat=3, scale=1.0):
+    """
+    Measure the throughput of the workloads of synthetic footprints.
+    :param seed: seed of the random generator
+    :param tau: tolerance distance. Douglas-Peucker uses 3/5 of it as in application.experiments.
+    :param repeat: number of runs of each measure (the best is kept)
+    :param scale: factor of the number of polygons of each workload
+    :return: list of dictionaries of the measures
+    """
+    results = []
+    for name, kwargs, count in _WORKLOADS:
+        rng = np.random.default_rng(seed)
+        polygons = [GENERATORS[name](rng, **kwargs) for _ in range(max(1, int(count * scale)))]
+        rings = _rings(polygons)
+        workload = {'generator': name, 'parameters': kwargs, 'polygons': len(polygons), 'rings': len(rings),
+                    'vertices': int(shapely.get_num_coordinates(rings).sum())}
+        results.append(dict(workload, **_measure('prism', rings, lambda: _simplify_rings(rings, tau), repeat)))
+        array = np.asarray(rings, dtype=object)
+        results.append(dict(workload, **_measure('douglas_peucker', rings,
+                                                 lambda: (list(shapely.simplify(array, tau * 3 / 5)), 0), repeat)))
+    return results
+
+
+def scaling(seed=0, tau=1.0, exponents=_EXPONENTS):
+    """
+    Measure the time to simplify a single ring with increasing numbers of vertices.
+    The exponent of the growth is fitted on a log-log scale for each generator and method.
+    :param seed: seed of the random generator
+    :param tau: tolerance distance. Douglas-Peucker uses 3/5 of it as in application.experiments.
+    :param exponents: exponents of 2 of the numbers of vertices
+    :return: list of dictionaries of the measures
+    """
+    results = []
+    for name in _SCALING:
+        rng = np.random.default_rng(seed)
+        rings = [GENERATORS[name](rng, n_vertices=2 ** exponent).exterior for exponent in exponents]
+        for method, function in (('prism', lambda ring: _simplify_rings([ring], tau)),
+                                 ('douglas_peucker', lambda ring: ([shapely.simplify(ring, tau * 3 / 5)], 0))):
+            points = []
+            for ring in rings:
+                elapsed, (_, failures) = _best_time(lambda: function(ring), 1)
+                points.append({'vertices': len(ring.coords), 'seconds': elapsed, 'failures': failures})
+            if len(points) < 2:
+                results.append({'generator': name, 'method': method, 'points': points, 'exponent': None})
+                continue
+            sizes = np.log([point['vertices'] for point in points])
+            seconds = np.log([max(point['seconds'], 1e-9) for point in points])
+            results.append({'generator': name, 'method': method, 'points': points,
+                            'exponent': float(np.polyfit(sizes, seconds, 1)[0])})
+    return results
+
+
+def _overlap(polygons):
+    """
+    Returns the total area of the overlaps between polygons.
+    :param polygons: sequence of polygons or None
+    :return: area counted more than once by the polygons
+    """
+    polygons = shapely.make_valid(np.asarray([p for p in polygons if p is not None], dtype=object))
+    return max(0.0, float(shapely.area(polygons).sum() - shapely.union_all(polygons).area))
+
+
+def coverage(seed=0, tau=1.0, repeat=3, n_floors=_FLOORS):
+    """
+    Measure prism.simplify_coverage and prism.simplify_many on floors of rooms sharing noisy walls.
+    :param seed: seed of the random generator
+    :param tau: tolerance distance
+    :param repeat: number of runs of each measure (the best is kept)
+    :param n_floors: number of floors
+    :return: list of dictionaries of the measures
+    """
+    rng = np.random.default_rng(seed)
+    floors = [floor(rng) for _ in range(n_floors)]
+    results = []
+    for method, function in (('simplify_coverage', prism.simplify_coverage), ('simplify_many', prism.simplify_many)):
+        seconds = 0.0
+        overlap = 0.0
+        for rooms in floors:
+            elapsed, simplified = _best_time(lambda: function(rooms, tau=tau), repeat)
+            seconds += elapsed
+            overlap += _overlap(simplified)
+        results.append({'generator': 'floor', 'method': method, 'floors': n_floors,
+                        'rooms': sum(len(rooms) for rooms in floors), 'seconds': seconds,
+                        'floors_per_second': n_floors / seconds, 'overlap_per_floor': overlap / n_floors})
+    return results
+
+
+def run(seed=0, tau=1.0, quick=False):
+    """
+    Run all benchmarks.
+    :param seed: seed of the random generator
+    :param tau: tolerance distance
+    :param quick: condition whether or not it runs smaller workloads
+    :return: dictionary of the environment and the results
+    """
+    return {
+        'environment': {
+            'prism': prism.__version__,
+            'shapely': shapely.__version__,
+            'numpy': np.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        },
+        'parameters': {'seed': seed, 'tau': tau, 'quick': quick},
+        'throughput': throughput(seed, tau, repeat=1 if quick else 3, scale=0.2 if quick else 1.0),
+        'scaling': scaling(seed, tau, _QUICK_EXPONENTS if quick else _EXPONENTS),
+        'coverage': coverage(seed, tau, repeat=1 if quick else 3, n_floors=2 if quick else _FLOORS),
+    }
+
+
+def compare(current, previous):
+    """
+    Returns the ratios of the throughput (vertices/s), the scaling exponents and the throughput of the coverage
+    (floors/s) of current results to previous ones.
+    :param current: current results
+    :param previous: previous results
+    :return: list of tuples of the benchmark, generator, method, current value, previous value and ratio
+    """
+    rows = []
+    for key, value in (('throughput', 'vertices_per_second'), ('scaling', 'exponent'),
+                       ('coverage', 'floors_per_second')):
+        before = {(result['generator'], result['method']): result[value] for result in previous.get(key, [])}
+        for result in current.get(key, []):
+            old = before.get((result['generator'], result['method']))
+            if old and result[value] is not None:
+                rows.append((key, result['generator'], result['method'], result[value], old, result[value] / old))
+    return rows
+
+
+def _main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', help='path to write the results in JSON (default: standard output)')
+    parser.add_argument('--compare', help='path to previous results in JSON to compare with')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random generator')
+    parser.add_argument('--tau', type=float, default=1.0, help='tolerance distance')
+    parser.add_argument('--quick', action='store_true', help='run smaller workloads')
+    args = parser.parse_args(argv)
+
+    results = run(args.seed, args.tau, args.quick)
+    text = json.dumps(results, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    for result in results['throughput']:
+        print('{generator:>16} {method:>16} {rings_per_second:12.1f} rings/s {vertices_per_second:12.1f} vertices/s '
+              '{peak_memory:12d} B'.format(**result), file=sys.stderr)
+    for result in results['scaling']:
+        if result['exponent'] is not None:
+            print('{generator:>16} {method:>16} O(n^{exponent:.2f})'.format(**result), file=sys.stderr)
+    for result in results['coverage']:
+        print('{generator:>16} {method:>17} {floors_per_second:11.1f} floors/s {overlap_per_floor:10.2f} overlap/floor'
+              .format(**result), file=sys.stderr)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        for row in compare(results, previous):
+            print('{:>10} {:>16} {:>16} {:14.3f} {:14.3f} {:7.2f}x'.format(*row), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,191 @@
+"""
+Generators of synthetic indoor footprints for benchmarks.
+Every generator takes a random generator, so the same seed produces the same footprints.
+"""
+import numpy as np
+from shapely.geometry import Polygon
+
+__all__ = ['orthogonal_room', 'noisy_wall', 'courtyard', 'corridor', 'floor', 'GENERATORS']
+
+
+def _densify(corners, n_vertices):
+    """
+    Returns vertices sampled along the boundary of a closed polyline with approximately the number of vertices.
+    The corners are always kept.
+    :param corners: array (K, 2) of the corners without the closing vertex
+    :param n_vertices: number of vertices to aim at
+    :return: array (N, 2) of the vertices without the closing vertex, and the index of the corner of each vertex
+    """
+    edges = np.roll(corners, -1, axis=0) - corners
+    lengths = np.hypot(edges[:, 0], edges[:, 1])
+    counts = np.maximum(1, np.round(lengths / lengths.sum() * n_vertices).astype(np.int64))
+    index = np.repeat(np.arange(len(corners)), counts)
+    offsets = np.arange(len(index)) - np.repeat(np.cumsum(counts) - counts, counts)
+    ratios = offsets / counts[index]
+    return corners[index] + edges[index] * ratios[:, np.newaxis], index
+
+
+def _perturb(rng, corners, n_vertices, noise):
+    """
+    Returns vertices sampled along the boundary of a closed polyline and moved across the walls with Gaussian noise.
+    :param rng: random generator
+    :param corners: array (K, 2) of the corners without the closing vertex
+    :param n_vertices: number of vertices to aim at
+    :param noise: standard deviation of the noise
+    :return: array (N, 2) of the vertices without the closing vertex
+    """
+    vertices, walls = _densify(corners, n_vertices)
+    edges = np.roll(corners, -1, axis=0) - corners
+    normals = np.column_stack((edges[:, 1], -edges[:, 0])) / np.hypot(edges[:, 0], edges[:, 1])[:, np.newaxis]
+    # a vertex moves less than half its distance to the corners, so that walls do not cross at the corners
+    along = np.hypot(*(vertices - corners[walls]).T)
+    lengths = np.hypot(edges[:, 0], edges[:, 1])
+    limits = np.minimum(along, lengths[walls] - along) / 2
+    offsets = np.clip(rng.normal(0.0, noise, len(vertices)), -limits, limits)
+    return vertices + normals[walls] * offsets[:, np.newaxis]
+
+
+def _polygon(vertices, holes=()):
+    """
+    Returns a polygon from vertices without the closing vertex.
+    :param vertices: array (N, 2) of the exterior
+    :param holes: arrays of the interiors
+    :return: a polygon
+    """
+    return Polygon(vertices, [hole for hole in holes])
+
+
+def orthogonal_room(rng, n_vertices=64, size=20.0, notch=0.4):
+    """
+    Returns a rectangular room whose walls have small orthogonal notches such as pillars and door frames.
+    :param rng: random generator
+    :param n_vertices: number of vertices to aim at (a multiple of 16 gives exactly that number)
+    :param size: size of the room
+    :param notch: maximum depth and width of notches
+    :return: a polygon
+    """
+    width, height = size * rng.uniform(0.6, 1.4, 2)
+    n_notches = max(1, n_vertices // 16)
+    corners = []
+    # each wall gets n_notches notches of 4 vertices after its corner
+    for (x0, y0), (dx, dy), length in (((0, 0), (1, 0), width), ((width, 0), (0, 1), height),
+                                       ((width, height), (-1, 0), width), ((0, height), (0, -1), height)):
+        corners.append((x0, y0))
+        # one notch in each slot of the middle of the wall, so that notches do not overlap
+        slot = 0.8 * length / n_notches
+        widths = rng.uniform(0.2, 1.0, n_notches) * min(notch, slot / 2)
+        positions = 0.1 * length + slot * np.arange(n_notches) + rng.uniform(0.0, 1.0, n_notches) * (slot - widths)
+        depths = rng.uniform(-1.0, 1.0, n_notches) * notch
+        for position, w, depth in zip(positions, widths, depths):
+            # outward normal of a counterclockwise wall is (dy, -dx)
+            for along, out in ((position, 0), (position, depth), (position + w, depth), (position + w, 0)):
+                corners.append((x0 + dx * along + dy * out, y0 + dy * along - dx * out))
+    return _polygon(np.array(corners, dtype=np.float64))
+
+
+def noisy_wall(rng, n_vertices=1024, size=20.0, noise=0.05):
+    """
+    Returns a room of a few walls sampled densely with Gaussian noise like a scanned point cloud.
+    :param rng: random generator
+    :param n_vertices: number of vertices
+    :param size: size of the room
+    :param noise: standard deviation of the noise
+    :return: a polygon
+    """
+    width, height = size * rng.uniform(0.6, 1.4, 2)
+    corners = np.array([(0, 0), (width, 0), (width, height * 0.6), (width * 0.7, height * 0.6),
+                        (width * 0.7, height), (0, height)], dtype=np.float64)
+    return _polygon(_perturb(rng, corners, n_vertices, noise))
+
+
+def courtyard(rng, n_holes=16, size=40.0, n_vertices=64):
+    """
+    Returns a building with a grid of courtyards (holes) whose boundaries are orthogonal rooms.
+    :param rng: random generator
+    :param n_holes: number of holes
+    :param size: size of the building
+    :param n_vertices: number of vertices of each ring to aim at
+    :return: a polygon with holes
+    """
+    side = int(np.ceil(np.sqrt(n_holes)))
+    cell = size / side
+    # the exterior covers the grid with a margin
+    exterior = np.asarray(orthogonal_room(rng, n_vertices, size).exterior.coords)[:-1]
+    exterior = (exterior - exterior.min(axis=0)) / np.ptp(exterior, axis=0) * (size + cell * 0.4) - cell * 0.2
+    holes = []
+    for i in range(n_holes):
+        room = np.asarray(orthogonal_room(rng, n_vertices, cell * 0.5, notch=cell * 0.02).exterior.coords)[:-1]
+        room = room * (0.5 * cell / np.ptp(room, axis=0).max())
+        holes.append(room[::-1] + (i % side * cell + cell * 0.25, i // side * cell + cell * 0.25))
+    return _polygon(exterior, holes)
+
+
+def corridor(rng, n_vertices=4096, length=2000.0, width=3.0, n_bends=20, noise=0.02):
+    """
+    Returns a very long corridor with orthogonal bends whose walls are sampled densely with noise.
+    :param rng: random generator
+    :param n_vertices: number of vertices
+    :param length: total length of the center line
+    :param width: width of the corridor
+    :param n_bends: number of bends
+    :param noise: standard deviation of the noise
+    :return: a polygon
+    """
+    # a staircase center line going right and up alternately
+    steps = rng.uniform(0.5, 1.5, n_bends + 1)
+    steps *= length / steps.sum()
+    directions = np.array([(1.0, 0.0), (0.0, 1.0)])[np.arange(n_bends + 1) % 2]
+    centers = np.vstack(([0.0, 0.0], np.cumsum(directions * steps[:, np.newaxis], axis=0)))
+    half = width / 2
+    # the offset walls of a staircase share the same bends, shifted along the diagonal
+    right = centers + (half, -half)
+    left = centers + (-half, half)
+    # the ends are square to the first and last steps
+    right[0], left[0] = (0.0, -half), (0.0, half)
+    if n_bends % 2:  # the last step goes up
+        right[-1], left[-1] = centers[-1] + (half, 0.0), centers[-1] + (-half, 0.0)
+    else:
+        right[-1], left[-1] = centers[-1] + (0.0, -half), centers[-1] + (0.0, half)
+    corners = np.vstack((right, left[::-1]))
+    return _polygon(_perturb(rng, corners, n_vertices, noise))
+
+
+def floor(rng, rows=4, cols=4, size=10.0, n_vertices=64, noise=0.05):
+    """
+    Returns the rooms of a floor on a grid whose shared walls are sampled densely with Gaussian noise.
+    Neighboring rooms share the vertices of their walls exactly, as required by prism.simplify_coverage.
+    :param rng: random generator
+    :param rows: number of rows of rooms
+    :param cols: number of columns of rooms
+    :param size: size of a room
+    :param n_vertices: number of vertices of each wall
+    :param noise: standard deviation of the noise
+    :return: list of polygons
+    """
+    t = np.arange(1, n_vertices) / n_vertices * size
+    limits = np.minimum(t, size - t) / 2
+
+    def wall(start, direction):
+        offsets = np.clip(rng.normal(0.0, noise, len(t)), -limits, limits)
+        normal = np.array((-direction[1], direction[0]))
+        return start + np.outer(t, direction) + np.outer(offsets, normal)
+
+    # walls from the lower or left corner of each cell of the grid
+    across = {(i, j): wall((j * size, i * size), (1.0, 0.0)) for i in range(rows + 1) for j in range(cols)}
+    along = {(i, j): wall((j * size, i * size), (0.0, 1.0)) for i in range(rows) for j in range(cols + 1)}
+    rooms = []
+    for i in range(rows):
+        for j in range(cols):
+            x0, y0, x1, y1 = j * size, i * size, (j + 1) * size, (i + 1) * size
+            rooms.append(_polygon(np.vstack(([x0, y0], across[i, j], [x1, y0], along[i, j + 1], [x1, y1],
+                                             across[i + 1, j][::-1], [x0, y1], along[i, j][::-1]))))
+    return rooms
+
+
+# generators of single polygons by their names
+GENERATORS = {
+    'orthogonal_room': orthogonal_room,
+    'noisy_wall': noisy_wall,
+    'courtyard': courtyard,
+    'corridor': corridor,
+}
@@ -1,4 +1,10 @@
 
 from .simplify import *
+from .batch import *
+from .progressive import *
+from .cache import *
+from .stats import *
+from .coverage import *
+from .incremental import *
 
 __version__ = '0.1'
@@ -0,0 +1,44 @@
+"""
+Simplify a stream of polygons given one per line as WKT, hex-encoded WKB or GeoJSON (a feature or a geometry).
+The output has one line per input line in the same order and the same format. The properties of GeoJSON features
+are kept. Other geometries than polygons and multipolygons are written as they are.
+
+    python -m prism [input] [--output path] [--tau 1] [--workers 4] < polygons.wkt > simplified.wkt
+
+The lines are read in batches, and at most a bounded number of batches are in flight on the workers,
+so the memory use does not grow with the size of the input.
+"""
+import argparse
+import os
+import sys
+from prism.cli import run, _add_arguments, _kwargs, _FORMATS
+
+
+def _main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m prism', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('input', nargs='?', default='-', help='path to the input (default: standard input)')
+    parser.add_argument('-o', '--output', default='-', help='path to the output (default: standard output)')
+    parser.add_argument('-f', '--format', choices=_FORMATS, default='auto',
+                        help='format of the lines (default: detected for each line)')
+    _add_arguments(parser)
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1, help='number of processes')
+    parser.add_argument('--batch-size', type=int, default=256, help='number of lines sent to a worker at once')
+    parser.add_argument('--window', type=int, default=None,
+                        help='maximum number of batches in flight (default: twice the number of workers)')
+    args = parser.parse_args(argv)
+
+    stream = sys.stdin if args.input == '-' else open(args.input)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        n_errors = run(stream, output, args.format, args.precision, args.workers, args.batch_size, args.window,
+                       **_kwargs(args))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if output is not sys.stdout:
+            output.close()
+    return 1 if n_errors > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(_main())
@@ -0,0 +1,73 @@
+"""
+Geometry kernel with plain floats for the simplification loop.
+The functions follow the arithmetic of GEOS, so they return the same results as the corresponding Shapely methods
+without creating geometry objects.
+"""
+from math import sqrt
+
+__all__ = ['distance', 'segment_length', 'point_segment_distance', 'interpolate']
+
+
+def distance(a, b):
+    """
+    Returns the distance between two points.
+    :param a: a point
+    :param b: another point
+    :return: the distance between a and b
+    """
+    dx = a[0] - b[0]
+    dy = a[1] - b[1]
+    return sqrt(dx * dx + dy * dy)
+
+
+def segment_length(sp, ep):
+    """
+    Returns the length of a segment, i.e., LineString([sp, ep]).length.
+    :param sp: start point
+    :param ep: end point
+    :return: the length of the segment
+    """
+    dx = ep[0] - sp[0]
+    dy = ep[1] - sp[1]
+    return sqrt(dx * dx + dy * dy)
+
+
+def point_segment_distance(p, sp, ep):
+    """
+    Returns the distance between a point and a segment, i.e., LineString([sp, ep]).distance(Point(p)).
+    :param p: a point
+    :param sp: start point of the segment
+    :param ep: end point of the segment
+    :return: the distance between the point and the segment
+    """
+    if sp[0] == ep[0] and sp[1] == ep[1]:
+        return distance(p, sp)
+    dx = ep[0] - sp[0]
+    dy = ep[1] - sp[1]
+    len2 = dx * dx + dy * dy
+    r = ((p[0] - sp[0]) * dx + (p[1] - sp[1]) * dy) / len2
+    if r <= 0.0:
+        return distance(p, sp)
+    if r >= 1.0:
+        return distance(p, ep)
+    s = ((sp[1] - p[1]) * dx - (sp[0] - p[0]) * dy) / len2
+    return abs(s) * sqrt(len2)
+
+
+def interpolate(sp, ep, ratio):
+    """
+    Returns the point at the ratio of the length along a segment,
+    i.e., LineString([sp, ep]).interpolate(ratio, normalized=True).
+    :param sp: start point of the segment
+    :param ep: end point of the segment
+    :param ratio: ratio of the length between 0 and 1
+    :return: the interpolated point
+    """
+    length = segment_length(sp, ep)
+    d = ratio * length
+    if d <= 0.0:
+        return sp[0], sp[1]
+    if d >= length:
+        return ep[0], ep[1]
+    fraction = d / length
+    return (ep[0] - sp[0]) * fraction + sp[0], (ep[1] - sp[1]) * fraction + sp[1]
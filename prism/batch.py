@@ -0,0 +1,338 @@
+"""
+Simplification of collections of polygons
+"""
+from concurrent.futures import ProcessPoolExecutor
+from math import pi
+import os
+from time import perf_counter
+import warnings
+import numpy as np
+import shapely
+from prism.prefilter import strip_redundant_vertices
+from prism.ring import Ring
+from prism.simplify import _simplify, _check_cache
+from prism.stats import SimplificationStats
+from prism.validation import SegmentGrid
+
+__all__ = ['simplify_many']
+
+# geometry type ids of Shapely
+_POLYGON = 3
+_MULTIPOLYGON = 6
+
+# number of chunks per worker to balance the load when the polygons are not uniform
+_CHUNKS_PER_WORKER = 4
+
+
+def simplify_many(geoms, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, merge_first=False, workers=None,
+                  executor=None, stats=None, prefilter=False, validate=False, max_vertices=None, time_limit=None,
+                  cache=None):
+    """
+    Returns simplified polygons of a collection of polygons.
+    The coordinates are extracted and the results are built in bulk, so it requires Shapely 2.
+    The polygons can be simplified in parallel. They are split into chunks balanced by the number of vertices,
+    and each chunk is sent to a process as flat coordinate buffers. The result does not depend on the number of workers.
+    :param geoms: sequence of polygons, multipolygons or None, e.g., a list, a GeoSeries, or an array of geometries
+    :param tau: tolerance distance
+    :param epsilon: tolerance angle
+    :param delta: angle threshold used to determine if consecutive segments are collinear
+    :param gamma: distance threshold used to determine whether to join neighboring segments
+    :param merge_first: condition whether or not it merges neighbors first when possible
+    :param workers: number of processes to simplify in parallel. If None or 1, it runs in the current process.
+    :param executor: executor (e.g., ProcessPoolExecutor) to run the chunks on instead of creating a process pool
+    :param stats: statistics (prism.SimplificationStats) to add the statistics of the simplification to, or None.
+        The seconds and iterations of each geometry are set to its geometry_seconds and geometry_iterations
+        to find out which geometries are slow.
+    :param prefilter: condition whether or not it strips duplicate and collinear vertices in bulk before the main loop
+    :param validate: condition whether or not it skips the operations that make a ring cross itself or another ring
+    :param max_vertices: maximum number of vertices of each ring. If a ring has more vertices after the simplification,
+        the tolerance distance is doubled and the simplification continues until it has at most max_vertices.
+    :param time_limit: seconds to spend on each polygon (each part of a multipolygon). When the time is up,
+        the rings simplified so far are returned, which bounds the time of pathological polygons.
+    :param cache: cache (prism.SimplificationCache) to look up and store the simplified rings in, or None.
+        The polygons are simplified in the current process. It is not supported with workers, executor, stats,
+        validate and time_limit.
+    :return: array of simplified geometries aligned with the input. A geometry is None if the input is None or empty,
+        if the exterior of the polygon (all polygons for a multipolygon) collapses, or if the simplification fails.
+        Collapsed holes are dropped.
+    """
+    if cache is not None:
+        _check_cache(stats, validate, time_limit)
+        if executor is not None or workers is not None and workers > 1:
+            raise ValueError('workers and executor are not supported with a cache')
+    geoms = _as_geometry_array(geoms)
+    coordinates, ring_offsets, part_offsets, geom_index = _to_buffers(geoms)
+    params = (tau, epsilon, delta, gamma, merge_first, prefilter, validate, max_vertices, time_limit,
+              stats is not None)
+    if executor is None and (workers is None or workers <= 1):
+        coordinates, ring_offsets, kept, failed, costs = _simplify_buffers(coordinates, ring_offsets, part_offsets,
+                                                                           *params, cache=cache)
+    elif executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            coordinates, ring_offsets, kept, failed, costs = _simplify_chunks(executor, workers, coordinates,
+                                                                              ring_offsets, part_offsets, params)
+    else:
+        coordinates, ring_offsets, kept, failed, costs = _simplify_chunks(executor, workers or os.cpu_count() or 1,
+                                                                          coordinates, ring_offsets, part_offsets,
+                                                                          params)
+    if stats is not None:
+        _stats, seconds, iterations = costs
+        stats.merge(_stats)
+        stats._set_geometry_costs(np.bincount(geom_index, seconds, minlength=len(geoms)),
+                                  np.bincount(geom_index, iterations, minlength=len(geoms)).astype(np.int64))
+    if len(failed) > 0:
+        warnings.warn('{} polygon(s) failed to be simplified and are returned as None'.format(len(failed)),
+                      RuntimeWarning)
+    return _from_buffers(geoms, coordinates, ring_offsets, part_offsets, geom_index, kept)
+
+
+def _as_geometry_array(geoms):
+    """
+    Returns a one-dimensional array of geometries only with polygons, multipolygons and None.
+    :param geoms: sequence of geometries
+    :return: array of geometries
+    """
+    if hasattr(geoms, 'values') and not isinstance(geoms, np.ndarray):
+        geoms = geoms.values  # a GeoSeries
+    geoms = np.asarray(geoms, dtype=object).ravel()
+    type_ids = shapely.get_type_id(geoms)
+    invalid = (type_ids != _POLYGON) & (type_ids != _MULTIPOLYGON) & (type_ids != -1)
+    if invalid.any():
+        raise TypeError('Only Polygon, MultiPolygon and None are supported, but got {}'.format(
+            geoms[invalid.argmax()].geom_type))
+    return geoms
+
+
+def _to_buffers(geoms):
+    """
+    Extract the coordinates of the rings of geometries in bulk.
+    :param geoms: array of polygons, multipolygons and None
+    :return: coordinates (N, 2), offsets of rings in the coordinates, offsets of polygons in the rings,
+        and the index of the input geometry of each polygon
+    """
+    parts, geom_index = shapely.get_parts(geoms, return_index=True)
+    rings, part_index = shapely.get_rings(parts, return_index=True)
+    coordinates, ring_index = shapely.get_coordinates(rings, return_index=True)
+    ring_offsets = np.zeros(len(rings) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ring_index, minlength=len(rings)), out=ring_offsets[1:])
+    part_offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(part_index, minlength=len(parts)), out=part_offsets[1:])
+    return coordinates, ring_offsets, part_offsets, geom_index
+
+
+def _chunks(ring_offsets, part_offsets, n_chunks):
+    """
+    Split polygons into contiguous chunks with similar numbers of vertices.
+    :param ring_offsets: offsets of rings in the coordinates
+    :param part_offsets: offsets of polygons in the rings
+    :param n_chunks: number of chunks to aim at
+    :return: boundaries of the chunks in the polygons
+    """
+    n_parts = len(part_offsets) - 1
+    vertices = ring_offsets[part_offsets]  # cumulative number of vertices at each polygon boundary
+    targets = np.linspace(0, vertices[-1], n_chunks + 1)[1:-1]
+    boundaries = np.searchsorted(vertices, targets)
+    return np.unique(np.concatenate(([0], boundaries, [n_parts])))
+
+
+def _simplify_chunks(executor, workers, coordinates, ring_offsets, part_offsets, params):
+    """
+    Simplify the rings in coordinate buffers chunk by chunk with an executor.
+    A chunk that fails in the executor (e.g., a worker crashes) is simplified again in the current process.
+    :param executor: executor to run the chunks on
+    :param workers: number of workers of the executor
+    :param coordinates: coordinates (N, 2) of closed rings
+    :param ring_offsets: offsets of rings in the coordinates
+    :param part_offsets: offsets of polygons in the rings
+    :param params: parameters of the simplification
+    :return: simplified coordinates, offsets of the simplified rings, mask of the rings that are kept,
+        indices of the polygons that failed, and the costs (see _simplify_buffers)
+    """
+    if len(part_offsets) == 1:
+        return _simplify_buffers(coordinates, ring_offsets, part_offsets, *params)
+    boundaries = _chunks(ring_offsets, part_offsets, workers * _CHUNKS_PER_WORKER)
+    chunks = []
+    for a, b in zip(boundaries[:-1], boundaries[1:]):
+        _ring_offsets = ring_offsets[part_offsets[a]:part_offsets[b] + 1]
+        chunks.append((coordinates[_ring_offsets[0]:_ring_offsets[-1]], _ring_offsets - _ring_offsets[0],
+                       part_offsets[a:b + 1] - part_offsets[a]))
+    futures = [executor.submit(_simplify_buffers, *chunk, *params) for chunk in chunks]
+
+    results = []
+    for chunk, future in zip(chunks, futures):
+        try:
+            results.append(future.result())
+        except Exception:
+            results.append(_simplify_buffers(*chunk, *params))
+
+    new_coordinates = np.concatenate([result[0] for result in results])
+    sizes = np.concatenate([np.diff(result[1]) for result in results])
+    new_offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=new_offsets[1:])
+    kept = np.concatenate([result[2] for result in results])
+    failed = np.concatenate([result[3] + a for result, a in zip(results, boundaries[:-1])])
+    costs = None
+    if params[-1]:
+        stats = SimplificationStats()
+        for result in results:
+            stats.merge(result[4][0])
+        costs = (stats, np.concatenate([result[4][1] for result in results]),
+                 np.concatenate([result[4][2] for result in results]))
+    return new_coordinates, new_offsets, kept, failed, costs
+
+
+def _simplify_buffers(coordinates, ring_offsets, part_offsets, tau, epsilon, delta, gamma, merge_first,
+                      prefilter=False, validate=False, max_vertices=None, time_limit=None, collect_stats=False,
+                      cache=None):
+    """
+    Simplify the rings in coordinate buffers. A polygon that fails to be simplified is removed.
+    :param coordinates: coordinates (N, 2) of closed rings
+    :param ring_offsets: offsets of rings in the coordinates
+    :param part_offsets: offsets of polygons in the rings
+    :param tau: tolerance distance
+    :param epsilon: tolerance angle
+    :param delta: angle threshold used to determine if consecutive segments are collinear
+    :param gamma: distance threshold used to determine whether to join neighboring segments
+    :param merge_first: condition whether or not it merges neighbors first when possible
+    :param prefilter: condition whether or not it strips duplicate and collinear vertices in bulk before the main loop
+    :param validate: condition whether or not it skips the operations that make a ring cross itself or another ring
+    :param max_vertices: maximum number of vertices of each ring, or None
+    :param time_limit: seconds to spend on each polygon, or None
+    :param collect_stats: condition whether or not it collects statistics
+    :param cache: cache of simplified rings (prism.SimplificationCache), or None. It does not support validate,
+        time_limit and collect_stats.
+    :return: simplified coordinates, offsets of the simplified rings, mask of the rings that are kept,
+        indices of the polygons that failed, and the costs, i.e., statistics with the seconds and iterations of each
+        polygon if collect_stats is set, otherwise None
+    """
+    x = np.ascontiguousarray(coordinates[:, 0], dtype=np.float64)
+    y = np.ascontiguousarray(coordinates[:, 1], dtype=np.float64)
+    kept = np.zeros(len(ring_offsets) - 1, dtype=bool)
+    failed = []
+    new_x = []
+    new_y = []
+    n_parts = len(part_offsets) - 1
+    stats = None
+    if collect_stats:
+        stats = SimplificationStats()
+        seconds = np.zeros(n_parts, dtype=np.float64)
+        iterations = np.zeros(n_parts, dtype=np.int64)
+    for part in range(n_parts):
+        exterior = part_offsets[part]
+        n_rings = len(new_x)
+        if stats is not None:
+            part_start = perf_counter()
+            part_iterations = stats.iterations
+        try:
+            deadline = None if time_limit is None else perf_counter() + time_limit
+            guard = None
+            if validate:
+                bounds = ring_offsets[exterior:part_offsets[part + 1] + 1]
+                guard = SegmentGrid([(x[a:b - 1].tolist(), y[a:b - 1].tolist())
+                                     for a, b in zip(bounds[:-1], bounds[1:])], tau)
+            for i in range(exterior, part_offsets[part + 1]):
+                start, end = ring_offsets[i], ring_offsets[i + 1] - 1  # without the closing vertex
+                ring = None
+                collapsed = False  # whether the ring collapses to no area with validate
+                if cache is not None:
+                    simplified = cache._simplify_coordinates(coordinates[start:end], tau, epsilon, delta, gamma,
+                                                             merge_first, prefilter, max_vertices)
+                    if simplified is None:
+                        if i == exterior:
+                            break
+                        continue
+                    new_x.append(np.ascontiguousarray(simplified[:, 0]))
+                    new_y.append(np.ascontiguousarray(simplified[:, 1]))
+                    kept[i] = True
+                    continue
+                if end - start >= 3:
+                    if stats is not None:
+                        phase_start = perf_counter()
+                    if prefilter:
+                        ring = Ring.from_xy(*strip_redundant_vertices(x[start:end], y[start:end], delta))
+                    else:
+                        ring = Ring.from_xy(x[start:end], y[start:end])
+                    if stats is not None:
+                        stats._add_time('prepare', phase_start)
+                    if guard is not None:
+                        guard.attach(i - exterior, ring)
+                    ring = _simplify(ring, tau, epsilon, delta, gamma, merge_first, stats=stats, guard=guard,
+                                     max_vertices=max_vertices, deadline=deadline)
+                    if guard is not None:
+                        collapsed = not guard.detach(i - exterior)
+                    if stats is not None:
+                        stats._add_ring(end - start, len(ring))
+                if ring is None or len(ring) < 3 or collapsed:
+                    if i == exterior:
+                        break  # a polygon without its exterior is removed with its holes
+                    continue
+                if stats is not None:
+                    phase_start = perf_counter()
+                _x, _y = _ring_to_arrays(ring)
+                if stats is not None:
+                    stats._add_time('output', phase_start)
+                new_x.append(_x)
+                new_y.append(_y)
+                kept[i] = True
+        except Exception:
+            # isolate the failure to the polygon
+            del new_x[n_rings:]
+            del new_y[n_rings:]
+            kept[exterior:part_offsets[part + 1]] = False
+            failed.append(part)
+        if stats is not None:
+            seconds[part] = perf_counter() - part_start
+            iterations[part] = stats.iterations - part_iterations
+
+    new_offsets = np.zeros(len(new_x) + 1, dtype=np.int64)
+    np.cumsum([len(_x) for _x in new_x], out=new_offsets[1:])
+    if new_x:
+        new_coordinates = np.column_stack((np.concatenate(new_x), np.concatenate(new_y)))
+    else:
+        new_coordinates = np.empty((0, 2), dtype=np.float64)
+    costs = None if stats is None else (stats, seconds, iterations)
+    return new_coordinates, new_offsets, kept, np.array(failed, dtype=np.int64), costs
+
+
+def _ring_to_arrays(ring):
+    """
+    Returns the coordinates of a ring as a pair of arrays of x and y including the closing vertex.
+    :param ring: ring
+    :return: x and y coordinates
+    """
+    alive = np.frombuffer(ring._alive, dtype=np.bool_)
+    x = np.frombuffer(ring._x, dtype=np.float64)[alive]
+    y = np.frombuffer(ring._y, dtype=np.float64)[alive]
+    return np.append(x, x[0]), np.append(y, y[0])
+
+
+def _from_buffers(geoms, coordinates, ring_offsets, part_offsets, geom_index, kept):
+    """
+    Build the simplified geometries in bulk.
+    :param geoms: array of input geometries
+    :param coordinates: simplified coordinates (M, 2)
+    :param ring_offsets: offsets of the simplified rings in the coordinates
+    :param part_offsets: offsets of input polygons in the input rings
+    :param geom_index: index of the input geometry of each input polygon
+    :param kept: mask of the input rings that are kept
+    :return: array of simplified geometries
+    """
+    result = np.full(len(geoms), None, dtype=object)
+    if not kept.any():
+        return result
+
+    # polygon index of each kept ring
+    part_of_ring = np.repeat(np.arange(len(part_offsets) - 1), np.diff(part_offsets))[kept]
+    ring_index = np.repeat(np.arange(len(ring_offsets) - 1), np.diff(ring_offsets))
+    rings = shapely.linearrings(coordinates, indices=ring_index)
+    parts = np.unique(part_of_ring)
+    polygons = shapely.polygons(rings, indices=np.searchsorted(parts, part_of_ring))
+
+    owners = geom_index[parts]
+    is_multi = shapely.get_type_id(geoms[owners]) == _MULTIPOLYGON
+    single = owners[~is_multi]
+    result[single] = polygons[~is_multi]
+    if is_multi.any():
+        multi_owners, multi_position = np.unique(owners[is_multi], return_inverse=True)
+        result[multi_owners] = shapely.multipolygons(polygons[is_multi], indices=multi_position)
+    return result
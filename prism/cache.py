@@ -0,0 +1,275 @@
+"""
+Cache of simplified rings for repeated footprints
+"""
+from collections import OrderedDict
+import hashlib
+from math import pi
+import sqlite3
+import numpy as np
+from prism.batch import _ring_to_arrays
+from prism.prefilter import strip_redundant_vertices
+from prism.ring import Ring
+from prism.simplify import _simplify
+from shapely.geometry import LinearRing
+from shapely.geometry import Polygon
+
+__all__ = ['SimplificationCache']
+
+# version of the results of the simplification in the keys. It is increased whenever the results of the simplification
+# change (e.g., the order of the queue), so that rings stored on disk by an earlier version are simplified again.
+_VERSION = 2
+
+# number of rings stored on disk between commits
+_COMMIT_EVERY = 256
+
+
+# the symmetries of the square (rotations by multiples of 90 degrees and reflections), which are exact in floating point
+_SYMMETRIES = tuple(np.array(matrix, dtype=np.float64) for matrix in (
+    ((1, 0), (0, 1)), ((0, -1), (1, 0)), ((-1, 0), (0, -1)), ((0, 1), (-1, 0)),
+    ((-1, 0), (0, 1)), ((1, 0), (0, -1)), ((0, 1), (1, 0)), ((0, -1), (-1, 0))))
+
+
+def _canonicalize(coordinates, precision=None):
+    """
+    Returns the canonical form of a ring that does not depend on the translation, the rotation by a multiple of 90
+    degrees, the reflection, the start vertex and the orientation.
+    The ring is transformed by each symmetry of the square and translated to put the lower left corner of its bounding
+    box at the origin, and the canonical form is the one whose coordinates come first among the transformed rings
+    starting at their smallest vertex in either orientation.
+    :param coordinates: array (N, 2) of the vertices of a ring without the closing vertex
+    :param precision: number of decimals to round the canonical coordinates to. If None, they are not rounded.
+    :return: canonical coordinates, symmetry (2 x 2 orthogonal matrix), origin of the translation after the symmetry,
+        and whether the orientation is reversed.
+        The ring is ((canonical[::-1] if reversed else canonical) + origin) @ symmetry.
+    """
+    candidates = []
+    for symmetry in _SYMMETRIES:
+        transformed = coordinates @ symmetry.T
+        origin = transformed.min(axis=0)
+        canonical = transformed - origin
+        if precision is not None:
+            canonical = np.round(canonical, precision) + 0.0  # no negative zeros
+        for reverse, ring in ((False, canonical), (True, canonical[::-1])):
+            for start in np.flatnonzero((ring == ring[np.lexsort((ring[:, 1], ring[:, 0]))[0]]).all(axis=1)):
+                rotated = np.ascontiguousarray(np.roll(ring, -start, axis=0))
+                candidates.append((rotated.tobytes(), symmetry, origin, reverse, rotated))
+    _, symmetry, origin, reverse, canonical = min(candidates, key=lambda candidate: candidate[0])
+    return canonical, symmetry, origin, reverse
+
+
+class SimplificationCache:
+    """
+    This class represents a cache of simplified rings with a bounded LRU eviction.
+    By default, rings are cached by their exact coordinates, so a result is the same as simplify of the ring.
+    With canonical, rings are cached by their canonical forms, so the same shape translated, rotated by a multiple of
+    90 degrees, mirrored, starting at another vertex or in the opposite orientation is simplified once. To keep the
+    results independent of the state of the cache, rings are then always simplified in their canonical forms and moved
+    back. Since the order of the ties in the queue depends on the start vertex and the orientation of a ring,
+    a result may then differ from simplify of the same ring as given.
+    The validation and the time limit are not supported, since their results depend on the other rings of a polygon
+    and on the time.
+    An optional SQLite file keeps the results across runs. The results are committed in groups and when it is closed.
+    """
+    def __init__(self, maxsize=4096, path=None, canonical=False, precision=None):
+        """
+        Initialize a cache.
+        :param maxsize: maximum number of rings in memory
+        :param path: path to an SQLite file to store the results on disk. If None, the results are only in memory.
+        :param canonical: condition whether or not rings are cached and simplified in their canonical forms
+        :param precision: number of decimals to round the canonical coordinates to, so that shapes equal up to the
+            precision share the result. It requires canonical. If None, they are not rounded, and translated copies
+            share the result only if the translation is exact in floating point.
+        """
+        if precision is not None and not canonical:
+            raise ValueError('precision requires canonical')
+        self._maxsize = maxsize
+        self._canonical = canonical
+        self._precision = precision
+        self._uncommitted = 0
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._disk_hits = 0
+        self._connection = None
+        if path is not None:
+            self._connection = sqlite3.connect(path)
+            self._connection.execute('CREATE TABLE IF NOT EXISTS rings (key BLOB PRIMARY KEY, coordinates BLOB)')
+            self._connection.commit()
+
+    @property
+    def hits(self):
+        """
+        Get the number of lookups found in memory or on disk.
+        :return: the number of hits
+        """
+        return self._hits
+
+    @property
+    def misses(self):
+        """
+        Get the number of lookups that required a simplification.
+        :return: the number of misses
+        """
+        return self._misses
+
+    def stats(self):
+        """
+        Returns the statistics of the cache.
+        :return: dictionary of hits, disk hits (included in hits), misses, hit ratio and the number of rings in memory
+        """
+        lookups = self._hits + self._misses
+        return {'hits': self._hits, 'disk_hits': self._disk_hits, 'misses': self._misses,
+                'hit_ratio': self._hits / lookups if lookups else 0.0, 'size': len(self._entries)}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """
+        Remove the rings in memory and reset the statistics. The rings on disk are kept.
+        :return: None
+        """
+        self._entries.clear()
+        self._hits = self._misses = self._disk_hits = 0
+
+    def close(self):
+        """
+        Commit the rings stored on disk and close the file.
+        :return: None
+        """
+        if self._connection is not None:
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def simplify(self, polygon, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, merge_first=False, prefilter=False,
+                 max_vertices=None):
+        # type: (Polygon, float, float, float, float, bool, bool, int) -> Polygon
+        """
+        Returns a simplified polygon like prism.simplify using the cache.
+        :param polygon: polygon to simplify
+        :param tau: tolerance distance
+        :param epsilon: tolerance angle
+        :param delta: angle threshold used to determine if consecutive segments are collinear
+        :param gamma: distance threshold used to determine whether to join neighboring segments
+        :param merge_first: condition whether or not it merges neighbors first when possible
+        :param prefilter: condition whether or not it strips duplicate and collinear vertices before the main loop
+        :param max_vertices: maximum number of vertices of each ring, or None
+        :return: a simplified polygon, or None if the exterior collapses. Collapsed interiors are dropped.
+        """
+        exterior = self.simplify_ring(polygon.exterior, tau, epsilon, delta, gamma, merge_first, prefilter,
+                                      max_vertices)
+        if exterior is None:
+            return None
+        interiors = []
+        for ring in polygon.interiors:
+            interior = self.simplify_ring(ring, tau, epsilon, delta, gamma, merge_first, prefilter, max_vertices)
+            if interior is not None:
+                interiors.append(interior)
+        return Polygon(exterior, interiors)
+
+    def simplify_ring(self, linear_ring, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, merge_first=False,
+                      prefilter=False, max_vertices=None):
+        # type: (LinearRing, float, float, float, float, bool, bool, int) -> LinearRing
+        """
+        Returns a simplified ring like prism.simplify_ring using the cache.
+        :param linear_ring: ring to simplify
+        :param tau: tolerance distance
+        :param epsilon: tolerance angle
+        :param delta: angle threshold used to determine if consecutive segments are collinear
+        :param gamma: distance threshold used to determine whether to join neighboring segments
+        :param merge_first: condition whether or not it merges neighbors first when possible
+        :param prefilter: condition whether or not it strips duplicate and collinear vertices before the main loop
+        :param max_vertices: maximum number of vertices, or None
+        :return: a simplified ring, or None if it collapses
+        """
+        coordinates = np.asarray(linear_ring.coords, dtype=np.float64)[:-1, :2]
+        simplified = self._simplify_coordinates(coordinates, tau, epsilon, delta, gamma, merge_first, prefilter,
+                                                max_vertices)
+        return None if simplified is None else LinearRing(simplified)
+
+    def _simplify_coordinates(self, coordinates, tau, epsilon, delta, gamma, merge_first, prefilter, max_vertices):
+        """
+        Returns the simplified coordinates of a ring using the cache.
+        :param coordinates: array (N, 2) of the vertices of a ring without the closing vertex
+        :return: array (M, 2) of the simplified coordinates with the closing vertex, or None if the ring collapses
+        """
+        if len(coordinates) < 3:
+            return None
+        if self._canonical:
+            canonical, symmetry, origin, reverse = _canonicalize(coordinates, self._precision)
+        else:
+            canonical = np.ascontiguousarray(coordinates)
+        key = hashlib.blake2b(canonical.tobytes(), digest_size=20)
+        key.update(repr((_VERSION, self._canonical, tau, epsilon, delta, gamma, merge_first, prefilter,
+                         max_vertices)).encode())
+        key = key.digest()
+
+        found, simplified = self._lookup(key)
+        if found:
+            self._hits += 1
+        else:
+            self._misses += 1
+            x, y = canonical[:, 0], canonical[:, 1]
+            if prefilter:
+                x, y = strip_redundant_vertices(x, y, delta)
+            ring = _simplify(Ring.from_xy(x, y), tau, epsilon, delta, gamma, merge_first, max_vertices=max_vertices)
+            simplified = None
+            if len(ring) >= 3:
+                simplified = np.column_stack(_ring_to_arrays(ring))
+            self._store(key, simplified)
+
+        if simplified is None or not self._canonical:
+            return simplified
+        return ((simplified[::-1] if reverse else simplified) + origin) @ symmetry
+
+    def _lookup(self, key):
+        """
+        Find the simplified coordinates of a key in memory, and then on disk.
+        :param key: key of a ring
+        :return: whether the key is found, and the simplified coordinates (None if the ring collapses)
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return True, self._entries[key]
+        if self._connection is not None:
+            row = self._connection.execute('SELECT coordinates FROM rings WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                self._disk_hits += 1
+                simplified = None if row[0] is None else np.frombuffer(row[0], dtype=np.float64).reshape(-1, 2)
+                self._remember(key, simplified)
+                return True, simplified
+        return False, None
+
+    def _store(self, key, simplified):
+        """
+        Store the simplified coordinates of a key in memory and on disk.
+        :param key: key of a ring
+        :param simplified: simplified coordinates (None if the ring collapses)
+        :return: None
+        """
+        self._remember(key, simplified)
+        if self._connection is not None:
+            self._connection.execute('INSERT OR REPLACE INTO rings VALUES (?, ?)',
+                                     (key, None if simplified is None else simplified.tobytes()))
+            self._uncommitted += 1
+            if self._uncommitted >= _COMMIT_EVERY:
+                self._connection.commit()
+                self._uncommitted = 0
+
+    def _remember(self, key, simplified):
+        """
+        Store the simplified coordinates of a key in memory and evict the least recently used one if it is full.
+        :param key: key of a ring
+        :param simplified: simplified coordinates (None if the ring collapses)
+        :return: None
+        """
+        self._entries[key] = simplified
+        if len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
@@ -0,0 +1,198 @@
+"""
+Simplification of polygons given one per line as WKT, hex-encoded WKB or GeoJSON (a feature or a geometry),
+shared by the command line (python -m prism) and the service (python -m prism.service)
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import json
+from math import pi
+import string
+import sys
+import numpy as np
+import shapely
+from shapely.geometry import mapping, shape
+from prism.batch import simplify_many
+
+__all__ = ['simplify_lines', 'run']
+
+_FORMATS = ('auto', 'wkt', 'wkb', 'geojson')
+_HEX_DIGITS = frozenset(string.hexdigits)
+
+
+def _detect(line):
+    """
+    Returns the format of a line.
+    :param line: line without the line break
+    :return: 'geojson', 'wkb' or 'wkt'
+    """
+    if line.startswith('{'):
+        return 'geojson'
+    if _HEX_DIGITS.issuperset(line):
+        return 'wkb'
+    return 'wkt'
+
+
+def _read(line, fmt):
+    """
+    Returns the geometry of a line and the GeoJSON object to write it back into.
+    :param line: line without the line break
+    :param fmt: format of the line
+    :return: geometry and the GeoJSON object (None for WKT and WKB)
+    """
+    if fmt == 'geojson':
+        obj = json.loads(line)
+        if obj.get('type') == 'Feature':
+            geometry = obj.get('geometry')
+            return (None if geometry is None else shape(geometry)), obj
+        return shape(obj), obj
+    if fmt == 'wkb':
+        return shapely.from_wkb(line), None
+    return shapely.from_wkt(line), None
+
+
+def _write(geometry, fmt, obj, precision):
+    """
+    Returns a line of a geometry.
+    :param geometry: geometry or None
+    :param fmt: format of the line
+    :param obj: GeoJSON object read with the geometry
+    :param precision: number of decimal places of WKT, or None to keep all of them
+    :return: line without the line break
+    """
+    if fmt == 'geojson':
+        geometry = None if geometry is None or geometry.is_empty else mapping(geometry)
+        if obj.get('type') == 'Feature':
+            return json.dumps(dict(obj, geometry=geometry))
+        return json.dumps(geometry)
+    if geometry is None:
+        geometry = shapely.Polygon()  # a collapsed polygon
+    if fmt == 'wkb':
+        return shapely.to_wkb(geometry, hex=True)
+    return shapely.to_wkt(geometry, rounding_precision=-1 if precision is None else precision)
+
+
+def simplify_lines(lines, fmt='auto', precision=None, **kwargs):
+    """
+    Simplify the polygons of lines.
+    :param lines: list of lines without the line breaks
+    :param fmt: format of the lines, or 'auto' to detect the format of each line
+    :param precision: number of decimal places of WKT, or None to keep all of them
+    :param kwargs: parameters of prism.simplify_many
+    :return: list of the output lines and list of the messages of the lines failed to be read (the index, message)
+    """
+    formats = [None] * len(lines)
+    geometries = np.empty(len(lines), dtype=object)
+    objects = [None] * len(lines)
+    errors = []
+    for i, line in enumerate(lines):
+        if not line:
+            continue
+        formats[i] = _detect(line) if fmt == 'auto' else fmt
+        try:
+            geometries[i], objects[i] = _read(line, formats[i])
+        except Exception as e:
+            formats[i] = None
+            errors.append((i, '{}: {}'.format(type(e).__name__, e)))
+
+    polygonal = np.isin(shapely.get_type_id(geometries), (shapely.GeometryType.POLYGON,
+                                                          shapely.GeometryType.MULTIPOLYGON))
+    simplified = geometries.copy()
+    if polygonal.any():
+        simplified[polygonal] = simplify_many(geometries[polygonal], **kwargs)
+    output = ['' if formats[i] is None else _write(simplified[i], formats[i], objects[i], precision)
+              for i in range(len(lines))]
+    return output, errors
+
+
+def _batches(stream, size):
+    """
+    Read batches of lines from a stream.
+    :param stream: text stream
+    :param size: number of lines of a batch
+    :return: generator of lists of lines without the line breaks
+    """
+    batch = []
+    for line in stream:
+        batch.append(line.strip())
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run(stream, output, fmt='auto', precision=None, workers=None, batch_size=256, window=None, **kwargs):
+    """
+    Simplify the polygons of a stream line by line and write them in order.
+    :param stream: input text stream
+    :param output: output text stream
+    :param fmt: format of the lines, or 'auto' to detect the format of each line
+    :param precision: number of decimal places of WKT, or None to keep all of them
+    :param workers: number of processes. If None or 1, it runs in the current process.
+    :param batch_size: number of lines sent to a worker at once
+    :param window: maximum number of batches in flight (default: twice the number of workers)
+    :param kwargs: parameters of prism.simplify_many
+    :return: the number of lines failed to be read
+    """
+    n_errors = 0
+    offset = 0
+
+    def flush(lines, errors):
+        nonlocal n_errors, offset
+        for i, message in errors:
+            print('line {}: {}'.format(offset + i + 1, message), file=sys.stderr)
+        n_errors += len(errors)
+        offset += len(lines)
+        output.writelines(line + '\n' for line in lines)
+
+    if workers is None or workers <= 1:
+        for batch in _batches(stream, batch_size):
+            flush(*simplify_lines(batch, fmt, precision, **kwargs))
+        return n_errors
+
+    window = window or 2 * workers
+    in_flight = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch in _batches(stream, batch_size):
+            if len(in_flight) >= window:
+                flush(*in_flight.popleft().result())
+            in_flight.append(executor.submit(simplify_lines, batch, fmt, precision, **kwargs))
+        while in_flight:
+            flush(*in_flight.popleft().result())
+    return n_errors
+
+
+def _add_arguments(parser):
+    """
+    Add the arguments of the simplification to a parser.
+    :param parser: argument parser
+    :return: None
+    """
+    parser.add_argument('--tau', type=float, default=1, help='tolerance distance')
+    parser.add_argument('--epsilon', type=float, default=pi/36, help='tolerance angle in radians')
+    parser.add_argument('--delta', type=float, default=pi/180,
+                        help='angle threshold in radians used to determine if consecutive segments are collinear')
+    parser.add_argument('--gamma', type=float, default=None,
+                        help='distance threshold used to determine whether to join neighboring segments')
+    parser.add_argument('--merge-first', action='store_true', help='merge neighbors first when possible')
+    parser.add_argument('--prefilter', action='store_true',
+                        help='strip duplicate and collinear vertices in bulk before the main loop')
+    parser.add_argument('--validate', action='store_true',
+                        help='skip the operations that make a ring cross itself or another ring')
+    parser.add_argument('--max-vertices', type=int, default=None,
+                        help='maximum number of vertices of each ring, reached by escalating the tolerance distance')
+    parser.add_argument('--time-limit', type=float, default=None,
+                        help='seconds to spend on each polygon, after which the result so far is written')
+    parser.add_argument('--precision', type=int, default=None,
+                        help='number of decimal places of WKT (default: all)')
+
+
+def _kwargs(args):
+    """
+    Returns the parameters of prism.simplify_many from the parsed arguments.
+    :param args: parsed arguments
+    :return: dictionary of the parameters
+    """
+    return dict(tau=args.tau, epsilon=args.epsilon, delta=args.delta, gamma=args.gamma, merge_first=args.merge_first,
+                prefilter=args.prefilter, validate=args.validate, max_vertices=args.max_vertices,
+                time_limit=args.time_limit)
@@ -0,0 +1,246 @@
+"""
+Simplification of a coverage of polygons that share boundaries, e.g., adjacent rooms of a floor
+"""
+from math import pi
+import warnings
+import numpy as np
+from prism.batch import _as_geometry_array, _to_buffers, _from_buffers
+from prism.ring import Ring
+from prism.simplify import _simplify, _alive_points
+
+__all__ = ['simplify_coverage']
+
+
+def simplify_coverage(geoms, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, merge_first=False):
+    """
+    Returns simplified polygons of a coverage in which shared boundaries are simplified once in the same way,
+    so that no gaps or overlaps appear between the neighbors that did not exist before.
+    The rings are split into arcs at nodes, i.e., the vertices where more than two edges of the coverage meet,
+    and each arc is simplified once within the first ring using it, where the nodes and the arcs simplified before are
+    pinned, and then the rings are assembled from the simplified arcs.
+    The polygons must share the vertices of the shared boundaries exactly
+    (e.g., with shapely.set_precision to snap them to a grid).
+    :param geoms: sequence of polygons, multipolygons or None, e.g., a list, a GeoSeries, or an array of geometries
+    :param tau: tolerance distance
+    :param epsilon: tolerance angle
+    :param delta: angle threshold used to determine if consecutive segments are collinear
+    :param gamma: distance threshold used to determine whether to join neighboring segments
+    :param merge_first: condition whether or not it merges neighbors first when possible
+    :return: array of simplified geometries aligned with the input. A geometry is None if the input is None or empty,
+        or if the exterior of the polygon (all polygons for a multipolygon) collapses. Collapsed holes are dropped.
+    """
+    geoms = _as_geometry_array(geoms)
+    coordinates, ring_offsets, part_offsets, geom_index = _to_buffers(geoms)
+    points, ring_ids = _vertex_ids(coordinates, ring_offsets)
+    node = _nodes(ring_ids, len(points))
+
+    # split the rings into arcs, each of which is registered once regardless of its direction
+    arc_index = {}
+    arcs = []
+    ring_arcs = []
+    for ids, is_node in zip(ring_ids, node):
+        if len(ids) < 3:
+            ring_arcs.append(None)  # a degenerate ring collapses
+            continue
+        ring_arcs.append([_register(arc, arc_index, arcs) for arc in _split(ids, is_node)])
+
+    # each arc is simplified within the first ring using it, where the arcs simplified before are pinned
+    simplified = [None] * len(arcs)
+    done = [False] * len(arcs)
+    failed = 0
+    for ring in ring_arcs:
+        if ring is None or all(done[index] for index, _ in ring):
+            continue
+        try:
+            _simplify_ring(points, arcs, simplified, done, ring, tau, epsilon, delta, gamma, merge_first)
+        except Exception:
+            # the new arcs of the ring are kept as they are for all the rings sharing them
+            for index, _ in ring:
+                if not done[index]:
+                    ids, closed = arcs[index]
+                    simplified[index] = points[np.append(ids, ids[0])] if closed else points[ids]
+                    done[index] = True
+                    failed += 1
+    if failed > 0:
+        warnings.warn('{} arc(s) failed to be simplified and are kept as they are'.format(failed), RuntimeWarning)
+
+    # assemble the rings from the simplified arcs
+    kept = np.zeros(len(ring_ids), dtype=bool)
+    new_rings = []
+    for part in range(len(part_offsets) - 1):
+        exterior = part_offsets[part]
+        for i in range(exterior, part_offsets[part + 1]):
+            ring = None if ring_arcs[i] is None else _assemble(simplified, ring_arcs[i])
+            if ring is None:
+                if i == exterior:
+                    break  # a polygon without its exterior is removed with its holes
+                continue
+            new_rings.append(ring)
+            kept[i] = True
+
+    new_offsets = np.zeros(len(new_rings) + 1, dtype=np.int64)
+    np.cumsum([len(ring) for ring in new_rings], out=new_offsets[1:])
+    new_coordinates = np.concatenate(new_rings) if new_rings else np.empty((0, 2), dtype=np.float64)
+    return _from_buffers(geoms, new_coordinates, new_offsets, part_offsets, geom_index, kept)
+
+
+def _vertex_ids(coordinates, ring_offsets):
+    """
+    Returns the distinct points of rings and the ids of the vertices of each ring.
+    Consecutive duplicate vertices and the closing vertices are dropped.
+    :param coordinates: coordinates (N, 2) of closed rings
+    :param ring_offsets: offsets of rings in the coordinates
+    :return: array (M, 2) of the distinct points, and a list of arrays of the ids of the vertices of each ring
+    """
+    if len(coordinates) == 0:
+        return np.empty((0, 2), dtype=np.float64), [np.empty(0, dtype=np.int64)] * (len(ring_offsets) - 1)
+    points, ids = np.unique(coordinates, axis=0, return_inverse=True)
+    ids = ids.ravel()
+    ring_ids = []
+    for start, end in zip(ring_offsets[:-1], ring_offsets[1:]):
+        _ids = ids[start:end - 1]
+        ring_ids.append(_ids[_ids != np.roll(_ids, 1)] if len(_ids) > 1 else _ids)
+    return points, ring_ids
+
+
+def _nodes(ring_ids, n_points):
+    """
+    Returns the nodes of the rings, i.e., the vertices where the number of distinct edges of all rings is not two.
+    A vertex in the middle of a shared boundary or of a boundary that is not shared has two edges, while a vertex
+    where the neighbors of a ring change has more.
+    :param ring_ids: list of arrays of the ids of the vertices of each ring
+    :param n_points: number of the distinct points
+    :return: list of masks of the nodes of each ring
+    """
+    if not ring_ids:
+        return []
+    ids = np.concatenate(ring_ids)
+    following = np.concatenate([np.roll(_ids, -1) for _ids in ring_ids])
+    low = np.minimum(ids, following)
+    high = np.maximum(ids, following)
+    edges = np.unique((low * n_points + high)[low != high])
+    degree = np.bincount(np.concatenate((edges // n_points, edges % n_points)), minlength=n_points)
+    is_node = degree[ids] != 2
+    offsets = np.cumsum([len(_ids) for _ids in ring_ids])[:-1]
+    return np.split(is_node, offsets)
+
+
+def _split(ids, is_node):
+    """
+    Split a ring into arcs between nodes. A ring without nodes is a closed arc.
+    :param ids: ids of the vertices of a ring
+    :param is_node: mask of the nodes
+    :return: list of pairs of the ids of the vertices of an arc (including both nodes) and whether it is closed
+    """
+    nodes = np.flatnonzero(is_node)
+    if len(nodes) == 0:
+        return [(ids, True)]
+    ids = np.roll(ids, -nodes[0])
+    nodes = np.append(nodes - nodes[0], len(ids))
+    ids = np.append(ids, ids[0])
+    return [(ids[a:b + 1], False) for a, b in zip(nodes[:-1], nodes[1:])]
+
+
+def _register(arc, arc_index, arcs):
+    """
+    Register an arc in the canonical direction (and the canonical start vertex for a closed arc) if it is new.
+    :param arc: pair of the ids of the vertices of an arc and whether it is closed
+    :param arc_index: dictionary of the canonical arcs and their indices
+    :param arcs: list of the registered arcs
+    :return: index of the arc and whether the arc is reversed from the canonical direction
+    """
+    ids, closed = arc
+    if closed:
+        ids = np.roll(ids, -int(np.argmin(ids)))
+        forward = tuple(ids)
+        backward = (forward[0],) + forward[:0:-1]
+    else:
+        forward = tuple(ids)
+        backward = forward[::-1]
+    reverse = backward < forward
+    key = backward if reverse else forward
+    index = arc_index.get(key)
+    if index is None:
+        index = arc_index[key] = len(arcs)
+        arcs.append((np.array(key, dtype=np.int64), closed))
+    return index, reverse
+
+
+def _simplify_ring(points, arcs, simplified, done, ring_arcs, tau, epsilon, delta, gamma, merge_first):
+    """
+    Simplify the arcs of a ring that have not been simplified yet. The ring is assembled from its arcs, where the nodes
+    and all vertices of the arcs simplified before are pinned, so that the simplification does not move or remove
+    them. Then the new arcs are cut out of the simplified ring between the pinned nodes.
+    :param points: array (M, 2) of the distinct points
+    :param arcs: list of the registered arcs
+    :param simplified: list of the simplified arcs to update
+    :param done: list of conditions whether or not each arc has been simplified to update
+    :param ring_arcs: list of the indices of the arcs of the ring and whether each arc is reversed
+    :param tau: tolerance distance
+    :param epsilon: tolerance angle
+    :param delta: angle threshold used to determine if consecutive segments are collinear
+    :param gamma: distance threshold used to determine whether to join neighboring segments
+    :param merge_first: condition whether or not it merges neighbors first when possible
+    :return: None
+    """
+    if len(ring_arcs) == 1 and arcs[ring_arcs[0][0]][1]:
+        # a ring without nodes is simplified as it is
+        index = ring_arcs[0][0]
+        vertices = points[arcs[index][0]]
+        ring = _simplify(Ring.from_xy(vertices[:, 0].copy(), vertices[:, 1].copy()),
+                         tau, epsilon, delta, gamma, merge_first)
+        result = _alive_points(ring)
+        simplified[index] = np.vstack((result, result[:1])) if len(result) >= 3 else None
+        done[index] = True
+        return
+
+    # the vertices of each arc without its last vertex, which is the first vertex of the next arc
+    parts = []
+    pins = []
+    for index, reverse in ring_arcs:
+        vertices = simplified[index] if done[index] else points[arcs[index][0]]
+        parts.append(vertices[::-1][:-1] if reverse else vertices[:-1])
+        pin = np.ones(len(parts[-1]), dtype=bool) if done[index] else np.arange(len(parts[-1])) == 0
+        pins.append(pin)
+    vertices = np.concatenate(parts)
+    pinned = np.concatenate(pins)
+    ring = Ring.from_xy(vertices[:, 0].copy(), vertices[:, 1].copy())
+    for i in np.flatnonzero(pinned):
+        ring.pin(int(i))
+    _simplify(ring, tau, epsilon, delta, gamma, merge_first)
+
+    # A pinned point keeps its coordinates and its order, but it can be passed to the next index,
+    # which may wrap around to the front.
+    result = _alive_points(ring)
+    positions = np.flatnonzero(np.frombuffer(ring._pinned, dtype=np.bool_)[np.frombuffer(ring._alive, dtype=np.bool_)])
+    expected = vertices[pinned]
+    shift = next(shift for shift in range(len(positions))
+                 if np.array_equal(result[np.roll(positions, -shift)], expected))
+    nodes = np.roll(positions, -shift)[np.cumsum([0] + [np.count_nonzero(pin) for pin in pins[:-1]])]
+    for k, (index, reverse) in enumerate(ring_arcs):
+        if done[index]:
+            continue
+        span = (nodes[(k + 1) % len(nodes)] - nodes[k]) % len(result) or len(result)
+        arc = result[(nodes[k] + np.arange(span + 1)) % len(result)]
+        simplified[index] = arc[::-1] if reverse else arc
+        done[index] = True
+
+
+def _assemble(simplified, ring_arcs):
+    """
+    Assemble a ring from simplified arcs.
+    :param simplified: list of the simplified arcs
+    :param ring_arcs: list of the indices of the arcs of the ring and whether each arc is reversed
+    :return: coordinates (K + 1, 2) of the closed ring, or None if it collapses
+    """
+    parts = []
+    for index, reverse in ring_arcs:
+        arc = simplified[index]
+        if arc is None:
+            return None  # a closed arc collapses
+        # the last vertex of an arc is the first vertex of the next arc
+        parts.append(arc[::-1][:-1] if reverse else arc[:-1])
+    vertices = np.concatenate(parts)
+    if len(vertices) < 3:
+        return None
+    return np.vstack((vertices, vertices[:1]))
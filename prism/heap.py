@@ -0,0 +1,143 @@
+"""
+Addressable priority queue to support the simplification
+"""
+
+__all__ = ['PriorityQueue']
+
+
+class PriorityQueue:
+    """
+    This class represents a binary min-heap that keeps track of the position of each item.
+    Membership test is O(1), and push, pop, removal and key update are O(log n).
+    Items with the same key are popped in the order they were pushed.
+    """
+    def __init__(self):
+        self._heap = []  # entries of (key, count, item)
+        self._position = {}  # item -> index of its entry in the heap
+        self._count = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, item):
+        return item in self._position
+
+    def push(self, item, key):
+        """
+        Push an item with the key. If the item exists in the queue, the pushing is ignored.
+        :param item: item to push
+        :param key: priority of the item (the smaller, the earlier)
+        :return: True if the item is pushed, otherwise False
+        """
+        if item in self._position:
+            return False
+        entry = (key, self._count, item)
+        self._count += 1
+        self._heap.append(entry)
+        self._sift_up(len(self._heap) - 1)
+        return True
+
+    def pop(self):
+        """
+        Pop the item with the smallest key.
+        :return: the item with the smallest key
+        """
+        heap = self._heap
+        entry = heap.pop()
+        if heap:
+            entry, heap[0] = heap[0], entry
+            self._position[heap[0][2]] = 0
+            self._sift_down(0)
+        del self._position[entry[2]]
+        return entry[2]
+
+    def peek(self):
+        """
+        Returns the item with the smallest key without popping it.
+        :return: the item with the smallest key
+        """
+        return self._heap[0][2]
+
+    def key(self, item):
+        """
+        Returns the key of an item in the queue.
+        :param item: item in the queue
+        :return: the key of the item
+        """
+        return self._heap[self._position[item]][0]
+
+    def remove(self, item):
+        """
+        Remove an item from the queue. It is possible that the item has already been removed.
+        :param item: item to remove
+        :return: True if the item is removed, otherwise False
+        """
+        index = self._position.pop(item, None)
+        if index is None:
+            return False
+        heap = self._heap
+        last = heap.pop()
+        if index < len(heap):
+            heap[index] = last
+            self._position[last[2]] = index
+            if index > 0 and last < heap[(index - 1) >> 1]:
+                self._sift_up(index)
+            else:
+                self._sift_down(index)
+        return True
+
+    def update(self, item, key):
+        """
+        Change the key of an item in the queue (decrease-key or increase-key).
+        If the item does not exist in the queue, it is pushed.
+        :param item: item to update
+        :param key: new key of the item
+        :return: None
+        """
+        index = self._position.get(item)
+        if index is None:
+            self.push(item, key)
+            return
+        old = self._heap[index]
+        self._heap[index] = (key, old[1], item)
+        if key < old[0]:
+            self._sift_up(index)
+        else:
+            self._sift_down(index)
+
+    def _sift_up(self, index):
+        heap = self._heap
+        position = self._position
+        entry = heap[index]
+        while index > 0:
+            parent_index = (index - 1) >> 1
+            parent = heap[parent_index]
+            if entry < parent:
+                heap[index] = parent
+                position[parent[2]] = index
+                index = parent_index
+                continue
+            break
+        heap[index] = entry
+        position[entry[2]] = index
+
+    def _sift_down(self, index):
+        heap = self._heap
+        position = self._position
+        size = len(heap)
+        entry = heap[index]
+        child_index = 2 * index + 1
+        while child_index < size:
+            right_index = child_index + 1
+            if right_index < size and heap[right_index] < heap[child_index]:
+                child_index = right_index
+            child = heap[child_index]
+            if child < entry:
+                heap[index] = child
+                position[child[2]] = index
+                index = child_index
+                child_index = 2 * index + 1
+                continue
+            break
+        heap[index] = entry
+        position[entry[2]] = index
@@ -0,0 +1,129 @@
+"""
+Incremental re-simplification of an edited ring
+"""
+from math import pi
+import numpy as np
+from prism.ring import Ring
+from prism.simplify import _simplify, _alive_points, _open_ring, simplify_coords
+
+__all__ = ['resimplify_coords']
+
+# number of pinned simplified vertices beyond each anchor, since an operation looks up to two segments away
+_CONTEXT = 2
+
+
+def resimplify_coords(coords, simplified, index, start, stop, vertices, tau=1, epsilon=pi/36, delta=pi/180,
+                      gamma=None, merge_first=False, band=2):
+    """
+    Returns the simplification of a ring after an edit by re-simplifying only the window of the edit.
+    The edit replaces the input vertices in [start, stop) with new vertices. The window consists of the edited vertices
+    and the input vertices of band simplified vertices on each side of the edit (the guard band), where a simplified
+    vertex stands for the input vertices after the input vertex of the previous simplified vertex up to its own.
+    It is bounded by two anchors, i.e., the next simplified vertices on each side, and it is simplified from the input
+    by the same loop as simplify_coords, where the anchors and a few simplified vertices beyond them are pinned.
+    Then the result is spliced into the previous simplified ring between the anchors.
+    The rest of the ring is kept as it is, so the cost depends on the size of the window rather than of the ring,
+    but the result may differ from simplifying the edited ring from scratch around the window.
+    :param coords: previous input (N, 2), closed or not
+    :param simplified: previous simplified coordinates (M, 2), closed or not, e.g., from simplify_coords
+    :param index: indices of the input vertices of the simplified vertices from simplify_coords with return_index
+    :param start: index of the first replaced input vertex
+    :param stop: index after the last replaced input vertex (start <= stop <= N without the closing vertex)
+    :param vertices: array (K, 2) of the new vertices in place of the replaced ones. K may be 0 to delete vertices.
+    :param tau: tolerance distance
+    :param epsilon: tolerance angle
+    :param delta: angle threshold used to determine if consecutive segments are collinear
+    :param gamma: distance threshold used to determine whether to join neighboring segments
+    :param merge_first: condition whether or not it merges neighbors first when possible
+    :param band: number of simplified vertices on each side of the edit that are re-simplified with it (at least 1)
+    :return: the edited input, its simplified coordinates and the indices of their input vertices,
+        where the coordinates are closed if the previous input is closed. If the ring collapses, the simplified
+        coordinates and the indices are None.
+    """
+    if band < 1:
+        raise ValueError('band must be at least 1, but got {}'.format(band))
+    x, y, closed = _open_ring(coords)
+    if not 0 <= start <= stop <= len(x):
+        raise ValueError('invalid range of the edit: [{}, {}) of {} vertices'.format(start, stop, len(x)))
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 2)
+    edited = np.column_stack((np.concatenate((x[:start], vertices[:, 0], x[stop:])),
+                              np.concatenate((y[:start], vertices[:, 1], y[stop:]))))
+    n = len(edited)
+    shift = len(vertices) - (stop - start)
+
+    m = 0 if index is None else len(index)
+    if m > 0:
+        index = np.asarray(index, dtype=np.int64)
+        points = np.asarray(simplified, dtype=np.float64)[:m]
+        # positions of the anchors in the simplified ring, which may wrap around
+        left = int(np.searchsorted(index, start)) - 1 - band
+        right = int(np.searchsorted(index, stop)) + band
+    if m == 0 or right - left + 1 + 2 * _CONTEXT > m:
+        # the window covers the ring
+        return _resimplify(edited, closed, tau, epsilon, delta, gamma, merge_first)
+
+    def edited_index(i):
+        return i + shift if i >= stop else i
+
+    # the ring of the window between the pinned anchors with the pinned context beyond them
+    first = edited_index(index[left % m]) + 1
+    last = edited_index(index[(right - 1) % m])
+    inputs = (first + np.arange((last - first + 1) % n)) % n
+    before = np.arange(left - _CONTEXT, left + 1) % m
+    after = np.arange(right, right + _CONTEXT + 1) % m
+    vertices = np.concatenate((points[before], edited[inputs], points[after]))
+    ring = Ring.from_xy(vertices[:, 0].copy(), vertices[:, 1].copy())
+    pinned = np.concatenate((np.ones(len(before), dtype=bool), np.zeros(len(inputs), dtype=bool),
+                             np.ones(len(after), dtype=bool)))
+    for i in np.flatnonzero(pinned):
+        ring.pin(int(i))
+    _simplify(ring, tau, epsilon, delta, gamma, merge_first)
+
+    # A pinned point keeps its coordinates and its order, but it can be passed to the next index,
+    # which may wrap around to the front.
+    alive = np.flatnonzero(np.frombuffer(ring._alive, dtype=np.bool_))
+    result = _alive_points(ring)
+    positions = np.flatnonzero(np.frombuffer(ring._pinned, dtype=np.bool_)[alive])
+    expected = vertices[pinned]
+    rotation = next((rotation for rotation in range(len(positions))
+                     if np.array_equal(result[np.roll(positions, -rotation)], expected)), None)
+    if rotation is None:
+        # the pinned points are not found in order (e.g., the window collapsed around them)
+        return _resimplify(edited, closed, tau, epsilon, delta, gamma, merge_first)
+    positions = np.roll(positions, -rotation)
+    first = positions[_CONTEXT] + 1  # after the left anchor
+    window = (first + np.arange((positions[_CONTEXT + 1] - first) % len(result))) % len(result)
+
+    # splice the window between the anchors, and start the ring at the smallest index
+    outside = np.arange(right, right + m - (right - left) + 1) % m
+    new_points = np.concatenate((points[outside], result[window]))
+    new_index = np.concatenate(([edited_index(i) for i in index[outside]], inputs[alive[window] - len(before)]))
+    if len(new_index) < 3:
+        return _close(edited, closed), None, None
+    first = int(np.argmin(new_index))
+    new_points = np.roll(new_points, -first, axis=0)
+    new_index = np.roll(new_index, -first)
+    return _close(edited, closed), _close(new_points, closed), new_index
+
+
+def _resimplify(edited, closed, tau, epsilon, delta, gamma, merge_first):
+    """
+    Returns the simplification of a whole edited ring in the form of resimplify_coords.
+    :param edited: edited input (N, 2) without the closing vertex
+    :param closed: condition whether or not the ring is closed
+    :return: the edited input, its simplified coordinates and the indices of their input vertices
+    """
+    result, index = simplify_coords(edited, tau, epsilon, delta, gamma, merge_first, return_index=True)
+    return _close(edited, closed), _close(result, closed), index
+
+
+def _close(coords, closed):
+    """
+    Returns the coordinates of a ring with the closing vertex if it is closed.
+    :param coords: array (N, 2) without the closing vertex, or None
+    :param closed: condition whether or not the ring is closed
+    :return: the coordinates
+    """
+    if coords is None or not closed or len(coords) == 0:
+        return coords
+    return np.vstack((coords, coords[:1]))
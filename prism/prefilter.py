@@ -0,0 +1,93 @@
+"""
+Vectorized pre-pass that strips redundant vertices of a ring before the simplification
+"""
+from math import cos, inf, pi
+import numpy as np
+
+__all__ = ['strip_redundant_vertices']
+
+
+def strip_redundant_vertices(x, y, delta=pi/180):
+    """
+    Returns the vertices of a ring without duplicate vertices and approximately collinear vertices.
+    A vertex is approximately collinear if the angle between its two segments is greater than pi - delta,
+    which is the same criterion as the simplification applies to a segment and its next segment.
+    Collinear vertices are removed in rounds. In each round, no two adjacent vertices are removed,
+    so the angle of a removed vertex is always the angle between its remaining neighbors.
+    At least three vertices are kept.
+    :param x: x coordinates of the vertices without the closing vertex
+    :param y: y coordinates of the vertices without the closing vertex
+    :param delta: angle threshold used to determine if consecutive segments are collinear
+    :return: x and y coordinates of the remaining vertices
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # duplicates: a vertex equal to its previous vertex
+    duplicate = (x == np.roll(x, 1)) & (y == np.roll(y, 1))
+    if len(duplicate) > 0 and duplicate.all():
+        duplicate[0] = False
+    x = x[~duplicate]
+    y = y[~duplicate]
+
+    while len(x) > 3:
+        collinear = _collinear(x, y, delta)
+        if not collinear.any():
+            break
+        remove = _independent(collinear)
+        n_removed = np.count_nonzero(remove)
+        if len(x) - n_removed < 3:
+            remove[np.flatnonzero(remove)[len(x) - 3:]] = False
+        x = x[~remove]
+        y = y[~remove]
+    return x, y
+
+
+def _collinear(x, y, delta):
+    """
+    Returns whether each vertex is approximately collinear with its previous and next vertices.
+    :param x: x coordinates of the vertices
+    :param y: y coordinates of the vertices
+    :param delta: angle threshold used to determine if consecutive segments are collinear
+    :return: mask of the collinear vertices
+    """
+    bax = np.roll(x, 1) - x
+    bay = np.roll(y, 1) - y
+    bcx = np.roll(x, -1) - x
+    bcy = np.roll(y, -1) - y
+    norm = np.sqrt(bax * bax + bay * bay) * np.sqrt(bcx * bcx + bcy * bcy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cosine_angle = np.clip((bax * bcx + bay * bcy) / norm, -1.0, 1.0)
+    return (norm != 0) & (cosine_angle < _collinear_cosine(delta))
+
+
+def _collinear_cosine(delta):
+    """
+    Returns the cosine below which the angle between two consecutive segments is greater than pi - delta,
+    i.e., the segments are approximately collinear, so that the angle itself is not needed.
+    :param delta: angle threshold used to determine if consecutive segments are collinear
+    :return: the cosine threshold (infinity if every angle passes)
+    """
+    if delta > pi:
+        return inf
+    return -cos(max(delta, 0.0))
+
+
+def _independent(mask):
+    """
+    Returns a subset of a cyclic mask in which no two adjacent items are set.
+    Every other item of each run of set items is kept, starting from the first item of the run.
+    :param mask: cyclic mask
+    :return: subset of the mask
+    """
+    n = len(mask)
+    if mask.all():
+        return np.arange(n) % 2 == 0 if n % 2 == 0 else np.arange(n) % 2 == 1
+    # rotate the mask to start after an unset item, so that no run wraps around
+    shift = int(np.argmin(mask))
+    rotated = np.roll(mask, -shift)
+    index = np.arange(n)
+    # start of the run of each item
+    starts = np.maximum.accumulate(np.where(rotated & ~np.r_[False, rotated[:-1]], index, 0))
+    subset = rotated & ((index - starts) % 2 == 0)
+    return np.roll(subset, shift)
@@ -0,0 +1,295 @@
+"""
+Progressive simplification that materializes levels of detail from a single run
+"""
+import io
+from math import pi
+import numpy as np
+from prism.ring import Ring
+from prism.simplify import _simplify, _COLLINEAR, OPERATIONS
+from shapely.geometry import LinearRing
+from shapely.geometry import Polygon
+
+__all__ = ['RingHierarchy', 'PolygonHierarchy', 'simplify_ring_progressive', 'simplify_progressive']
+
+# names of the arrays of a hierarchy
+_FIELDS = ('x', 'y', 'operations', 'levels', 'offsets', 'edit_index', 'edit_x', 'edit_y', 'tau')
+
+
+class RingHierarchy:
+    """
+    This class represents the operations performed by a simplification of a ring in the order they were performed.
+    Each operation has a level, which is the smallest tolerance distance at which the operation and all previous
+    operations fire. A level of detail for a tolerance distance is materialized by replaying the operations whose
+    levels are not greater than the tolerance distance. For the maximum tolerance distance, the result is the same as
+    simplify_ring. For a smaller tolerance distance, it is the state of the same run at that level.
+    """
+    def __init__(self, x, y, operations, levels, offsets, edit_index, edit_x, edit_y, tau):
+        """
+        Initialize with the arrays of a hierarchy.
+        :param x: x coordinates of the original ring without the closing vertex
+        :param y: y coordinates of the original ring without the closing vertex
+        :param operations: operation of each step (index of prism.simplify.OPERATIONS)
+        :param levels: non-decreasing level (tolerance distance) of each step
+        :param offsets: offsets of the edits of each step (the number of steps + 1)
+        :param edit_index: index of the segment whose start point changes, or ~index of an unlinked segment
+        :param edit_x: new x coordinate of the start point
+        :param edit_y: new y coordinate of the start point
+        :param tau: maximum tolerance distance
+        """
+        self._x = np.asarray(x, dtype=np.float64)
+        self._y = np.asarray(y, dtype=np.float64)
+        self._operations = np.asarray(operations, dtype=np.uint8)
+        self._levels = np.asarray(levels, dtype=np.float64)
+        self._offsets = np.asarray(offsets, dtype=np.int64)
+        self._edit_index = np.asarray(edit_index, dtype=np.int64)
+        self._edit_x = np.asarray(edit_x, dtype=np.float64)
+        self._edit_y = np.asarray(edit_y, dtype=np.float64)
+        self._tau = float(tau)
+
+    @property
+    def tau(self):
+        """
+        Get the maximum tolerance distance.
+        :return: the maximum tolerance distance
+        """
+        return self._tau
+
+    @property
+    def levels(self):
+        """
+        Get the level of each operation.
+        :return: array of levels
+        """
+        return self._levels
+
+    @property
+    def operations(self):
+        """
+        Get the names of the operations in the order they were performed.
+        :return: list of the names of operations
+        """
+        return [OPERATIONS[operation] for operation in self._operations]
+
+    def __len__(self):
+        return len(self._operations)
+
+    def coordinates(self, tau=None):
+        """
+        Returns the coordinates of the level of detail for a tolerance distance.
+        :param tau: tolerance distance not greater than the maximum tolerance distance (default: the maximum)
+        :return: array (M + 1, 2) of the coordinates of a closed ring
+        """
+        if tau is None:
+            tau = self._tau
+        elif tau > self._tau:
+            raise ValueError('tau {} is greater than the maximum tolerance distance {}'.format(tau, self._tau))
+        steps = np.searchsorted(self._levels, tau, side='right')
+        end = self._offsets[steps]
+        index = self._edit_index[:end]
+
+        alive = np.ones(len(self._x), dtype=bool)
+        alive[~index[index < 0]] = False
+        moved = np.flatnonzero(index >= 0)
+        # the last change of each point wins
+        reverse = moved[::-1]
+        points, first = np.unique(index[reverse], return_index=True)
+        last = reverse[first]
+        x = self._x.copy()
+        y = self._y.copy()
+        x[points] = self._edit_x[last]
+        y[points] = self._edit_y[last]
+
+        coordinates = np.column_stack((x[alive], y[alive]))
+        if len(coordinates) > 0:
+            coordinates = np.vstack((coordinates, coordinates[:1]))
+        return coordinates
+
+    def ring(self, tau=None):
+        """
+        Returns the level of detail for a tolerance distance as a ring.
+        :param tau: tolerance distance not greater than the maximum tolerance distance (default: the maximum)
+        :return: a simplified ring, or None if the ring collapses
+        """
+        coordinates = self.coordinates(tau)
+        if len(coordinates) < 3:
+            return None
+        return LinearRing(coordinates)
+
+    def _arrays(self):
+        """
+        Returns the arrays of the hierarchy by their names.
+        :return: dictionary of arrays
+        """
+        return dict(zip(_FIELDS, (self._x, self._y, self._operations, self._levels, self._offsets, self._edit_index,
+                                  self._edit_x, self._edit_y, np.float64(self._tau))))
+
+    def to_bytes(self):
+        """
+        Returns a compact serialized form of the hierarchy.
+        :return: bytes
+        """
+        return _to_bytes(self._arrays())
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Returns a hierarchy from its serialized form.
+        :param data: bytes returned by to_bytes
+        :return: a hierarchy
+        """
+        arrays = _from_bytes(data)
+        return cls(*[arrays[field] for field in _FIELDS])
+
+
+class PolygonHierarchy:
+    """
+    This class represents the hierarchies of the exterior and interiors of a polygon.
+    """
+    def __init__(self, exterior, interiors):
+        """
+        Initialize with hierarchies of rings.
+        :param exterior: hierarchy of the exterior
+        :param interiors: hierarchies of the interiors
+        """
+        self._exterior = exterior
+        self._interiors = list(interiors)
+
+    @property
+    def exterior(self):
+        """
+        Get the hierarchy of the exterior.
+        :return: the hierarchy of the exterior
+        """
+        return self._exterior
+
+    @property
+    def interiors(self):
+        """
+        Get the hierarchies of the interiors.
+        :return: the hierarchies of the interiors
+        """
+        return self._interiors
+
+    @property
+    def tau(self):
+        """
+        Get the maximum tolerance distance.
+        :return: the maximum tolerance distance
+        """
+        return self._exterior.tau
+
+    def polygon(self, tau=None):
+        """
+        Returns the level of detail for a tolerance distance as a polygon.
+        :param tau: tolerance distance not greater than the maximum tolerance distance (default: the maximum)
+        :return: a simplified polygon, or None if the exterior collapses. Collapsed interiors are dropped.
+        """
+        exterior = self._exterior.ring(tau)
+        if exterior is None:
+            return None
+        interiors = []
+        for hierarchy in self._interiors:
+            interior = hierarchy.ring(tau)
+            if interior is not None:
+                interiors.append(interior)
+        return Polygon(exterior, interiors)
+
+    def to_bytes(self):
+        """
+        Returns a compact serialized form of the hierarchy.
+        :return: bytes
+        """
+        arrays = {}
+        for i, hierarchy in enumerate([self._exterior] + self._interiors):
+            for field, value in hierarchy._arrays().items():
+                arrays['{}_{}'.format(i, field)] = value
+        return _to_bytes(arrays)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Returns a hierarchy from its serialized form.
+        :param data: bytes returned by to_bytes
+        :return: a hierarchy
+        """
+        arrays = _from_bytes(data)
+        rings = []
+        for i in range(len(arrays) // len(_FIELDS)):
+            rings.append(RingHierarchy(*[arrays['{}_{}'.format(i, field)] for field in _FIELDS]))
+        return cls(rings[0], rings[1:])
+
+
+def _to_bytes(arrays):
+    """
+    Serialize arrays in the NumPy .npz format.
+    :param arrays: dictionary of arrays
+    :return: bytes
+    """
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def _from_bytes(data):
+    """
+    Deserialize arrays in the NumPy .npz format.
+    :param data: bytes
+    :return: dictionary of arrays
+    """
+    with np.load(io.BytesIO(data)) as arrays:
+        return {name: arrays[name] for name in arrays.files}
+
+
+def simplify_ring_progressive(linear_ring, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, merge_first=False):
+    # type: (LinearRing, float, float, float, float, bool) -> RingHierarchy
+    """
+    Simplify a ring once with the maximum tolerance distance and record the operations,
+    so that any level of detail up to the maximum tolerance distance can be materialized without running it again.
+    :param linear_ring: ring to simplify
+    :param tau: maximum tolerance distance
+    :param epsilon: tolerance angle
+    :param delta: angle threshold used to determine if consecutive segments are collinear
+    :param gamma: distance threshold used to determine whether to join neighboring segments
+    :param merge_first: condition whether or not it merges neighbors first when possible
+    :return: hierarchy of the levels of detail
+    """
+    coordinates = np.asarray(linear_ring.coords, dtype=np.float64)[:-1, :2]
+    x = np.ascontiguousarray(coordinates[:, 0])
+    y = np.ascontiguousarray(coordinates[:, 1])
+    ring = Ring.from_xy(x, y)
+    ring._journal = journal = []
+    operations = []
+    levels = []
+    offsets = [0]
+
+    def observer(operation, length):
+        operations.append(operation)
+        # a collinear merge does not depend on the tolerance distance
+        levels.append(0.0 if operation == _COLLINEAR else length)
+        offsets.append(len(journal))
+
+    _simplify(ring, tau, epsilon, delta, gamma, merge_first, observer)
+
+    edits = np.array(journal, dtype=np.float64).reshape(-1, 3)
+    return RingHierarchy(x, y, operations, np.maximum.accumulate(np.asarray(levels, dtype=np.float64)), offsets,
+                         edits[:, 0].astype(np.int64), edits[:, 1], edits[:, 2], tau)
+
+
+def simplify_progressive(polygon, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, merge_first=False):
+    # type: (Polygon, float, float, float, float, bool) -> PolygonHierarchy
+    """
+    Simplify a polygon once with the maximum tolerance distance and record the operations,
+    so that any level of detail up to the maximum tolerance distance can be materialized without running it again.
+    :param polygon: polygon to simplify
+    :param tau: maximum tolerance distance
+    :param epsilon: tolerance angle
+    :param delta: angle threshold used to determine if consecutive segments are collinear
+    :param gamma: distance threshold used to determine whether to join neighboring segments
+    :param merge_first: condition whether or not it merges neighbors first when possible
+    :return: hierarchy of the levels of detail
+    """
+    exterior = simplify_ring_progressive(polygon.exterior, tau, epsilon, delta, gamma, merge_first)
+    interiors = []
+    for ring in polygon.interiors:
+        interiors.append(simplify_ring_progressive(ring, tau, epsilon, delta, gamma, merge_first))
+    return PolygonHierarchy(exterior, interiors)
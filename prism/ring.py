@@ -1,24 +1,213 @@
+from array import array
+import math
 from prism.segment import Segment
 
 __all__ = ['Ring']
 
+# kinds of changes recorded to be undone
+_POINT, _LINK, _PIN = range(3)
+
+
+def _to_array(values):
+    """
+    Copy values into an array of doubles. Contiguous float64 buffers are copied without iterating the values.
+    :param values: sequence or buffer of numbers
+    :return: array of doubles
+    """
+    try:
+        view = memoryview(values)
+    except TypeError:
+        return array('d', values)
+    if view.ndim == 1 and view.format == 'd' and view.c_contiguous:
+        _array = array('d')
+        _array.frombytes(view.cast('B'))
+        return _array
+    return array('d', values)
+
 
 class Ring:
+    """
+    This class represents a ring as a doubly linked list of segments stored in compact arrays.
+    Segment i starts at (x[i], y[i]) and ends at the start point of its next segment.
+    Removed segments are unlinked in O(1) and marked as dead instead of being deleted from the arrays.
+    The length, slope and cosine of the angle of each segment are cached in arrays as well, and a cached value is
+    invalidated (set to NaN) when a point or a link it depends on changes.
+    If a journal (list) is set, every change of a point (index, x, y) and every unlinking (~index, nan, nan)
+    is recorded in the journal.
+    Points can be pinned so that the simplification does not move or remove them. When a segment is unlinked,
+    its pin is passed to the start point of its next segment, which takes over the point.
+    Changes since the last call of _begin can be undone with _rollback, e.g., to reject an operation.
+    """
     def __init__(self, coordinates):
-        self._segments = []
-        for i in range(len(coordinates)-1):
-            self._segments.append(Segment(coordinates[i], coordinates[i + 1]))
+        """
+        Initialize with the coordinates of a closed ring (the last coordinates are the same as the first ones).
+        :param coordinates: sequence of pairs of coordinates
+        """
+        size = len(coordinates) - 1
+        self._initialize(array('d', [coordinates[i][0] for i in range(size)]),
+                         array('d', [coordinates[i][1] for i in range(size)]))
+
+    @classmethod
+    def from_xy(cls, x, y):
+        """
+        Returns a ring from the x and y coordinates of its vertices without the closing vertex.
+        Contiguous float64 buffers such as NumPy arrays are copied in bulk.
+        :param x: x coordinates
+        :param y: y coordinates
+        :return: a ring
+        """
+        ring = cls.__new__(cls)
+        ring._initialize(_to_array(x), _to_array(y))
+        return ring
+
+    def _initialize(self, x, y):
+        """
+        Initialize the arrays of the ring.
+        :param x: array of x coordinates of the start points of the segments
+        :param y: array of y coordinates of the start points of the segments
+        :return: None
+        """
+        size = len(x)
+        self._x = x
+        self._y = y
+        self._prev = array('l', range(-1, size - 1))
+        self._next = array('l', range(1, size + 1))
+        if size > 0:
+            self._prev[0] = size - 1
+            self._next[-1] = 0
+        self._alive = bytearray(b'\x01') * size
+        self._size = size
+        self._length = array('d', [math.nan]) * size
+        self._slope = array('d', [math.nan]) * size
+        self._cosine = array('d', [math.nan]) * size
+        self._journal = None
+        self._pinned = None
+        self._undo = None  # changes since _begin: (_POINT, index, old x, old y), (_LINK, index), (_PIN, index, old)
+        self._slots = None  # indices of the alive segments for indexing, built on demand after an unlinking
+        self._journal_mark = 0
+
+    def _invalidate(self, index):
+        """
+        Invalidate the cached metrics depending on the end point of the segment at the index.
+        :param index: index of the segment
+        :return: None
+        """
+        nan = math.nan
+        self._length[index] = nan
+        self._slope[index] = nan
+        self._cosine[index] = nan
+        self._cosine[self._prev[index]] = nan
+
+    def _set_point(self, index, point):
+        """
+        Set the start point of the segment at the index.
+        :param index: index of the segment
+        :param point: new point
+        :return: None
+        """
+        if self._undo is not None:
+            self._undo.append((_POINT, index, self._x[index], self._y[index]))
+        self._x[index] = point[0]
+        self._y[index] = point[1]
+        if self._journal is not None:
+            self._journal.append((index, point[0], point[1]))
+        self._invalidate(self._prev[index])
+        self._length[index] = math.nan
+        self._slope[index] = math.nan
+        self._cosine[index] = math.nan
+
+    def _unlink(self, index):
+        """
+        Unlink the segment at the index from its neighbors. The links of the segment itself are kept.
+        :param index: index of the segment
+        :return: None
+        """
+        prev_index = self._prev[index]
+        next_index = self._next[index]
+        self._next[prev_index] = next_index
+        self._prev[next_index] = prev_index
+        self._alive[index] = 0
+        self._size -= 1
+        self._slots = None
+        if self._undo is not None:
+            self._undo.append((_LINK, index))
+        if self._journal is not None:
+            self._journal.append((~index, math.nan, math.nan))
+        self._invalidate(prev_index)
+
+    def _pass_pin(self, index):
+        """
+        Pass the pin of the unlinked segment at the index to its next segment.
+        :param index: index of the unlinked segment
+        :return: None
+        """
+        if self._pinned is not None and self._pinned[index]:
+            next_index = self._next[index]
+            if self._undo is not None:
+                self._undo.append((_PIN, next_index, self._pinned[next_index]))
+            self._pinned[next_index] = 1
+
+    def _begin(self):
+        """
+        Start recording changes so that they can be undone by _rollback. The changes recorded before are forgotten.
+        :return: None
+        """
+        if self._undo is None:
+            self._undo = []
+        else:
+            del self._undo[:]
+        self._journal_mark = 0 if self._journal is None else len(self._journal)
+
+    def _rollback(self):
+        """
+        Undo the changes since the last call of _begin in reverse order. The journal is truncated as well.
+        :return: None
+        """
+        undo = self._undo
+        while undo:
+            change = undo.pop()
+            index = change[1]
+            if change[0] == _POINT:
+                self._x[index] = change[2]
+                self._y[index] = change[3]
+                self._invalidate(self._prev[index])
+                self._invalidate(index)
+            elif change[0] == _LINK:
+                # the links of an unlinked segment are kept, so it is linked back in reverse order
+                prev_index = self._prev[index]
+                self._next[prev_index] = index
+                self._prev[self._next[index]] = index
+                self._alive[index] = 1
+                self._size += 1
+                self._slots = None
+                self._invalidate(prev_index)
+                self._invalidate(index)
+            else:
+                self._pinned[index] = change[2]
+        if self._journal is not None:
+            del self._journal[self._journal_mark:]
 
-        for i in range(len(self._segments)-1):
-            self._segments[i].prev_seg = self._segments[i - 1]
-            self._segments[i].next_seg = self._segments[i + 1]
+    def pin(self, index):
+        """
+        Pin the start point of the segment at the index, so that the simplification does not move or remove it.
+        :param index: index of the segment
+        :return: None
+        """
+        if self._pinned is None:
+            self._pinned = bytearray(len(self._alive))
+        self._pinned[index] = 1
 
-        self._segments[-1].prev_seg = self._segments[-2]
-        self._segments[-1].next_seg = self._segments[0]
+    def is_pinned(self, index):
+        """
+        Returns whether the start point of the segment at the index is pinned.
+        :param index: index of the segment
+        :return: True if it is pinned
+        """
+        return self._pinned is not None and self._pinned[index] == 1
 
     @property
     def segments(self):
-        return self._segments
+        return [Segment(self, i) for i in range(len(self._alive)) if self._alive[i]]
 
     def merge(self, seg):
         """
@@ -26,11 +215,11 @@ class Ring:
         :param seg: segment to merge
         :return: None
         """
-        if seg in self.segments:
-            seg.prev_seg.next_seg = seg.next_seg
-            seg.next_seg.prev_seg = seg.prev_seg
-            seg.next_seg.sp = seg.prev_seg.ep
-            self.segments.remove(seg)
+        index = seg.index
+        if self._alive[index]:
+            self._unlink(index)
+            self._set_point(self._next[index], (self._x[index], self._y[index]))
+            self._pass_pin(index)
 
     def update(self, seg, sp, ep):
         """
@@ -40,11 +229,10 @@ class Ring:
         :param ep: end point
         :return: new segment
         """
-        if seg in self.segments:
-            seg.sp = sp
-            seg.ep = ep
-            seg.prev_seg.ep = seg.sp
-            seg.next_seg.sp = seg.ep
+        index = seg.index
+        if self._alive[index]:
+            self._set_point(index, sp)
+            self._set_point(self._next[index], ep)
             return seg
 
     def remove(self, seg, q):
@@ -54,30 +242,46 @@ class Ring:
         :param q: new point
         :return: None
         """
-        if seg in self.segments:
-            seg.prev_seg.next_seg = seg.next_seg
-            seg.next_seg.prev_seg = seg.prev_seg
-            seg.prev_seg.ep = q
-            seg.next_seg.sp = q
-            self.segments.remove(seg)
+        index = seg.index
+        if self._alive[index]:
+            self._unlink(index)
+            self._set_point(self._next[index], q)
+            self._pass_pin(index)
 
     def __getitem__(self, index):
-        return self.segments[index]
+        """
+        Returns the alive segment at the position (or the segments in the slice) in the order of their indices.
+        It is O(1) for an index unless the ring changes between the calls.
+        """
+        if self._size == len(self._alive):
+            slots = range(self._size)  # no segment has been unlinked
+        else:
+            if self._slots is None:
+                alive = self._alive
+                self._slots = array('l', [i for i in range(len(alive)) if alive[i]])
+            slots = self._slots
+        if isinstance(index, slice):
+            return [Segment(self, i) for i in slots[index]]
+        return Segment(self, slots[index])
+
+    def __iter__(self):
+        alive = self._alive
+        for i in range(len(alive)):
+            if alive[i]:
+                yield Segment(self, i)
 
     def __len__(self):
-        return len(self.segments)
+        return self._size
 
     def __repr__(self):
-        _mgs = ''
-        for i in range(len(self.segments)):
-            _mgs += str(self.segments[i]) + ',' if i < len(self.segments) else str(self.segments[i])
-        return _mgs
+        return ','.join(str(seg) for seg in self)
 
     @property
     def coordinates(self):
         _coordinates = []
-        for seg in self.segments:
+        for seg in self:
             _coordinates.append(seg.sp)
 
-        _coordinates.append(self.segments[-1].ep)
+        if _coordinates:
+            _coordinates.append(_coordinates[0])
         return _coordinates
@@ -1,7 +1,6 @@
 """
 Segment to support the ring structure
 """
-import numpy as np
 import math
 
 __all__ = ['Segment']
@@ -10,47 +9,63 @@ __all__ = ['Segment']
 class Segment:
     """
     This class represents a segment that implements bidirectional links to previous and next segments of a ring.
+    A segment is a light-weight view of a ring: the coordinates and links are stored in the arrays of the ring,
+    and the end point of a segment is the start point of the next segment.
     """
-    def __init__(self, sp, ep):
+    __slots__ = ('_ring', '_index')
+
+    def __init__(self, ring, index):
+        """
+        Initialize with a ring and the index of the segment in the ring.
+        :param ring: ring that stores the segment
+        :param index: index of the segment in the ring
+        """
+        self._ring = ring
+        self._index = index
+
+    @property
+    def index(self):
         """
-        Initialize with a pair of start and end points.
-        :param sp: start point consisting of a pair of coordinates
-        :param ep: end point consisting of a pair of coordinates
+        Get the index of the segment in the ring.
+        :return: the index of the segment
         """
-        self._coordinates = [sp, ep]
+        return self._index
 
     def _set_sp(self, sp):
         """
-        Set the start point.
+        Set the start point. It is also the end point of the previous segment.
         :param sp: the start point
         :return: None
         """
-        self._coordinates[0] = sp
+        self._ring._set_point(self._index, sp)
 
     def _get_sp(self):
         """
         Get the start point.
         :return: the start point
         """
-        return self._coordinates[0]
+        ring = self._ring
+        return ring._x[self._index], ring._y[self._index]
 
     # start point
     sp = property(_get_sp, _set_sp)
 
     def _set_ep(self, ep):
         """
-        Set the end point.
+        Set the end point. It is also the start point of the next segment.
         :param ep: the end point
         :return: None
         """
-        self._coordinates[1] = ep
+        self._ring._set_point(self._ring._next[self._index], ep)
 
     def _get_ep(self):
         """
         Get the end point.
         :return: the end point
         """
-        return self._coordinates[1]
+        ring = self._ring
+        index = ring._next[self._index]
+        return ring._x[index], ring._y[index]
 
     ep = property(_get_ep, _set_ep)
 
@@ -60,14 +75,15 @@ class Segment:
         :param seg: segment to link to as the next segment
         :return: None
         """
-        self._next = seg
+        self._ring._next[self._index] = seg._index
+        self._ring._invalidate(self._index)
 
     def _get_next_seg(self):
         """
         Get the next segment of the segment.
         :return: the next segment
         """
-        return self._next
+        return Segment(self._ring, self._ring._next[self._index])
 
     # property for the next segment
     next_seg = property(_get_next_seg, _set_next_seg)
@@ -78,18 +94,28 @@ class Segment:
         :param seg: segment to link to as the previous segment
         :return: None
         """
-        self._prev = seg
+        self._ring._prev[self._index] = seg._index
 
     def _get_prev_seg(self):
         """
         Get the previous segment of the segment.
         :return: the previous segment
         """
-        return self._prev
+        return Segment(self._ring, self._ring._prev[self._index])
 
     # property for the previous segment
     prev_seg = property(_get_prev_seg, _set_prev_seg)
 
+    # segments are views, so two segments are the same if they refer to the same index of the same ring
+    def __eq__(self, other):
+        return isinstance(other, Segment) and self._index == other._index and self._ring is other._ring
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return self._index
+
     # comparison operators used for a priority queue
     def __lt__(self, other):
         return self.length() < other.length()
@@ -108,34 +134,67 @@ class Segment:
 
     def length(self):
         """
-        Returns the length of the segment.
+        Returns the length of the segment. The length is cached until the segment changes.
         :return: the length of the segment
         """
-        return np.linalg.norm(np.array(self.sp) - np.array(self.ep))
+        ring = self._ring
+        index = self._index
+        length = ring._length[index]
+        if length != length:  # not cached (NaN)
+            next_index = ring._next[index]
+            dx = ring._x[index] - ring._x[next_index]
+            dy = ring._y[index] - ring._y[next_index]
+            length = math.sqrt(dx * dx + dy * dy)
+            ring._length[index] = length
+        return length
 
     def angle(self):
         """
         Returns the angle between the segment and the next segment (in radian).
+        If either segment has no length, the angle is not defined (NaN).
         :return: the angle between the segment and the next segment (in radian)
         """
-        a = np.array(self.sp)
-        b = np.array(self.ep)
-        c = np.array(self.next_seg.ep)
-        ba = a - b
-        bc = c - b
-        cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
-        cosine_angle = np.maximum(-1, np.minimum(1, cosine_angle))
-        return np.arccos(cosine_angle)
+        return math.acos(self.cosine())
+
+    def cosine(self):
+        """
+        Returns the cosine of the angle between the segment and the next segment, which decreases as the angle grows.
+        The cosine is cached until the segment or the next segment changes.
+        If either segment has no length, the cosine is not defined (NaN).
+        :return: the cosine of the angle between the segment and the next segment
+        """
+        ring = self._ring
+        index = self._index
+        cosine = ring._cosine[index]
+        if cosine != cosine:  # not cached (NaN)
+            x = ring._x
+            y = ring._y
+            b = ring._next[index]
+            c = ring._next[b]
+            bax = x[index] - x[b]
+            bay = y[index] - y[b]
+            bcx = x[c] - x[b]
+            bcy = y[c] - y[b]
+            norm = math.sqrt(bax * bax + bay * bay) * math.sqrt(bcx * bcx + bcy * bcy)
+            if norm == 0:
+                return math.nan
+            cosine = (bax * bcx + bay * bcy) / norm
+            cosine = max(-1.0, min(1.0, cosine))
+            ring._cosine[index] = cosine
+        return cosine
 
     def slope_as_angle(self):
         """
-        Returns the angle of the segment (in radian).
+        Returns the angle of the segment (in radian). The angle is cached until the segment changes.
         :return: the angle of the segment (in radian)
         """
-        b = np.array(self.sp)
-        c = np.array(self.ep)
-
-        delta = np.arctan2(c[1] - b[1], c[0] - b[0])
-        if delta < 0:
-            return math.pi * 2 + delta
-        return delta
+        ring = self._ring
+        index = self._index
+        slope = ring._slope[index]
+        if slope != slope:  # not cached (NaN)
+            next_index = ring._next[index]
+            slope = math.atan2(ring._y[next_index] - ring._y[index], ring._x[next_index] - ring._x[index])
+            if slope < 0:
+                slope = math.pi * 2 + slope
+            ring._slope[index] = slope
+        return slope
@@ -0,0 +1,427 @@
+"""
+Simplification service that coalesces concurrent requests into micro-batches for a warm process pool.
+A request is a POST of polygons, one per line as WKT, hex-encoded WKB or GeoJSON, to /simplify over HTTP on a TCP port
+or a Unix socket, and the response has the simplified polygons in the same order and format.
+A request with a line that cannot be read is answered with 400 and the messages of the lines.
+
+    python -m prism.service [--host 127.0.0.1] [--port 8080] [--unix path] [--workers 4] [--tau 1]
+    curl --data 'POLYGON ((0 0, 2 0, 2 1, 0 1, 0 0))' http://127.0.0.1:8080/simplify
+    curl http://127.0.0.1:8080/metrics
+
+Requests wait in a bounded queue, and a request that does not fit in the queue is rejected at once (503),
+so the latency does not grow without bounds under overload. When a worker is free, the requests waiting in the queue
+are sent to it as a single batch, so one call of the simplification serves many requests.
+"""
+import argparse
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+import json
+import os
+import sys
+from time import perf_counter
+from prism.cli import simplify_lines, _add_arguments, _kwargs, _FORMATS
+
+__all__ = ['SimplificationService', 'ServiceOverloaded']
+
+# polygon simplified by each worker when the pool starts, so that the first requests do not pay for the imports
+_WARM_UP = 'POLYGON ((0 0, 2 0, 2 -1.1, 2.1 -1.1, 2.1 0, 4 0, 1 1.001, 0 2, -1 1, -1 0.99, -2 0, 0 0))'
+
+# reasons of the status codes
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+            500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+# percentiles of the latency in the metrics
+_PERCENTILES = (50, 90, 99)
+
+
+class ServiceOverloaded(Exception):
+    """
+    This exception is raised when a request does not fit in the queue of the service.
+    """
+    pass
+
+
+def _warm_up():
+    """
+    Simplify a polygon in a worker to import the modules before the first batch.
+    :return: None
+    """
+    simplify_lines([_WARM_UP])
+
+
+class SimplificationService:
+    """
+    This class represents a simplification service running on an event loop. Requests are queued in a bounded queue,
+    and a dispatcher sends the waiting requests to a process pool as batches of at most batch_size lines, with at most
+    window batches in flight. The service can be used without HTTP by awaiting simplify.
+    """
+    def __init__(self, workers=None, batch_size=256, max_queue=1024, max_delay=0.0, window=None, executor=None,
+                 fmt='auto', precision=None, max_body=16 * 1024 * 1024, **kwargs):
+        """
+        Initialize a service. It starts with start or serve.
+        :param workers: number of processes of the pool (default: the number of CPUs)
+        :param batch_size: maximum number of lines of a batch. A larger request is sent as a batch of its own.
+        :param max_queue: maximum number of requests waiting in the queue
+        :param max_delay: seconds to wait for more requests to fill a batch when a worker is free.
+            With 0, a batch has the requests waiting at the time, which is the lowest latency.
+        :param window: maximum number of batches in flight (default: the number of workers)
+        :param executor: executor to run the batches on instead of creating a process pool
+        :param fmt: format of the lines, or 'auto' to detect the format of each line
+        :param precision: number of decimal places of WKT, or None to keep all of them
+        :param max_body: maximum size of the body of a request in bytes
+        :param kwargs: parameters of prism.simplify_many
+        """
+        self._workers = workers or os.cpu_count() or 1
+        self._batch_size = batch_size
+        self._max_queue = max_queue
+        self._max_delay = max_delay
+        self._window = window or self._workers
+        self._executor = executor
+        self._own_executor = executor is None
+        self._max_body = max_body
+        self._kwargs = dict(kwargs, fmt=fmt, precision=precision)
+        self._queue = None
+        self._slots = None
+        self._dispatcher = None
+        self._tasks = set()
+        self._servers = []
+        # metrics
+        self._requests = 0
+        self._rejected = 0
+        self._failed = 0
+        self._batches = 0
+        self._lines = 0
+        self._in_flight = 0
+        self._latencies = deque(maxlen=4096)
+
+    async def start(self, host='127.0.0.1', port=8080, path=None):
+        """
+        Start the pool and the dispatcher, and listen on a TCP port or a Unix socket.
+        :param host: host to listen on
+        :param port: port to listen on. With 0, a free port is chosen (see addresses).
+        :param path: path of a Unix socket to listen on instead of the TCP port, or None
+        :return: None
+        """
+        await self.open()
+        if path is not None:
+            server = await asyncio.start_unix_server(self._handle, path=path)
+        else:
+            server = await asyncio.start_server(self._handle, host, port)
+        self._servers.append(server)
+
+    async def open(self):
+        """
+        Start the pool and the dispatcher without listening, e.g., to await simplify directly.
+        All workers of the pool are started and warmed up before it returns.
+        :return: None
+        """
+        if self._dispatcher is not None:
+            return
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self._workers)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self._executor, _warm_up) for _ in range(self._workers)])
+        self._queue = asyncio.Queue(maxsize=self._max_queue)
+        self._slots = asyncio.Semaphore(self._window)
+        self._dispatcher = asyncio.ensure_future(self._dispatch_loop())
+
+    @property
+    def addresses(self):
+        """
+        Get the addresses that the service listens on.
+        :return: list of (host, port) pairs or paths of Unix sockets
+        """
+        return [socket.getsockname() for server in self._servers for socket in server.sockets]
+
+    async def serve(self, host='127.0.0.1', port=8080, path=None):
+        """
+        Start the service and serve until it is cancelled.
+        :param host: host to listen on
+        :param port: port to listen on
+        :param path: path of a Unix socket to listen on instead of the TCP port, or None
+        :return: None
+        """
+        await self.start(host, port, path)
+        try:
+            await asyncio.gather(*[server.serve_forever() for server in self._servers])
+        finally:
+            await self.close()
+
+    async def close(self):
+        """
+        Stop listening, fail the requests waiting in the queue, wait for the batches in flight and shut down the pool
+        if the service created it.
+        :return: None
+        """
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+            while not self._queue.empty():
+                _, future, _ = self._queue.get_nowait()
+                if not future.done():
+                    future.set_exception(ServiceOverloaded('the service is closed'))
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._own_executor and self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def simplify(self, lines):
+        """
+        Simplify the polygons of lines in a batch with other requests.
+        :param lines: list of lines without the line breaks
+        :return: list of the output lines and list of the messages of the lines failed to be read (the index, message)
+        :raise ServiceOverloaded: if the queue is full
+        :raise RuntimeError: if the service has not been opened
+        """
+        if self._queue is None:
+            raise RuntimeError('the service is not open, call open or start first')
+        start = perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((lines, future, start))
+        except asyncio.QueueFull:
+            self._rejected += 1
+            raise ServiceOverloaded('{} requests are waiting'.format(self._max_queue)) from None
+        self._requests += 1
+        try:
+            result = await future
+        except Exception:
+            self._failed += 1
+            raise
+        self._latencies.append(perf_counter() - start)
+        return result
+
+    def metrics(self):
+        """
+        Returns the metrics of the service: the numbers of requests, rejected requests and failed requests,
+        the number of batches and their mean number of lines, the number of requests waiting in the queue,
+        the number of batches in flight, and the percentiles of the latency of recent requests in seconds.
+        :return: dictionary of the metrics
+        """
+        latencies = sorted(self._latencies)
+        latency = {}
+        if latencies:
+            for percentile in _PERCENTILES:
+                latency['p{}'.format(percentile)] = latencies[min(len(latencies) - 1,
+                                                                  len(latencies) * percentile // 100)]
+            latency['max'] = latencies[-1]
+        return {'requests': self._requests, 'rejected': self._rejected, 'failed': self._failed,
+                'batches': self._batches, 'mean_batch_size': self._lines / self._batches if self._batches else 0.0,
+                'queue_depth': 0 if self._queue is None else self._queue.qsize(),
+                'batches_in_flight': self._in_flight, 'latency': latency}
+
+    async def _dispatch_loop(self):
+        """
+        Send the requests waiting in the queue to the pool as batches whenever a batch can be in flight.
+        When it is cancelled, the requests taken from the queue but not sent yet fail.
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        requests = []  # the batch being filled, whose requests are no longer in the queue
+        acquired = False
+        try:
+            while True:
+                requests = [await self._queue.get()]
+                await self._slots.acquire()
+                acquired = True
+                # a batch takes its share of the waiting requests, so that a burst does not go to a single worker
+                share = -(-(self._queue.qsize() + 1) // self._window)
+                n_lines = len(requests[0][0])
+                deadline = loop.time() + self._max_delay
+                while n_lines < self._batch_size:
+                    if not self._queue.empty():
+                        if len(requests) >= share:
+                            break
+                        request = self._queue.get_nowait()
+                    else:
+                        timeout = deadline - loop.time()
+                        if timeout <= 0:
+                            break
+                        try:
+                            request = await asyncio.wait_for(self._queue.get(), timeout)
+                        except asyncio.TimeoutError:
+                            break
+                    requests.append(request)
+                    n_lines += len(request[0])
+                task = asyncio.ensure_future(self._run_batch(requests))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                requests = []
+                acquired = False
+        except asyncio.CancelledError:
+            # the service is closed while a batch is waiting for a slot or filling
+            if acquired:
+                self._slots.release()
+            for _, future, _ in requests:
+                if not future.done():
+                    future.set_exception(ServiceOverloaded('the service is closed'))
+            raise
+
+    async def _run_batch(self, requests):
+        """
+        Simplify a batch of requests in the pool and resolve their futures.
+        :param requests: list of the lines, the future and the start time of each request
+        :return: None
+        """
+        lines = [line for request in requests for line in request[0]]
+        executor = self._executor
+        self._in_flight += 1
+        try:
+            output, errors = await asyncio.get_running_loop().run_in_executor(
+                executor, partial(simplify_lines, lines, **self._kwargs))
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool) and self._own_executor and executor is self._executor:
+                # a worker died, e.g., out of memory, so the pool is replaced for the next batches
+                self._executor = ProcessPoolExecutor(max_workers=self._workers)
+                executor.shutdown(wait=False)
+            for _, future, _ in requests:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+        self._batches += 1
+        self._lines += len(lines)
+        offset = 0
+        for _lines, future, _ in requests:
+            end = offset + len(_lines)
+            if not future.done():  # the client may have gone
+                messages = [(i - offset, message) for i, message in errors if offset <= i < end]
+                future.set_result((output[offset:end], messages))
+            offset = end
+
+    async def _handle(self, reader, writer):
+        """
+        Handle the HTTP/1.1 requests of a connection.
+        :param reader: stream reader of the connection
+        :param writer: stream writer of the connection
+        :return: None
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                    length = int(headers.get('content-length', 0))
+                    if length < 0:
+                        raise ValueError('negative content length')
+                except ValueError:
+                    self._respond(writer, 400, 'malformed request\n', close=True)
+                    break
+                if length > self._max_body:
+                    self._respond(writer, 413, 'the body is larger than {} bytes\n'.format(self._max_body), close=True)
+                    break
+                body = await reader.readexactly(length)
+                status, payload, content_type = await self._route(method, target.split('?', 1)[0], body)
+                close = version != 'HTTP/1.1' or headers.get('connection', '').lower() == 'close'
+                self._respond(writer, status, payload, content_type, close)
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body):
+        """
+        Returns the response to a request.
+        :param method: method of the request
+        :param path: path of the request without the query
+        :param body: body of the request
+        :return: status code, payload and content type
+        """
+        if path == '/simplify':
+            if method != 'POST':
+                return 405, 'use POST\n', 'text/plain'
+            lines = [line.strip() for line in body.decode('utf-8', errors='replace').splitlines()]
+            try:
+                output, errors = await self.simplify(lines)
+            except ServiceOverloaded as e:
+                return 503, '{}\n'.format(e), 'text/plain'
+            except Exception as e:
+                return 500, '{}: {}\n'.format(type(e).__name__, e), 'text/plain'
+            if errors:
+                return 400, ''.join('line {}: {}\n'.format(i + 1, message) for i, message in errors), 'text/plain'
+            return 200, ''.join(line + '\n' for line in output), 'text/plain'
+        if path == '/metrics':
+            if method != 'GET':
+                return 405, 'use GET\n', 'text/plain'
+            return 200, json.dumps(self.metrics()) + '\n', 'application/json'
+        if path == '/health':
+            return 200, 'ok\n', 'text/plain'
+        return 404, 'not found\n', 'text/plain'
+
+    def _respond(self, writer, status, payload, content_type='text/plain', close=False):
+        """
+        Write a response.
+        :param writer: stream writer of the connection
+        :param status: status code
+        :param payload: text of the body
+        :param content_type: content type of the body
+        :param close: condition whether or not the connection is closed after the response
+        :return: None
+        """
+        body = payload.encode('utf-8')
+        headers = ['HTTP/1.1 {} {}'.format(status, _REASONS[status]),
+                   'Content-Type: {}; charset=utf-8'.format(content_type),
+                   'Content-Length: {}'.format(len(body))]
+        if status == 503:
+            headers.append('Retry-After: 1')
+        if close:
+            headers.append('Connection: close')
+        writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + body)
+
+
+def _main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m prism.service', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1', help='host to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='port to listen on')
+    parser.add_argument('--unix', default=None, help='path of a Unix socket to listen on instead of the port')
+    parser.add_argument('-f', '--format', choices=_FORMATS, default='auto',
+                        help='format of the lines (default: detected for each line)')
+    _add_arguments(parser)
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1, help='number of processes')
+    parser.add_argument('--batch-size', type=int, default=256, help='maximum number of lines of a batch')
+    parser.add_argument('--max-queue', type=int, default=1024,
+                        help='maximum number of requests waiting in the queue, beyond which requests are rejected')
+    parser.add_argument('--max-delay', type=float, default=0.0,
+                        help='seconds to wait for more requests to fill a batch when a worker is free')
+    parser.add_argument('--max-body', type=int, default=16 * 1024 * 1024,
+                        help='maximum size of the body of a request in bytes, beyond which requests are rejected (413)')
+    args = parser.parse_args(argv)
+
+    service = SimplificationService(args.workers, args.batch_size, args.max_queue, args.max_delay,
+                                    fmt=args.format, precision=args.precision, max_body=args.max_body,
+                                    **_kwargs(args))
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(_main())
@@ -1,21 +1,30 @@
-from heapq import heappush, heappop, heapify
 import math
 from math import pi, isinf
+import sys
+from time import perf_counter
+import numpy as np
+from prism._kernel import interpolate, point_segment_distance, segment_length
+from prism.heap import PriorityQueue
+from prism.prefilter import strip_redundant_vertices, _collinear_cosine
 from prism.ring import Ring
+from prism.segment import Segment
+from prism.validation import SegmentGrid
 from shapely.geometry import LinearRing
-from shapely.geometry import LineString
-from shapely.geometry import Point
 from shapely.geometry import Polygon
-from shapely.wkt import loads
 
-__all__ = ['simplify', 'simplify_ring']
+__all__ = ['simplify', 'simplify_ring', 'simplify_coords']
 
-# internal use for debugging
-_debug_mode = False
+# operations of the simplification
+_COLLINEAR, _REGRESSION, _TRANSLATE, _JOIN, _REMOVAL = range(5)
+OPERATIONS = ('collinear', 'regression', 'translate', 'join', 'removal')
+# number of times a segment may be regressed until the ring loses a vertex. A regression does not remove a vertex,
+# and repeated regressions of a segment may converge to a fixed point (or oscillate in rounding) without an end.
+_MAX_REGRESSIONS = 64
 
 
-def simplify(polygon, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, merge_first=False):
-    # type: (Polygon, float, float, float, float, bool) -> Polygon
+def simplify(polygon, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, merge_first=False, stats=None,
+             prefilter=False, validate=False, max_vertices=None, time_limit=None, cache=None):
+    # type: (Polygon, float, float, float, float, bool, SimplificationStats, bool, bool, int, float, Any) -> Polygon
     """
     Returns a simplified polygon using a simplification method considering to preserve important spatial properties.
     :param polygon: polygon to simplify
@@ -24,20 +33,42 @@ def simplify(polygon, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, merge_firs
     :param delta: angle threshold used to determine if consecutive segments are collinear
     :param gamma: distance threshold used to determine whether to join neighboring segments
     :param merge_first: condition whether or not it merges neighbors first when possible
-    :return: a simplified polygon
+    :param stats: statistics (prism.SimplificationStats) to add the statistics of the simplification to, or None
+    :param prefilter: condition whether or not it strips duplicate and collinear vertices in bulk before the main loop
+    :param validate: condition whether or not it skips the operations that make a ring cross itself or another ring
+    :param max_vertices: maximum number of vertices of each ring. If a ring has more vertices after the simplification,
+        the tolerance distance is doubled and the simplification continues until it has at most max_vertices.
+    :param time_limit: seconds to spend on the polygon. When the time is up, the rings simplified so far are returned.
+    :param cache: cache (prism.SimplificationCache) to look up and store the simplified rings in, or None.
+        It is not supported with stats, validate and time_limit.
+    :return: a simplified polygon, or None if the exterior collapses (fewer than three vertices).
+        Collapsed holes are dropped.
     """
-    exterior = simplify_ring(polygon.exterior, tau, epsilon, delta, gamma, merge_first)
+    if cache is not None:
+        _check_cache(stats, validate, time_limit)
+        return cache.simplify(polygon, tau, epsilon, delta, gamma, merge_first, prefilter, max_vertices)
+    deadline = None if time_limit is None else perf_counter() + time_limit
+    guard = None
+    if validate:
+        guard = SegmentGrid([np.asarray(ring.coords)[:-1, :2].T.tolist()
+                             for ring in [polygon.exterior, *polygon.interiors]], tau)
+    exterior = _simplify_linear_ring(polygon.exterior, tau, epsilon, delta, gamma, merge_first, stats, prefilter,
+                                     guard, 0, max_vertices, deadline)
     interiors = []
-    for ring in polygon.interiors:
-        interiors.append(simplify_ring(ring, tau, epsilon, delta, gamma, merge_first))
+    for i, ring in enumerate(polygon.interiors):
+        interior = _simplify_linear_ring(ring, tau, epsilon, delta, gamma, merge_first, stats, prefilter, guard, i + 1,
+                                         max_vertices, deadline)
+        if interior is not None:  # a collapsed hole is removed
+            interiors.append(interior)
 
     if exterior is None:
         return None
     return Polygon(exterior, interiors)
 
 
-def simplify_ring(linear_ring, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, merge_first=False):
-    # type: (LinearRing, float, float, float, float, bool) -> LinearRing
+def simplify_ring(linear_ring, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, merge_first=False, stats=None,
+                  prefilter=False, validate=False, max_vertices=None, time_limit=None):
+    # type: (LinearRing, float, float, float, float, bool, SimplificationStats, bool, bool, int, float) -> LinearRing
     """
     Returns a simplified ring using a simplification method considering to preserve important spatial properties.
     :param linear_ring: ring to simplify
@@ -46,19 +77,187 @@ def simplify_ring(linear_ring, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, m
     :param delta: angle threshold used to determine if consecutive segments are collinear
     :param gamma: distance threshold used to determine whether to join neighboring segments
     :param merge_first: condition whether or not it merges neighbors first when possible
-    :return: a simplified ring
+    :param stats: statistics (prism.SimplificationStats) to add the statistics of the simplification to, or None
+    :param prefilter: condition whether or not it strips duplicate and collinear vertices in bulk before the main loop.
+        Collinear vertices are then removed in a different order than the main loop would, so the result may differ.
+    :param validate: condition whether or not it skips the operations that make the ring cross itself
+    :param max_vertices: maximum number of vertices. If the ring has more vertices after the simplification,
+        the tolerance distance is doubled and the simplification continues until it has at most max_vertices.
+    :param time_limit: seconds to spend on the ring. When the time is up, the ring simplified so far is returned.
+    :return: a simplified ring, or None if it collapses (fewer than three vertices)
     """
-    # Initialize a priority queue
-    queue = []
-    push = heappush
-    pop = heappop
-
-    # deep copy from the linear ring
-    _coordinates = []
-    for coord in linear_ring.coords:
-        _x, _y = coord
-        _coordinates.append((_x, _y))
-    ring = Ring(_coordinates)
+    deadline = None if time_limit is None else perf_counter() + time_limit
+    guard = SegmentGrid([np.asarray(linear_ring.coords)[:-1, :2].T.tolist()], tau) if validate else None
+    return _simplify_linear_ring(linear_ring, tau, epsilon, delta, gamma, merge_first, stats, prefilter, guard, 0,
+                                 max_vertices, deadline)
+
+
+def simplify_coords(coords, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, merge_first=False, stats=None,
+                    prefilter=False, validate=False, max_vertices=None, time_limit=None, return_index=False):
+    # type: (np.ndarray, float, float, float, float, bool, SimplificationStats, bool, bool, int, float) -> np.ndarray
+    """
+    Returns the simplified coordinates of a ring given as an array, without building Shapely geometries.
+    The coordinates are copied into the ring in bulk, so it suits coordinates held in columnar form (e.g., GeoArrow)
+    or in shared memory.
+    :param coords: array (N, 2) of the coordinates of a ring, or any buffer of float64 in the shape, e.g., a NumPy array
+        or a memoryview. If the last coordinates are the same as the first ones, the ring is closed.
+    :param tau: tolerance distance
+    :param epsilon: tolerance angle
+    :param delta: angle threshold used to determine if consecutive segments are collinear
+    :param gamma: distance threshold used to determine whether to join neighboring segments
+    :param merge_first: condition whether or not it merges neighbors first when possible
+    :param stats: statistics (prism.SimplificationStats) to add the statistics of the simplification to, or None
+    :param prefilter: condition whether or not it strips duplicate and collinear vertices in bulk before the main loop
+    :param validate: condition whether or not it skips the operations that make the ring cross itself
+    :param max_vertices: maximum number of vertices. If the ring has more vertices after the simplification,
+        the tolerance distance is doubled and the simplification continues until it has at most max_vertices.
+    :param time_limit: seconds to spend on the ring. When the time is up, the ring simplified so far is returned.
+    :param return_index: condition whether or not it returns the index of the input vertex that each simplified
+        vertex comes from as well, e.g., to re-simplify an edit with prism.resimplify_coords.
+        It is not supported with prefilter.
+    :return: array (M, 2) of the simplified coordinates, closed if the input is closed,
+        or None if the ring collapses (fewer than three vertices).
+        With return_index, a pair of the coordinates and an increasing array (M,) of the indices of the input vertices
+        without the closing vertex.
+    """
+    if return_index and prefilter:
+        raise ValueError('return_index is not supported with prefilter')
+    deadline = None if time_limit is None else perf_counter() + time_limit
+    if stats is not None:
+        start = perf_counter()
+    x, y, closed = _open_ring(coords)
+    n = len(x)
+    if prefilter:
+        x, y = strip_redundant_vertices(x, y, delta)
+    ring = Ring.from_xy(x, y)
+    if stats is not None:
+        stats._add_time('prepare', start)
+    guard = None
+    if validate:
+        guard = SegmentGrid([(x.tolist(), y.tolist())], tau)
+        guard.attach(0, ring)
+    ring = _simplify(ring, tau, epsilon, delta, gamma, merge_first, stats=stats, guard=guard,
+                     max_vertices=max_vertices, deadline=deadline)
+
+    if stats is not None:
+        start = perf_counter()
+        stats._add_ring(n, len(ring))
+    if len(ring) < 3 or guard is not None and not guard.detach(0):
+        return (None, None) if return_index else None
+    result = _alive_points(ring)
+    if closed:
+        result = np.vstack((result, result[:1]))
+    if stats is not None:
+        stats._add_time('output', start)
+    if return_index:
+        return result, np.flatnonzero(np.frombuffer(ring._alive, dtype=np.bool_))
+    return result
+
+
+def _check_cache(stats, validate, time_limit):
+    """
+    Raise an error if options that a cache does not support are given with it.
+    The results of the validation and the time limit depend on the other rings and on the time, and the statistics
+    of the rings found in the cache are not known.
+    :param stats: statistics, or None
+    :param validate: condition whether or not it validates the operations
+    :param time_limit: seconds to spend, or None
+    :return: None
+    """
+    for name, value in (('stats', stats is not None), ('validate', validate), ('time_limit', time_limit is not None)):
+        if value:
+            raise ValueError('{} is not supported with a cache'.format(name))
+
+
+def _open_ring(coords):
+    """
+    Returns the x and y coordinates of a ring given as an array without the closing vertex.
+    :param coords: array (N, 2) of the coordinates of a ring, closed or not
+    :return: contiguous arrays of x and y coordinates, and whether the ring is closed
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    if coords.ndim != 2 or coords.shape[1] != 2:
+        raise ValueError('coords must be of shape (N, 2), but got {}'.format(coords.shape))
+    closed = len(coords) > 1 and coords[0, 0] == coords[-1, 0] and coords[0, 1] == coords[-1, 1]
+    n = len(coords) - 1 if closed else len(coords)
+    return np.ascontiguousarray(coords[:n, 0]), np.ascontiguousarray(coords[:n, 1]), closed
+
+
+def _simplify_linear_ring(linear_ring, tau, epsilon, delta, gamma, merge_first, stats, prefilter, guard, ring_id,
+                          max_vertices=None, deadline=None):
+    """
+    Returns a simplified ring. See simplify_ring.
+    :param guard: grid of the segments of the rings of the polygon (prism.validation.SegmentGrid), or None
+    :param ring_id: id of the ring in the grid
+    :param max_vertices: maximum number of vertices, or None
+    :param deadline: time (perf_counter) to stop at, or None
+    :return: a simplified ring, or None if it collapses
+    """
+    if stats is not None:
+        start = perf_counter()
+    if prefilter:
+        coordinates = np.asarray(linear_ring.coords, dtype=np.float64)
+        before = len(coordinates) - 1
+        ring = Ring.from_xy(*strip_redundant_vertices(coordinates[:-1, 0], coordinates[:-1, 1], delta))
+    else:
+        # deep copy from the linear ring
+        _coordinates = []
+        for coord in linear_ring.coords:
+            _x, _y = coord
+            _coordinates.append((_x, _y))
+        ring = Ring(_coordinates)
+        before = len(ring)
+    if stats is not None:
+        stats._add_time('prepare', start)
+    if guard is not None:
+        guard.attach(ring_id, ring)
+    ring = _simplify(ring, tau, epsilon, delta, gamma, merge_first, stats=stats, guard=guard,
+                     max_vertices=max_vertices, deadline=deadline)
+    collapsed = guard is not None and not guard.detach(ring_id)
+
+    if stats is not None:
+        start = perf_counter()
+        stats._add_ring(before, len(ring))
+    if len(ring) < 3 or collapsed:
+        return None
+    result = LinearRing(ring.coordinates)
+    if stats is not None:
+        stats._add_time('output', start)
+    return result
+
+
+def _simplify(ring, tau, epsilon, delta, gamma, merge_first, observer=None, stats=None, guard=None, max_vertices=None,
+              deadline=None):
+    # type: (Ring, float, float, float, float, bool, callable, SimplificationStats, SegmentGrid, int, float) -> Ring
+    """
+    Simplify a ring in place. It is the main iteration shared by the simplification functions.
+    :param ring: ring to simplify
+    :param tau: tolerance distance
+    :param epsilon: tolerance angle
+    :param delta: angle threshold used to determine if consecutive segments are collinear
+    :param gamma: distance threshold used to determine whether to join neighboring segments
+    :param merge_first: condition whether or not it merges neighbors first when possible
+    :param observer: function called with the operation (index of OPERATIONS) and the length of the de-queued segment
+        after each operation
+    :param stats: statistics to add the operations, the use of the queue and the time of the phases to, or None
+    :param guard: grid of segments (prism.validation.SegmentGrid) that the ring is attached to, or None.
+        If given, an operation that makes a crossing is rolled back, and the de-queued segment is skipped.
+    :param max_vertices: maximum number of vertices, or None. If the ring has more vertices when the queue is empty,
+        the tolerance distance is doubled and all segments are enqueued again, and the iteration stops as soon as
+        the ring has at most max_vertices. It gives up when the ring does not shrink with a tolerance distance longer
+        than all segments, e.g., because of pinned points or a guard.
+    :param deadline: time (perf_counter) to stop the iteration at, or None. The ring simplified so far is returned.
+    :return: the simplified ring
+    Segments are de-queued by their lengths when they are enqueued, and segments of the same length in the order
+    they are enqueued. A segment is regressed at most _MAX_REGRESSIONS times until the ring loses a vertex.
+    """
+    # Initialize a priority queue. Statistics use a counting queue and observer only when they are collected.
+    if stats is None:
+        queue = PriorityQueue()
+    else:
+        start = perf_counter()
+        queue = stats._queue()
+        observer = stats._observer(observer)
 
     def remove_from_queue(seg):
         """
@@ -66,12 +265,8 @@ def simplify_ring(linear_ring, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, m
         :param seg: segment to remove from the queue
         :return: None
         """
-        try:
-            queue.remove(seg)
-            heapify(queue)  # it is required to keep the heap structure
-        except ValueError:
-            # it is possible because some segment can be removed from the queue
-            pass
+        # it is possible that the segment has already been removed from the queue
+        queue.remove(seg.index)
 
     def enqueue(seg):
         """
@@ -79,15 +274,15 @@ def simplify_ring(linear_ring, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, m
         :param seg: segment to enqueue
         :return: None
         """
-        if seg in queue:
-            # avoid adding the existing segment in the queue
-            pass
-        else:
-            push(queue, seg)
+        # the queue keeps the index of the segment with its length as the key,
+        # and it avoids adding the existing segment
+        queue.push(seg.index, seg.length())
 
     # Enqueue all segments
     for line_segment in ring:
         enqueue(line_segment)
+    if stats is not None:
+        start = stats._add_time('enqueue', start)
 
     def remove_middle_point(seg):
         """
@@ -98,8 +293,6 @@ def simplify_ring(linear_ring, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, m
         remove_from_queue(seg.next_seg)
         ring.merge(seg)
         enqueue(seg.next_seg)
-        if _debug_mode:
-            print('remove_middle_point:', seg.next_seg)
 
     def project(px, py, x, y, tan):
         """
@@ -173,20 +366,23 @@ def simplify_ring(linear_ring, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, m
         Remove a middle point if the merge_first flag is set and it is appropriate.
         Otherwise, find a segment to consider both length and angle of the previous and next segments.
         :param seg: segment to regress
-        :return: None
+        :return: the operation performed, or None if the segment has been regressed too many times
         """
         if merge_first:
             if seg.prev_seg.length() < tau and seg.next_seg.length() < tau:
                 if seg.prev_seg.length() < seg.next_seg.length():
-                    if LineString([seg.prev_seg.sp, seg.next_seg.sp]).length < tau:
+                    if segment_length(seg.prev_seg.sp, seg.next_seg.sp) < tau:
                         remove_from_queue(seg.prev_seg)
                         remove_middle_point(seg.prev_seg)
-                        return
+                        return _REMOVAL
                 else:
-                    if LineString([seg.prev_seg.ep, seg.next_seg.ep]).length < tau:
+                    if segment_length(seg.prev_seg.ep, seg.next_seg.ep) < tau:
                         remove_middle_point(seg)
-                        return
+                        return _REMOVAL
+        if regressions.get(seg.index, 0) >= _MAX_REGRESSIONS:
+            return None  # no progress, and the segment is not enqueued again
         segment_regression(seg)
+        return _REGRESSION
 
     def segment_regression(seg):
         """
@@ -198,8 +394,7 @@ def simplify_ring(linear_ring, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, m
         remove_from_queue(seg.next_seg)
 
         ratio = seg.prev_seg.length()/(seg.prev_seg.length() + seg.next_seg.length())
-        line = LineString([seg.sp, seg.ep])
-        p = line.interpolate(ratio, normalized=True)
+        px, py = interpolate(seg.sp, seg.ep, ratio)
 
         a1 = seg.prev_seg.slope_as_angle()
         a2 = seg.next_seg.slope_as_angle()
@@ -215,16 +410,21 @@ def simplify_ring(linear_ring, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, m
         prev2 = seg.prev_seg.prev_seg
         next2 = seg.next_seg.next_seg
         # Intersection of the previous of the previous segment with the line through p with slope theta.
-        q1 = intersection2(prev2, p.xy[0][0], p.xy[1][0], theta)
-        if q1 is None or LineString([prev2.sp, prev2.ep]).distance(Point(q1)) > seg.length():
+        # If the point between them is pinned, the intersection would move past it.
+        q1 = None if ring.is_pinned(seg.prev_seg.index) else intersection2(prev2, px, py, theta)
+        if q1 is not None and ring.is_pinned(prev2.index) and _beyond(q1, prev2.ep, prev2.sp):
+            q1 = None
+        if q1 is None or point_segment_distance(q1, prev2.sp, prev2.ep) > seg.length():
             # Intersection of the previous segment with the line through p with slope theta if q1 is too far.
-            q1 = project(seg.prev_seg.sp[0], seg.prev_seg.sp[1], p.xy[0][0], p.xy[1][0], theta)
+            q1 = project(seg.prev_seg.sp[0], seg.prev_seg.sp[1], px, py, theta)
 
         # Intersection of the next of the next segment with the line through p with slope theta.
-        q2 = intersection2(next2, p.xy[0][0], p.xy[1][0], theta)
-        if q2 is None or LineString([next2.sp, next2.ep]).distance(Point(q2)) > seg.length():
+        q2 = None if ring.is_pinned(next2.index) else intersection2(next2, px, py, theta)
+        if q2 is not None and ring.is_pinned(next2.next_seg.index) and _beyond(q2, next2.sp, next2.ep):
+            q2 = None
+        if q2 is None or point_segment_distance(q2, next2.sp, next2.ep) > seg.length():
             # Intersection of the next segment with the line through p with slope theta if q2 is too far.
-            q2 = project(seg.next_seg.ep[0], seg.next_seg.ep[1], p.xy[0][0], p.xy[1][0], theta)
+            q2 = project(seg.next_seg.ep[0], seg.next_seg.ep[1], px, py, theta)
 
         # update the segment with new two points
         seg = ring.update(seg, q1, q2)
@@ -233,9 +433,6 @@ def simplify_ring(linear_ring, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, m
         enqueue(seg)
         enqueue(seg.next_seg)
 
-        if _debug_mode:
-            print('regression:', p.coords.xy, theta, seg, q1, q2)
-
     def join_segment(seg, p):
         """
         Remove a segment and join the previous and next segments with point p
@@ -249,8 +446,6 @@ def simplify_ring(linear_ring, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, m
         ring.remove(seg, p)
         enqueue(seg.prev_seg)
         enqueue(seg.next_seg)
-        if _debug_mode:
-            print('join:', p)
 
     def translate_segment(seg):
         """
@@ -262,7 +457,6 @@ def simplify_ring(linear_ring, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, m
         remove_from_queue(seg.next_seg)
         prev_length = seg.prev_seg.length()
         next_length = seg.next_seg.length()
-        p = 'same length'
         if prev_length < next_length:
             p = seg.ep[0] - (seg.prev_seg.ep[0] - seg.prev_seg.sp[0]), seg.ep[1] - \
                 (seg.prev_seg.ep[1] - seg.prev_seg.sp[1])
@@ -285,56 +479,169 @@ def simplify_ring(linear_ring, tau=1, epsilon=pi/36, delta=pi/180, gamma=None, m
             ring.remove(seg.prev_seg, seg.sp)
             enqueue(seg)
 
-        if _debug_mode:
-            print('translate:', p)
-
     # main iteration for simplification
-    while len(queue) > 0 and len(ring) >= 3:
-        s = pop(queue)  # de-queue the next segment
-        if _debug_mode:
-            print('de-queue:', len(queue), s.length(), s, s.angle())
-
-        dirty = True  # flag used to check if the ring changes
-        if pi - delta < s.angle() < pi + delta:
-            # if two segments are approximately collinear.
+    # The cases are told apart by the sines and cosines of the angles against those of the thresholds,
+    # so that no trigonometric function is needed but in the regression.
+    collinear_cosine = _collinear_cosine(delta)
+    squared_sine, parallel_cosine, antiparallel_cosine = _tolerance_thresholds(epsilon)
+    _x = ring._x
+    _y = ring._y
+    _next = ring._next
+    _prev = ring._prev
+    pinned = ring._pinned
+    budget = None  # number of vertices to stop at after the tolerance distance is escalated
+    escalated_size = 0  # number of vertices when the tolerance distance is escalated
+    regressions = {}  # index of a segment -> number of its regressions since the ring lost a vertex
+    size = len(ring)
+    while len(ring) >= 3:
+        if len(queue) == 0:
+            if max_vertices is None or len(ring) <= max_vertices:
+                break
+            longest = max(seg.length() for seg in ring)
+            if budget is not None and tau >= longest and len(ring) == escalated_size:
+                break  # a larger tolerance distance does not change anything
+            # escalate the tolerance distance and go on with the simplified ring
+            tau = 2 * tau if tau > 0 else longest
+            budget = max_vertices
+            escalated_size = len(ring)
+            for line_segment in ring:
+                enqueue(line_segment)
+        if budget is not None and len(ring) <= budget:
+            break
+        if deadline is not None and perf_counter() >= deadline:
+            break
+        s = Segment(ring, queue.pop())  # de-queue the next segment
+        length = s.length()
+        operation = None  # operation performed if the ring changes
+        if guard is not None:
+            # record the changes and the neighbors in the queue to roll back an operation making a crossing
+            ring._begin()
+            neighbors = (_prev[_prev[s.index]], _prev[s.index], _next[s.index], _next[_next[s.index]])
+            queued = [(i, queue.key(i)) for i in neighbors if i in queue]
+        if pinned is not None and (pinned[s.index] or pinned[ring._next[s.index]]):
+            # a pinned point is neither moved nor removed, so only the other end point of a short segment is removed
+            if not pinned[ring._next[s.index]]:
+                if length == 0 or s.cosine() < collinear_cosine:
+                    remove_middle_point(s)
+                    operation = _COLLINEAR
+                elif length <= tau:
+                    remove_middle_point(s)
+                    operation = _REMOVAL
+            elif not pinned[s.index] and length <= tau:
+                remove_from_queue(s.prev_seg)
+                remove_middle_point(s.prev_seg)
+                operation = _COLLINEAR if length == 0 else _REMOVAL
+        elif length == 0 or s.cosine() < collinear_cosine:
+            # if two segments are approximately collinear, or if the segment has no length (a duplicate point).
             remove_middle_point(s)
-        elif s.length() <= tau:
-            _a1 = s.prev_seg.slope_as_angle()
-            _a2 = s.next_seg.slope_as_angle()
-            if abs(_a1 - _a2) > math.pi:
-                if _a1 > _a2:
-                    _a2 += math.pi * 2
-                else:
-                    _a1 += math.pi * 2
-            alpha = abs(_a1 - _a2)
-            alpha = min(alpha, abs(alpha - pi*2))
-            if 0 <= alpha <= epsilon:
-                conditional_segment_regression(s)
-            elif pi - alpha <= epsilon:
+            operation = _COLLINEAR
+        elif length <= tau:
+            # cross and dot products of the directions of the previous and next segments, which are the sine and
+            # cosine of the angle alpha between them times the product of their lengths. A segment without length
+            # has the direction of the x axis like the slope of 0.
+            a = _prev[s.index]
+            c = _next[s.index]
+            d = _next[c]
+            ux = _x[s.index] - _x[a]
+            uy = _y[s.index] - _y[a]
+            vx = _x[d] - _x[c]
+            vy = _y[d] - _y[c]
+            if ux == 0 and uy == 0:
+                ux = 1.0
+            if vx == 0 and vy == 0:
+                vx = 1.0
+            squared_norm = (ux * ux + uy * uy) * (vx * vx + vy * vy)
+            cross = ux * vy - uy * vx
+            dot = ux * vx + uy * vy
+            aligned = cross * cross <= squared_sine * squared_norm
+            norm = math.sqrt(squared_norm)
+            if aligned and dot >= parallel_cosine * norm:  # alpha <= epsilon
+                operation = conditional_segment_regression(s)
+            elif aligned and dot <= antiparallel_cosine * norm:  # pi - alpha <= epsilon
                 translate_segment(s)
+                operation = _TRANSLATE
             else:
                 # Intersection of two lines obtained by extending the previous and next segments
                 q = intersection(s.prev_seg, s.next_seg)
                 _gamma = s.length() if gamma is None else gamma
                 _gamma = min(_gamma, tau)
-                if q is not None and LineString([s.sp, s.ep]).distance(Point(q)) <= _gamma:
+                if q is not None and point_segment_distance(q, s.sp, s.ep) <= _gamma:
                     join_segment(s, q)
+                    operation = _JOIN
                 elif s.prev_seg.length() < s.next_seg.length():
                     remove_from_queue(s.prev_seg)
                     remove_middle_point(s.prev_seg)
+                    operation = _REMOVAL
                 else:
                     remove_middle_point(s)
-        else:
-            dirty = False
+                    operation = _REMOVAL
 
-        if _debug_mode:
-            # print(queue)
-            if dirty:
-                print(Polygon(ring.coordinates).wkt)
+        if operation is not None and guard is not None:
+            changed = guard.accept(ring)
+            if changed is not None:
+                for i in changed.union(neighbors):
+                    queue.remove(i)
+                for i, key in queued:
+                    queue.push(i, key)
+                operation = None
 
-    if len(ring.coordinates) < 3:
-        return None
-    return LinearRing(ring.coordinates)
+        if len(ring) < size:
+            size = len(ring)
+            regressions.clear()
+        elif operation == _REGRESSION:
+            regressions[s.index] = regressions.get(s.index, 0) + 1
+
+        if operation is not None and observer is not None:
+            observer(operation, length)
+
+    if stats is not None:
+        stats._add_time('iterate', start)
+        stats._add_queue(queue)
+    return ring
+
+
+def _alive_points(ring):
+    """
+    Returns the points of a ring in order.
+    :param ring: ring
+    :return: array (K, 2) of the points without the closing point
+    """
+    alive = np.frombuffer(ring._alive, dtype=np.bool_)
+    return np.column_stack((np.frombuffer(ring._x, dtype=np.float64)[alive],
+                            np.frombuffer(ring._y, dtype=np.float64)[alive]))
+
+
+def _tolerance_thresholds(epsilon):
+    """
+    Returns the thresholds of the sine and cosine of the angle alpha between the directions of two segments
+    for the tolerance angle. Two segments are approximately parallel (alpha <= epsilon) if the squared sine is at most
+    the squared sine threshold and the cosine is at least the first cosine threshold, and approximately anti-parallel
+    (pi - alpha <= epsilon) if the squared sine is at most the squared sine threshold and the cosine is at most the
+    second cosine threshold. Below pi/2, the sine decides the angle and the cosine only its side, so that exactly
+    parallel segments have the sine of 0 without rounding. The squared sine threshold is widened by a few units in
+    the last place, so that an angle of exactly epsilon (e.g., pi/4 between a diagonal and an axis) is within it.
+    :param epsilon: tolerance angle
+    :return: the squared sine threshold, and the cosine thresholds of parallel and anti-parallel segments
+    """
+    if epsilon < 0:
+        return -math.inf, math.inf, -math.inf
+    if epsilon >= pi:
+        return math.inf, -math.inf, math.inf
+    if epsilon < pi / 2:
+        return math.sin(epsilon) ** 2 * (1 + 8 * sys.float_info.epsilon), 0.0, 0.0
+    # the cosine of pi/2 is not exactly 0
+    return math.inf, min(math.cos(epsilon), 0.0), max(-math.cos(epsilon), 0.0)
+
+
+def _beyond(q, p1, p2):
+    """
+    Returns whether a point on the line through two points lies beyond the second point.
+    :param q: point on the line
+    :param p1: first point
+    :param p2: second point
+    :return: True if q is beyond p2
+    """
+    return (q[0] - p2[0]) * (p2[0] - p1[0]) + (q[1] - p2[1]) * (p2[1] - p1[1]) > 0
 
 
 def _test():
@@ -342,6 +649,8 @@ def _test():
     Test simplification with a simple polygon.
     :return:
     """
+    from shapely.wkt import loads
+
     polygon = loads('POLYGON ((0 0, 2 0, 2 -1.1, 2.1 -1.1, 2.1 0, 4 0, 1 1.0001, 0 2, -1 1, -1 0.99, -2 0, 0 0))')
     print(polygon.wkt)
     new_polygon = simplify(polygon)
@@ -355,5 +664,4 @@ def _test():
 
 
 if __name__ == '__main__':
-    _debug_mode = False
     _test()
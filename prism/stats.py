@@ -0,0 +1,245 @@
+"""
+Statistics of simplifications to find out what makes them slow
+"""
+from time import perf_counter
+from prism.heap import PriorityQueue
+from prism.simplify import OPERATIONS
+
+__all__ = ['SimplificationStats', 'PHASES']
+
+# phases of a simplification of a ring
+PHASES = ('prepare', 'enqueue', 'iterate', 'output')
+
+
+class _CountingQueue(PriorityQueue):
+    """
+    This class represents a priority queue that counts its pushes, pops and removals.
+    It is used only when statistics are collected, so the plain queue does not pay for the counting.
+    """
+    def __init__(self):
+        super().__init__()
+        self.pushes = 0
+        self.pops = 0
+        self.removals = 0
+
+    def push(self, item, key):
+        pushed = PriorityQueue.push(self, item, key)
+        if pushed:
+            self.pushes += 1
+        return pushed
+
+    def pop(self):
+        self.pops += 1
+        return PriorityQueue.pop(self)
+
+    def remove(self, item):
+        removed = PriorityQueue.remove(self, item)
+        if removed:
+            self.removals += 1
+        return removed
+
+
+class SimplificationStats:
+    """
+    This class represents statistics accumulated over simplifications: the number of each operation,
+    the pushes, pops and removals of the priority queue, the iterations of the main loop, and the time spent in each
+    phase. Pass an instance to the simplification functions to collect them. Without it, nothing is collected.
+    An instance is not shared between threads or processes by the functions, so use one per thread and merge them.
+    """
+    def __init__(self):
+        self._operations = [0] * len(OPERATIONS)
+        self._pushes = 0
+        self._pops = 0
+        self._removals = 0
+        self._rings = 0
+        self._vertices_before = 0
+        self._vertices_after = 0
+        self._seconds = [0.0] * len(PHASES)
+        self._geometry_seconds = None
+        self._geometry_iterations = None
+
+    @property
+    def operations(self):
+        """
+        Get the number of each operation.
+        :return: dictionary of the names of operations and their numbers
+        """
+        return dict(zip(OPERATIONS, self._operations))
+
+    @property
+    def pushes(self):
+        """
+        Get the number of segments pushed to the priority queue.
+        :return: the number of pushes
+        """
+        return self._pushes
+
+    @property
+    def pops(self):
+        """
+        Get the number of segments de-queued from the priority queue.
+        :return: the number of pops
+        """
+        return self._pops
+
+    @property
+    def removals(self):
+        """
+        Get the number of segments removed from the priority queue without being de-queued.
+        :return: the number of removals
+        """
+        return self._removals
+
+    @property
+    def iterations(self):
+        """
+        Get the number of iterations of the main loop, i.e., one per de-queued segment.
+        Iterations that do not change the ring are the iterations minus the operations.
+        :return: the number of iterations
+        """
+        return self._pops
+
+    @property
+    def rings(self):
+        """
+        Get the number of simplified rings.
+        :return: the number of rings
+        """
+        return self._rings
+
+    @property
+    def vertices_before(self):
+        """
+        Get the number of vertices of the rings before the simplification without the closing vertices.
+        :return: the number of vertices
+        """
+        return self._vertices_before
+
+    @property
+    def vertices_after(self):
+        """
+        Get the number of vertices of the rings after the simplification without the closing vertices.
+        :return: the number of vertices
+        """
+        return self._vertices_after
+
+    @property
+    def seconds(self):
+        """
+        Get the time spent in each phase.
+        :return: dictionary of the names of phases and seconds
+        """
+        return dict(zip(PHASES, self._seconds))
+
+    @property
+    def geometry_seconds(self):
+        """
+        Get the seconds spent on each geometry by the last prism.simplify_many.
+        :return: array aligned with the input of simplify_many, or None
+        """
+        return self._geometry_seconds
+
+    @property
+    def geometry_iterations(self):
+        """
+        Get the iterations spent on each geometry by the last prism.simplify_many.
+        :return: array aligned with the input of simplify_many, or None
+        """
+        return self._geometry_iterations
+
+    def merge(self, other):
+        """
+        Add the statistics of another instance, e.g., collected in another thread or process.
+        The costs of geometries are not merged.
+        :param other: statistics to add
+        :return: this instance
+        """
+        for i, count in enumerate(other._operations):
+            self._operations[i] += count
+        for i, seconds in enumerate(other._seconds):
+            self._seconds[i] += seconds
+        self._pushes += other._pushes
+        self._pops += other._pops
+        self._removals += other._removals
+        self._rings += other._rings
+        self._vertices_before += other._vertices_before
+        self._vertices_after += other._vertices_after
+        return self
+
+    def as_dict(self):
+        """
+        Returns the statistics as a dictionary, e.g., to log them in JSON.
+        :return: dictionary of the statistics
+        """
+        return {'operations': self.operations, 'pushes': self._pushes, 'pops': self._pops,
+                'removals': self._removals, 'iterations': self.iterations, 'rings': self._rings,
+                'vertices_before': self._vertices_before, 'vertices_after': self._vertices_after,
+                'seconds': self.seconds}
+
+    def __repr__(self):
+        return 'SimplificationStats({})'.format(self.as_dict())
+
+    def _queue(self):
+        """
+        Returns a priority queue that counts its pushes, pops and removals.
+        :return: a priority queue
+        """
+        return _CountingQueue()
+
+    def _observer(self, observer=None):
+        """
+        Returns an observer that counts the operations and then calls another observer.
+        :param observer: observer to call after counting, or None
+        :return: an observer
+        """
+        operations = self._operations
+        if observer is None:
+            def count(operation, length):
+                operations[operation] += 1
+        else:
+            def count(operation, length):
+                operations[operation] += 1
+                observer(operation, length)
+        return count
+
+    def _set_geometry_costs(self, seconds, iterations):
+        """
+        Set the seconds and iterations spent on each geometry.
+        :param seconds: array of seconds
+        :param iterations: array of iterations
+        :return: None
+        """
+        self._geometry_seconds = seconds
+        self._geometry_iterations = iterations
+
+    def _add_queue(self, queue):
+        """
+        Add the counts of a queue returned by _queue.
+        :param queue: a counting priority queue
+        :return: None
+        """
+        self._pushes += queue.pushes
+        self._pops += queue.pops
+        self._removals += queue.removals
+
+    def _add_ring(self, before, after):
+        """
+        Add a simplified ring.
+        :param before: the number of vertices before the simplification
+        :param after: the number of vertices after the simplification
+        :return: None
+        """
+        self._rings += 1
+        self._vertices_before += before
+        self._vertices_after += after
+
+    def _add_time(self, phase, start):
+        """
+        Add the time spent in a phase since the start and returns the current time.
+        :param phase: name of the phase in PHASES
+        :param start: start time by perf_counter
+        :return: the current time by perf_counter
+        """
+        now = perf_counter()
+        self._seconds[PHASES.index(phase)] += now - start
+        return now
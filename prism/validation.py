@@ -0,0 +1,307 @@
+"""
+Incremental validation of the simplification with a grid index of segments
+"""
+from fractions import Fraction
+from math import floor, hypot
+from prism.ring import _POINT, _LINK
+
+__all__ = ['SegmentGrid']
+
+# relative bound of the rounding error of an orientation in floating point, with a margin for the differences
+_ORIENTATION_ERROR = 1e-15
+
+
+class SegmentGrid:
+    """
+    This class represents a uniform grid of the segments of the rings of a polygon to check whether an operation of
+    the simplification makes a ring cross itself or another ring of the polygon.
+    The ring being simplified is attached to the grid, and its segments are indexed by their indices.
+    The other rings are indexed as static segments. Only the segments changed by an operation are checked,
+    against the segments in the cells that they pass through.
+    Segments of different rings must not cross or overlap, but they may touch. Within a ring, segments must not share
+    any point but the end points of adjacent segments, and adjacent segments must not fold back onto each other.
+    A ring that collapses to no area when it is detached is removed from the polygon.
+    """
+    def __init__(self, rings, tolerance=0.0, cell_size=None):
+        """
+        Initialize with the rings of a polygon.
+        :param rings: list of pairs of x and y coordinates of the rings without the closing vertices
+        :param tolerance: tolerance distance of the simplification, which the cells are at least as large as
+        :param cell_size: size of a cell. By default, it is the mean length of the segments or the tolerance,
+            whichever is larger.
+        """
+        if cell_size is None:
+            length = 0.0
+            count = 0
+            for x, y in rings:
+                n = len(x)
+                for i in range(n):
+                    length += hypot(x[i - 1] - x[i], y[i - 1] - y[i])
+                count += n
+            cell_size = max(length / count, tolerance) if length > 0 else max(tolerance, 1.0)
+        self._cell_size = cell_size
+        self._cells = {}  # cell -> set of keys of segments
+        self._cells_of = {}  # key of a segment -> list of cells
+        self._static = {}  # key of a static segment (< 0) -> (x1, y1, x2, y2, ring id)
+        self._keys_of_ring = {}  # ring id -> keys of its static segments
+        self._ring = None
+        self._next_key = -1
+        for ring_id, (x, y) in enumerate(rings):
+            self._add_static(ring_id, x, y)
+
+    def _add_static(self, ring_id, x, y):
+        """
+        Add a ring as static segments.
+        :param ring_id: id of the ring
+        :param x: x coordinates without the closing vertex
+        :param y: y coordinates without the closing vertex
+        :return: None
+        """
+        keys = []
+        n = len(x)
+        for i in range(n):
+            key = self._next_key
+            self._next_key -= 1
+            segment = (x[i], y[i], x[(i + 1) % n], y[(i + 1) % n], ring_id)
+            self._static[key] = segment
+            self._insert(key, *segment[:4])
+            keys.append(key)
+        self._keys_of_ring[ring_id] = keys
+
+    def attach(self, ring_id, ring):
+        """
+        Attach a ring to simplify in place of its static segments.
+        :param ring_id: id of the ring
+        :param ring: ring
+        :return: None
+        """
+        for key in self._keys_of_ring.pop(ring_id, ()):
+            self._delete(key)
+            del self._static[key]
+        self._ring = ring
+        for i in range(len(ring._alive)):
+            if ring._alive[i]:
+                self._index(i)
+
+    def detach(self, ring_id):
+        """
+        Detach the attached ring and add it as static segments unless it collapses,
+        i.e., it has fewer than three vertices or no area.
+        :param ring_id: id of the ring
+        :return: True if the ring remains in the polygon, otherwise False
+        """
+        ring = self._ring
+        for i in range(len(ring._alive)):
+            self._delete(i)
+        self._ring = None
+        points = [(seg.sp[0], seg.sp[1]) for seg in ring]
+        if len(points) < 3 or _area(points) == 0:
+            return False
+        self._add_static(ring_id, [p[0] for p in points], [p[1] for p in points])
+        return True
+
+    def accept(self, ring):
+        """
+        Check the segments changed since the ring started recording changes (Ring._begin).
+        If they cross, the changes are rolled back.
+        :param ring: the attached ring
+        :return: indices of the changed segments if the changes are rolled back, otherwise None
+        """
+        changed = set()
+        prev = ring._prev
+        for change in ring._undo:
+            if change[0] == _POINT or change[0] == _LINK:
+                changed.add(change[1])
+                changed.add(prev[change[1]])
+        for i in changed:
+            self._index(i)
+        if not any(self._crosses(i) for i in changed if ring._alive[i]):
+            return None
+        ring._rollback()
+        for i in changed:
+            self._index(i)
+        return changed
+
+    def _index(self, i):
+        """
+        Index the segment of the attached ring at the index, or remove it if it has been unlinked.
+        :param i: index of the segment
+        :return: None
+        """
+        self._delete(i)
+        ring = self._ring
+        if ring._alive[i]:
+            j = ring._next[i]
+            self._insert(i, ring._x[i], ring._y[i], ring._x[j], ring._y[j])
+
+    def _insert(self, key, x1, y1, x2, y2):
+        """
+        Insert a segment into the cells that it passes through.
+        :param key: key of the segment
+        :return: None
+        """
+        cells = _cells(x1, y1, x2, y2, self._cell_size)
+        for cell in cells:
+            self._cells.setdefault(cell, set()).add(key)
+        self._cells_of[key] = cells
+
+    def _delete(self, key):
+        """
+        Delete a segment from the cells.
+        :param key: key of the segment
+        :return: None
+        """
+        for cell in self._cells_of.pop(key, ()):
+            keys = self._cells[cell]
+            keys.discard(key)
+            if not keys:
+                del self._cells[cell]
+
+    def _crosses(self, i):
+        """
+        Returns whether the segment of the attached ring at the index crosses another segment.
+        :param i: index of the segment
+        :return: True if it crosses
+        """
+        ring = self._ring
+        x, y, _next, _prev = ring._x, ring._y, ring._next, ring._prev
+        j = _next[i]
+        ax, ay, bx, by = x[i], y[i], x[j], y[j]
+        if ax == bx and ay == by:
+            return False  # a duplicate point
+        # the adjacent segments skipping duplicate points, which share an end point
+        after = j
+        while x[after] == x[_next[after]] and y[after] == y[_next[after]] and after != i:
+            after = _next[after]
+        before = _prev[i]
+        while x[before] == x[_next[before]] and y[before] == y[_next[before]] and before != i:
+            before = _prev[before]
+        k = _next[after]
+        if _folding(ax, ay, bx, by, x[k], y[k]) or _folding(bx, by, ax, ay, x[before], y[before]):
+            return True
+
+        candidates = set()
+        for cell in self._cells_of[i]:
+            candidates.update(self._cells[cell])
+        candidates.discard(i)
+        for key in candidates:
+            if key < 0:
+                cx, cy, dx, dy = self._static[key][:4]
+                if _crossing(ax, ay, bx, by, cx, cy, dx, dy):
+                    return True
+                continue
+            if key == after or key == before:
+                continue
+            k = _next[key]
+            if x[key] == x[k] and y[key] == y[k]:
+                continue  # a duplicate point, which is checked with its neighbors
+            if _touching(ax, ay, bx, by, x[key], y[key], x[k], y[k]):
+                return True
+        return False
+
+
+def _cells(x1, y1, x2, y2, size):
+    """
+    Returns the cells of a grid that a segment passes through, column by column, so that the number of cells is
+    proportional to the length of the segment rather than the area of its bounding box.
+    The y range in each column is widened by a margin of rounding, so a cell may be included that the segment only
+    comes close to.
+    :param size: size of a cell
+    :return: list of cells (column, row)
+    """
+    if x1 > x2:
+        x1, y1, x2, y2 = x2, y2, x1, y1
+    first = floor(x1 / size)
+    last = floor(x2 / size)
+    if first == last:
+        return [(first, cy) for cy in range(floor(min(y1, y2) / size), floor(max(y1, y2) / size) + 1)]
+    slope = (y2 - y1) / (x2 - x1)
+    margin = 1e-9 * (size + abs(y1) + abs(y2))
+    cells = []
+    for cx in range(first, last + 1):
+        ya = y1 + (max(x1, cx * size) - x1) * slope
+        yb = y1 + (min(x2, (cx + 1) * size) - x1) * slope
+        for cy in range(floor((min(ya, yb) - margin) / size), floor((max(ya, yb) + margin) / size) + 1):
+            cells.append((cx, cy))
+    return cells
+
+
+def _area(points):
+    """
+    Returns the signed area of a ring given as a list of points without the closing point (shoelace formula).
+    """
+    area = 0.0
+    px, py = points[-1]
+    for qx, qy in points:
+        area += px * qy - qx * py
+        px, py = qx, qy
+    return area / 2
+
+
+def _orientation(ax, ay, bx, by, cx, cy):
+    """
+    Returns the sign of the orientation of three points: 1 (counterclockwise), -1 (clockwise) or 0 (collinear).
+    The sign is computed exactly if the rounding error of the floating-point product may flip it.
+    """
+    left = (bx - ax) * (cy - ay)
+    right = (by - ay) * (cx - ax)
+    cross = left - right
+    if abs(cross) <= _ORIENTATION_ERROR * (abs(left) + abs(right)):
+        ax, ay = Fraction(ax), Fraction(ay)
+        cross = (Fraction(bx) - ax) * (Fraction(cy) - ay) - (Fraction(by) - ay) * (Fraction(cx) - ax)
+    return (cross > 0) - (cross < 0)
+
+
+def _crossing(ax, ay, bx, by, cx, cy, dx, dy):
+    """
+    Returns whether two segments ab and cd cross each other or overlap, i.e., share more than touching points.
+    """
+    if (max(ax, bx) < min(cx, dx) or max(cx, dx) < min(ax, bx) or
+            max(ay, by) < min(cy, dy) or max(cy, dy) < min(ay, by)):
+        return False
+    o1 = _orientation(ax, ay, bx, by, cx, cy)
+    o2 = _orientation(ax, ay, bx, by, dx, dy)
+    o3 = _orientation(cx, cy, dx, dy, ax, ay)
+    o4 = _orientation(cx, cy, dx, dy, bx, by)
+    if o1 * o2 < 0 and o3 * o4 < 0:
+        return True
+    if o1 == 0 and o2 == 0:
+        # collinear segments overlap if their projections share more than a point
+        if ax != bx:
+            return min(max(ax, bx), max(cx, dx)) > max(min(ax, bx), min(cx, dx))
+        return min(max(ay, by), max(cy, dy)) > max(min(ay, by), min(cy, dy))
+    return False
+
+
+def _touching(ax, ay, bx, by, cx, cy, dx, dy):
+    """
+    Returns whether two segments ab and cd share any point, i.e., they cross, overlap or touch.
+    """
+    if (max(ax, bx) < min(cx, dx) or max(cx, dx) < min(ax, bx) or
+            max(ay, by) < min(cy, dy) or max(cy, dy) < min(ay, by)):
+        return False
+    o1 = _orientation(ax, ay, bx, by, cx, cy)
+    o2 = _orientation(ax, ay, bx, by, dx, dy)
+    o3 = _orientation(cx, cy, dx, dy, ax, ay)
+    o4 = _orientation(cx, cy, dx, dy, bx, by)
+    if o1 != o2 and o3 != o4:
+        return True
+    # a collinear end point touches the other segment if it is within the bounding box of the other segment
+    return (o1 == 0 and _within(cx, cy, ax, ay, bx, by) or o2 == 0 and _within(dx, dy, ax, ay, bx, by) or
+            o3 == 0 and _within(ax, ay, cx, cy, dx, dy) or o4 == 0 and _within(bx, by, cx, cy, dx, dy))
+
+
+def _within(px, py, ax, ay, bx, by):
+    """
+    Returns whether a point is within the bounding box of a segment ab.
+    """
+    return min(ax, bx) <= px <= max(ax, bx) and min(ay, by) <= py <= max(ay, by)
+
+
+def _folding(ax, ay, bx, by, cx, cy):
+    """
+    Returns whether a segment bc adjacent to a segment ab folds back onto it, i.e., they overlap at b.
+    """
+    if cx == bx and cy == by:
+        return False
+    return _orientation(ax, ay, bx, by, cx, cy) == 0 and (bx - ax) * (cx - bx) + (by - ay) * (cy - by) < 0
@@ -0,0 +1,89 @@
+"""
+Tests of the cache of simplified rings
+"""
+import sqlite3
+import numpy as np
+import pytest
+import prism
+from shapely.geometry import Polygon
+from benchmarks.generators import orthogonal_room
+
+_ROOM = np.array([(0, 0), (4, 0.1), (8, 0), (8.1, 3), (8, 6), (5, 6.2), (5, 9), (0, 9), (0.1, 4)], dtype=np.float64)
+
+
+def test_mirrored_and_rotated_rings_hit():
+    cache = prism.SimplificationCache(canonical=True, precision=6)
+    room = Polygon(_ROOM)
+    first = cache.simplify(room, tau=0.5)
+    for matrix in ([[-1, 0], [0, 1]], [[1, 0], [0, -1]], [[0, -1], [1, 0]], [[0, 1], [1, 0]]):
+        polygon = Polygon(_ROOM @ np.array(matrix, dtype=np.float64).T + (100, -50))
+        result = cache.simplify(polygon, tau=0.5)
+        assert result.is_valid
+        assert result.symmetric_difference(polygon).area < room.area * 0.1
+        assert abs(result.area - first.area) < 1e-9
+    assert cache.stats()['misses'] == 1
+    assert cache.stats()['hits'] == 4
+
+
+def test_collapsed_ring_is_none():
+    cache = prism.SimplificationCache()
+    sliver = Polygon([(0, 0), (10, 0), (10, 0.01), (5, 0.02)])
+    for _ in range(2):  # a miss and then a hit
+        assert cache.simplify(sliver, tau=1) is None
+        assert cache.simplify_ring(sliver.exterior, tau=1) is None
+
+
+def test_key_depends_on_all_options():
+    cache = prism.SimplificationCache()
+    room = Polygon(_ROOM)
+    cache.simplify(room, tau=0.5)
+    cache.simplify(room, tau=0.5, prefilter=True)
+    cache.simplify(room, tau=0.5, max_vertices=4)
+    assert cache.stats()['misses'] == 3
+    assert len(cache.simplify(room, tau=0.5, max_vertices=4).exterior.coords) <= 5
+
+
+def test_simplify_and_simplify_many_use_the_cache():
+    cache = prism.SimplificationCache(canonical=True, precision=6)
+    rooms = [Polygon(_ROOM + (i * 20, 0)) for i in range(5)]
+    results = prism.simplify_many(rooms, tau=0.5, cache=cache)
+    assert cache.stats() == dict(cache.stats(), misses=1, hits=4)
+    assert prism.simplify(rooms[0], tau=0.5, cache=cache).equals(results[0])
+    assert cache.stats()['hits'] == 5
+    for options in ({'validate': True}, {'time_limit': 1.0}, {'stats': prism.SimplificationStats()}):
+        with pytest.raises(ValueError):
+            prism.simplify(rooms[0], cache=cache, **options)
+        with pytest.raises(ValueError):
+            prism.simplify_many(rooms, cache=cache, **options)
+    with pytest.raises(ValueError):
+        prism.simplify_many(rooms, cache=cache, workers=2)
+
+
+def test_cached_results_equal_uncached_results():
+    rng = np.random.default_rng(0)
+    rooms = [orthogonal_room(rng, n_vertices=int(n)) for n in rng.integers(16, 128, 50)]
+    for options in ({'tau': 1}, {'tau': 0.5, 'merge_first': True}, {'tau': 1, 'prefilter': True, 'max_vertices': 8}):
+        cache = prism.SimplificationCache()
+        expected = [prism.simplify(room, **options) for room in rooms]
+        for _ in range(2):  # misses and then hits
+            for room, polygon in zip(rooms, expected):
+                result = cache.simplify(room, **options)
+                assert result is None and polygon is None or result.equals_exact(polygon, 0)
+        many = prism.simplify_many(rooms, cache=cache, **options)
+        assert all(a is None and b is None or a.equals_exact(b, 0) for a, b in zip(many, expected))
+        assert cache.stats()['misses'] == cache.stats()['size']
+
+
+def test_precision_requires_canonical():
+    with pytest.raises(ValueError):
+        prism.SimplificationCache(precision=6)
+
+
+def test_rings_on_disk_are_committed_on_close(tmp_path):
+    path = str(tmp_path / 'rings.sqlite')
+    with prism.SimplificationCache(path=path) as cache:
+        cache.simplify(Polygon(_ROOM), tau=0.5)
+    assert sqlite3.connect(path).execute('SELECT COUNT(*) FROM rings').fetchone()[0] == 1
+    with prism.SimplificationCache(path=path) as cache:
+        cache.simplify(Polygon(_ROOM), tau=0.5)
+        assert cache.stats()['disk_hits'] == 1
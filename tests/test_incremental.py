@@ -0,0 +1,58 @@
+"""
+Tests of the incremental re-simplification of an edited ring
+"""
+import numpy as np
+import prism
+import prism.incremental
+from shapely.geometry import Polygon
+
+
+def _star(n=48, seed=0):
+    rng = np.random.default_rng(seed)
+    angles = np.sort(rng.uniform(0, 2 * np.pi, n))
+    radii = rng.uniform(3, 10, n)
+    coords = np.column_stack((radii * np.cos(angles), radii * np.sin(angles)))
+    return np.vstack((coords, coords[:1]))
+
+
+def test_lost_pinned_points_fall_back_to_the_whole_ring(monkeypatch):
+    coords = _star()
+    simplified, index = prism.simplify_coords(coords, tau=0.5, return_index=True)
+    assert len(index) > 12
+    simplify = prism.incremental._simplify
+
+    def moving_a_pinned_point(ring, *args, **kwargs):
+        ring = simplify(ring, *args, **kwargs)
+        ring._x[0] += 1.0  # the first point is a pinned point before the left anchor
+        return ring
+
+    monkeypatch.setattr(prism.incremental, '_simplify', moving_a_pinned_point)
+    vertices = coords[20:21] + (0.5, 0.5)
+    edited, result, new_index = prism.resimplify_coords(coords, simplified, index, 20, 21, vertices, tau=0.5)
+    expected, expected_index = prism.simplify_coords(edited, tau=0.5, return_index=True)
+    assert np.array_equal(result, expected)
+    assert np.array_equal(new_index, expected_index)
+
+
+def test_edit_is_spliced_between_the_anchors(monkeypatch):
+    coords = _star()
+    simplified, index = prism.simplify_coords(coords, tau=0.5, return_index=True)
+    m = len(index)
+    start, stop, band = 20, 22, 2
+    vertices = np.array([(0.5, 0.5), (0.4, 0.6), (0.3, 0.7)]) * coords[20]
+    monkeypatch.setattr(prism.incremental, '_resimplify', None)  # the window does not cover the ring
+    edited, result, new_index = prism.resimplify_coords(coords, simplified, index, start, stop, vertices, tau=0.5,
+                                                        band=band)
+    shift = len(vertices) - (stop - start)
+    assert np.array_equal(edited[start:start + len(vertices)], vertices)
+    assert np.array_equal(result[0], result[-1])
+    assert Polygon(result).is_valid
+    assert np.all(np.diff(new_index) > 0)
+    # the anchors, the pinned points beyond them and the vertices outside the guard band are kept as they are
+    left = int(np.searchsorted(index, start)) - 1 - band
+    right = int(np.searchsorted(index, stop)) + band
+    outside = np.arange(right, right + m - (right - left) + 1) % m
+    kept = [i + shift if i >= stop else i for i in index[outside]]
+    assert set(kept) <= set(new_index.tolist())
+    assert np.array_equal(result[np.searchsorted(new_index, kept)], simplified[outside])
+    assert len(outside) < len(new_index)  # the window has vertices of its own
@@ -0,0 +1,68 @@
+"""
+Scaling of the simplification with the number of vertices of a ring
+"""
+import time
+import numpy as np
+import prism
+
+# numbers of vertices from 10^2 to 10^5
+_SIZES = (10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5)
+
+
+def _noisy_room(n_vertices, seed=0, size=20.0, noise=0.05):
+    """
+    Returns a closed ring of a rectangular room whose walls are sampled densely with Gaussian noise.
+    :param n_vertices: number of vertices without the closing vertex
+    :param seed: seed of the random generator
+    :param size: size of the room
+    :param noise: standard deviation of the noise
+    :return: array (n_vertices + 1, 2) of the coordinates
+    """
+    rng = np.random.default_rng(seed)
+    # position along the boundary of a square, counterclockwise from the origin
+    t = np.arange(n_vertices) * (4 * size / n_vertices)
+    side = np.minimum((t // size).astype(np.int64), 3)
+    along = t - side * size
+    x = np.choose(side, [along, np.full(n_vertices, size), size - along, np.zeros(n_vertices)])
+    y = np.choose(side, [np.zeros(n_vertices), along, np.full(n_vertices, size), size - along])
+    # noise across the walls, less than half the distance to the corners so that the walls do not cross
+    offsets = np.clip(rng.normal(0.0, noise, n_vertices), -np.minimum(along, size - along) / 2,
+                      np.minimum(along, size - along) / 2)
+    normals = np.array([(0.0, -1.0), (1.0, 0.0), (0.0, 1.0), (-1.0, 0.0)])[side]
+    coords = np.column_stack((x, y)) + normals * offsets[:, np.newaxis]
+    return np.vstack((coords, coords[:1]))
+
+
+def _seconds(coords, repeat=2):
+    """
+    Returns the best time to simplify a ring.
+    :param coords: coordinates of a closed ring
+    :param repeat: number of runs
+    :return: seconds
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        prism.simplify_coords(coords, tau=1.0)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def test_scaling_is_subquadratic():
+    # the exponent of the growth fitted on a log-log scale is about 1 (n log n), while a linear scan per
+    # operation of the queue or the ring makes it 2
+    seconds = [_seconds(_noisy_room(n), repeat=1 if n == _SIZES[-1] else 2) for n in _SIZES]
+    exponent = np.polyfit(np.log(_SIZES), np.log(seconds), 1)[0]
+    assert exponent < 1.5, 'time grows as n^{:.2f}: {}'.format(exponent, seconds)
+
+
+def test_simplified_ring_keeps_the_room_at_every_size():
+    for n in _SIZES[:-1]:
+        result = prism.simplify_coords(_noisy_room(n), tau=1.0)
+        assert result is not None
+        assert len(result) < n / 4
+        assert np.array_equal(result[0], result[-1])
+        # shoelace area of the 20 x 20 room
+        x, y = result[:, 0], result[:, 1]
+        area = 0.5 * abs(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1]))
+        assert abs(area - 400.0) < 8.0
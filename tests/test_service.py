@@ -0,0 +1,69 @@
+"""
+Tests of the simplification service
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import pytest
+import prism.service
+from prism.service import ServiceOverloaded, SimplificationService
+
+
+async def _status(port, request):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(request)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+def test_bad_content_lengths_are_rejected():
+    async def run():
+        service = SimplificationService(workers=1, executor=ThreadPoolExecutor(1), max_body=64)
+        await service.start(port=0)
+        port = service.addresses[0][1]
+        try:
+            statuses = [await _status(port, b'POST /simplify HTTP/1.1\r\nContent-Length: -5\r\n\r\n'),
+                        await _status(port, b'POST /simplify HTTP/1.1\r\nContent-Length: x\r\n\r\n'),
+                        await _status(port, b'POST /simplify HTTP/1.1\r\nContent-Length: 65\r\n\r\n')]
+            body = b'POLYGON ((0 0, 4 0, 4 3, 0 3, 0 0))'
+            statuses.append(await _status(port, b'POST /simplify HTTP/1.1\r\nConnection: close\r\n'
+                                                b'Content-Length: %d\r\n\r\n' % len(body) + body))
+        finally:
+            await service.close()
+        return statuses
+
+    assert asyncio.run(run()) == [400, 400, 413, 200]
+
+
+def test_simplify_before_open_fails_clearly():
+    service = SimplificationService(workers=1, executor=ThreadPoolExecutor(1))
+    with pytest.raises(RuntimeError, match='not open'):
+        asyncio.run(service.simplify(['POLYGON ((0 0, 4 0, 4 3, 0 3, 0 0))']))
+
+
+def test_close_fails_a_batch_waiting_for_a_slot(monkeypatch):
+    release = threading.Event()
+
+    def blocking(lines, **kwargs):
+        release.wait(5)
+        return ['done'] * len(lines), []
+
+    async def run():
+        service = SimplificationService(workers=1, window=1, executor=ThreadPoolExecutor(2))
+        await service.open()
+        monkeypatch.setattr(prism.service, 'simplify_lines', blocking)
+        first = asyncio.ensure_future(service.simplify(['a']))
+        await asyncio.sleep(0.05)  # the first batch holds the only slot
+        second = asyncio.ensure_future(service.simplify(['b']))
+        await asyncio.sleep(0.05)  # the second request is taken from the queue and waits for the slot
+        assert service.metrics()['queue_depth'] == 0
+        closing = asyncio.ensure_future(service.close())
+        with pytest.raises(ServiceOverloaded):
+            await asyncio.wait_for(second, 1)
+        release.set()
+        await asyncio.wait_for(closing, 5)
+        return await first
+
+    assert asyncio.run(run()) == (['done'], [])
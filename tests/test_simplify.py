@@ -0,0 +1,70 @@
+"""
+Tests of the main iteration of the simplification
+"""
+import numpy as np
+import prism
+from prism.simplify import OPERATIONS
+from shapely.geometry import Polygon
+
+# a ring on which a segment is regressed to a fixed point again and again
+_STALLING_RING = np.array([
+    (19, 5), (6, 3), (15, 9), (15, 11), (7, 5), (8, 7), (4, 4), (13, 14), (12, 16), (8, 16), (0, 16), (-2, 19),
+    (-6, 17), (-5, 13), (-3, 5), (-7, 8), (-10, 11), (-14, 13), (-5, 4), (-11, 8), (-5, 3), (-11, 5), (-5, 1),
+    (-10, 2), (-19, 1), (-18, 1), (-18, 0), (-15, -2), (-15, -7), (-7, -4), (-7, -7), (-6, -7), (-8, -14), (-7, -15),
+    (-4, -11), (-4, -13), (-5, -19), (-2, -9), (0, -7), (1, -8), (8, -10), (13, -8), (9, -6), (6, -3), (13, -1),
+    (19, -1), (19, 5)], dtype=np.float64)
+
+# orthogonal rooms with notches and their simplified exteriors (tau=1). The segments of the notches have equal lengths,
+# so the results depend on the order of ties in the queue: segments of the same length when they are enqueued are
+# de-queued in the order of insertion. The results differed before this order was introduced.
+_ORTHOGONAL_ROOMS = [
+    ([(0, 0), (1, 0), (1, -0.3), (2, -0.3), (2, 0), (4, 0), (4, -0.3), (5, -0.3), (5, 0), (6, 0), (6, 0.3), (7, 0.3),
+      (7, 0), (8, 0), (8, 0.3), (9, 0.3), (9, 0), (10, 0), (10, 8), (0, 8)],
+     [(0, 0.0205), (10, 0.0205), (10, 8), (0, 8), (0, 0.0205)]),
+    ([(0, 0), (1, 0), (1, -0.3), (2, -0.3), (2, 0), (4, 0), (4, 0.3), (5, 0.3), (5, 0), (6, 0), (6, 0.3), (7, 0.3),
+      (7, 0), (10, 0), (10, 6), (0, 6)],
+     [(0, 0.005), (10, 0.005), (10, 6), (0, 6), (0, 0.005)]),
+    ([(0, 0), (2, 0), (2, -0.3), (3, -0.3), (3, 0), (5, 0), (5, 0.3), (6, 0.3), (6, 0), (7, 0), (7, 0.3), (8, 0.3),
+      (8, 0), (9, 0), (9, 8), (0, 8)],
+     [(0, -0.000833333333), (9, -0.000833333333), (9, 8), (0, 8), (0, -0.000833333333)]),
+    ([(0, 0), (1, 0), (1, 0.3), (2, 0.3), (2, 0), (4, 0), (4, -0.3), (5, -0.3), (5, 0), (6, 0), (6, 0.3), (7, 0.3),
+      (7, 0), (9, 0), (9, 0.5), (10, 0.5), (10, 0), (11, 0), (11, -0.3), (12, -0.3), (12, 0), (13, 0), (13, 6), (0, 6)],
+     [(0, 0.067884615385), (13, 0.067884615385), (13, 6), (0, 6), (0, 0.067884615385)]),
+]
+
+
+def test_orthogonal_rooms_keep_their_results():
+    for room, expected in _ORTHOGONAL_ROOMS:
+        result = prism.simplify(Polygon(room), tau=1)
+        assert np.allclose(result.exterior.coords, expected, rtol=0, atol=1e-9)
+        assert np.allclose(prism.simplify_many([Polygon(room)], tau=1)[0].exterior.coords, expected, rtol=0, atol=1e-9)
+
+
+def test_repeated_regressions_end():
+    for merge_first in (False, True):
+        stats = prism.SimplificationStats()
+        result = prism.simplify_coords(_STALLING_RING, tau=2, epsilon=2.0, merge_first=merge_first, stats=stats)
+        assert result is not None
+        assert stats.as_dict()['operations'][OPERATIONS[1]] <= 64 * len(_STALLING_RING)
+
+
+def test_sliver_collapses_in_every_entry_point():
+    # the sliver is simplified to two vertices, which is not a ring
+    sliver = np.array([(0, 0), (10, 0), (10, 0.01), (5, 0.02), (0, 0)], dtype=np.float64)
+    polygon = Polygon(sliver)
+    assert prism.simplify(polygon, tau=1) is None
+    assert prism.simplify_ring(polygon.exterior, tau=1) is None
+    assert prism.simplify_many([polygon], tau=1)[0] is None
+    assert prism.simplify_coords(sliver, tau=1) is None
+
+
+def test_duplicate_vertices_are_merged():
+    # a segment without length is merged as a duplicate point, rather than regressed or joined with its neighbors
+    room = [(0, 0), (0, 0), (5, 0), (5, 0), (10, 0), (10, 6), (10, 6), (4, 6), (0, 6)]
+    for tau in (0.1, 1, 3):
+        stats = prism.SimplificationStats()
+        result = prism.simplify(Polygon(room), tau=tau, stats=stats)
+        assert list(result.exterior.coords) == [(0, 0), (10, 0), (10, 6), (0, 6), (0, 0)]
+        operations = stats.as_dict()['operations']
+        assert operations[OPERATIONS[0]] == 5  # 3 duplicates and 2 collinear points
+        assert sum(operations.values()) == 5
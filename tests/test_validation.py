@@ -0,0 +1,66 @@
+"""
+Tests of the validation mode of the simplification
+"""
+import time
+import numpy as np
+import prism
+from shapely.geometry import Polygon
+
+
+def _noisy_rectangle(seed):
+    """
+    Returns a rotated rectangle whose boundary is sampled at random with Gaussian noise, or None if it is invalid.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = rng.uniform(5, 20, 2)
+    n = int(rng.integers(20, 200))
+    t = np.sort(rng.uniform(0, 2 * (width + height), n))
+    x = np.select([t < width, t < width + height, t < 2 * width + height],
+                  [t, np.full(n, width), 2 * width + height - t], 0.0)
+    y = np.select([t < width, t < width + height, t < 2 * width + height],
+                  [0.0, t - width, np.full(n, height)], 2 * (width + height) - t)
+    angle = rng.uniform(0, np.pi)
+    rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    polygon = Polygon((np.column_stack((x, y)) + rng.normal(0, 0.05, (n, 2))) @ rotation.T)
+    return polygon if polygon.is_valid else None
+
+
+def test_noisy_rectangles_stay_valid():
+    polygons = [p for p in (_noisy_rectangle(seed) for seed in range(100)) if p is not None]
+    invalid = 0
+    for polygon in polygons:
+        for tau in (0.5, 1.0, 2.0):
+            for merge_first in (False, True):
+                result = prism.simplify(polygon, tau=tau, validate=True, merge_first=merge_first)
+                assert result is not None
+                invalid += not result.is_valid
+    assert invalid == 0
+
+
+def test_hole_does_not_collapse_to_no_area():
+    # without validation, the hole collapses to (2.01 2.96, 1.81 2.89, 2.01 2.96, 2.01 2.96)
+    hole = [(2.01, 2.96), (1.81, 2.89), (2.0, 3.06), (2.12, 3.08), (2.12, 3.07)]
+    polygon = Polygon([(0, 0), (10, 0), (10, 10), (0, 10)], [hole])
+    for result in (prism.simplify(polygon, tau=0.2, validate=True),
+                   prism.simplify_many([polygon], tau=0.2, validate=True)[0]):
+        assert result.is_valid
+        assert all(Polygon(interior).area > 0 for interior in result.interiors)
+    result = prism.simplify_coords(np.array(hole + hole[:1]), tau=0.2, validate=True)
+    assert result is None or Polygon(result).area > 0
+
+
+def test_validation_scales_with_long_diagonal_segments():
+    # a densified square rotated by 45 degrees, whose merged segments are long diagonals across many cells
+    sizes = (100, 200, 400, 800)
+    seconds = []
+    for n in sizes:
+        t = np.arange(n) / n * 10
+        square = np.vstack((np.column_stack((t, 0 * t)), np.column_stack((10 + 0 * t, t)),
+                            np.column_stack((10 - t, 10 + 0 * t)), np.column_stack((0 * t, 10 - t))))
+        polygon = Polygon(square @ (np.array([[1.0, -1.0], [1.0, 1.0]]).T / np.sqrt(2)))
+        start = time.perf_counter()
+        result = prism.simplify(polygon, tau=0.01, validate=True)
+        seconds.append(time.perf_counter() - start)
+        assert len(result.exterior.coords) == 5
+    exponent = np.polyfit(np.log(sizes), np.log(seconds), 1)[0]
+    assert exponent < 1.5, 'time grows as n^{:.2f}: {}'.format(exponent, seconds)